@@ -0,0 +1,97 @@
+"""
+Small fake Coursera-like catalogs, so the pipeline and the benchmarks run without
+downloading the real dataset.
+
+Usage:
+    python benchmarks/fake_coursera.py --courses 2000 --output data/Coursera.csv
+    python benchmarks/fake_coursera.py --skills 300 --output data/extracted_skills.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from course_data_preparation import departments
+
+FILLER_WORDS = [
+    'introduction', 'advanced', 'fundamentals', 'learn', 'course', 'project', 'practical', 'guide',
+    'modern', 'applied', 'principles', 'hands-on', 'beginner', 'professional', 'essentials', 'week',
+    'module', 'theory', 'case', 'study', 'skills', 'career', 'tools', 'methods', 'world', 'real',
+]
+
+COURSERA_COLUMNS = ['Course Name', 'University', 'Difficulty Level', 'Course Rating', 'Course URL',
+                    'Course Description', 'Skills']
+
+
+def _department_words():
+    return [' '.join(keywords).split() for keywords in departments.values()]
+
+
+def make_fake_coursera(n_courses, seed=0):
+    """
+    Build a Coursera-like catalog. Every course is written around one or two departments'
+    keywords mixed with filler words, so classification assigns a realistic handful of
+    departments per course.
+
+    Returns:
+        pd.DataFrame: Columns of the Kaggle Coursera dataset.
+    """
+    rng = np.random.default_rng(seed)
+    dept_words = _department_words()
+    filler = np.array(FILLER_WORDS)
+
+    rows = []
+    for course in range(n_courses):
+        topics = rng.choice(len(dept_words), size=rng.integers(1, 3), replace=False)
+        topic_words = np.array([word for topic in topics for word in dept_words[topic]])
+
+        name = ' '.join(rng.choice(topic_words, 2).tolist() + rng.choice(filler, 2).tolist()).title()
+        desc = ' '.join(rng.permutation(np.concatenate([rng.choice(topic_words, 8), rng.choice(filler, 30)])))
+        skills = ','.join(rng.choice(topic_words, 3).tolist() + rng.choice(filler, 2).tolist())
+
+        rows.append([name, 'Fake University', rng.choice(['Beginner', 'Intermediate', 'Advanced']),
+                     round(float(rng.uniform(3.5, 5.0)), 1), f'https://example.com/course/{course + 1}', desc, skills])
+
+    return pd.DataFrame(rows, columns=COURSERA_COLUMNS)
+
+
+def make_fake_skills(n_skills, seed=0):
+    """
+    Build an extracted_skills.csv-like table: skill_id, skill_name and a `[2, 5]` style
+    dept_ids list with one to three departments.
+    """
+    rng = np.random.default_rng(seed)
+    dept_ids = np.array(list(departments.keys()))
+
+    rows = []
+    for skill_id in range(1, n_skills + 1):
+        depts = np.sort(rng.choice(dept_ids, size=rng.integers(1, 4), replace=False))
+        rows.append([skill_id, f'Skill {skill_id}', str(depts.tolist())])
+
+    return pd.DataFrame(rows, columns=['skill_id', 'skill_name', 'dept_ids'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a fake Coursera catalog or skill list.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--courses', type=int, help="Number of courses in the fake Coursera.csv")
+    group.add_argument('--skills', type=int, help="Number of skills in the fake extracted_skills.csv")
+    parser.add_argument('--output', required=True, help="CSV file to write")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.courses is not None:
+        df = make_fake_coursera(args.courses, seed=args.seed)
+    else:
+        df = make_fake_skills(args.skills, seed=args.seed)
+
+    df.to_csv(args.output, index=False)
+    print(f"Wrote {len(df)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Scaling benchmarks for the generation stages.
+
+Every case runs in a fresh process so its peak RSS is its own. Inputs are synthetic
+(see fake_coursera.py) and built before the clock starts; only the stage call is timed.
+
+Usage:
+    python benchmarks/run_benchmarks.py                              # full suite
+    python benchmarks/run_benchmarks.py --users 1000 10000 --catalog 1000
+    python benchmarks/run_benchmarks.py --save-baseline              # store results as the baseline
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(BENCHMARK_DIR), 'src'))
+sys.path.append(BENCHMARK_DIR)
+
+DEFAULT_USERS = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_CATALOGS = [1_000, 10_000, 50_000]
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results.json')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# bcrypt is benchmarked on a capped sample at the minimum cost; its rows/sec scales linearly
+HASH_SAMPLE = 10_000
+HASH_ROUNDS = 4
+# Synthetic courses per catalog course in the synthetic course_generation case
+SYNTHETIC_COURSE_FACTOR = 20
+# Worker processes of the assignment cases: the pipeline's default (`main.run_skill_users_generation`)
+WORKERS = os.cpu_count()
+# Differences below this many seconds are treated as noise when comparing to the baseline
+NOISE_FLOOR_SECONDS = 0.05
+
+
+def _timed(run):
+    start = time.perf_counter()
+    result = run()
+    return time.perf_counter() - start, result
+
+
+def _classified_catalog(catalog):
+    from fake_coursera import make_fake_coursera
+    from course_data_preparation import course_preperation
+
+    df = make_fake_coursera(catalog).rename(columns={
+        'Course Name': 'course_name', 'Course URL': 'course_url', 'Course Description': 'course_desc', 'Skills': 'skills',
+    })
+    df.insert(0, 'course_id', range(1, len(df) + 1))
+    course_preperation(df)
+    return df
+
+
+def _users(users):
+    from user_data_generate import build_users_batch
+    return build_users_batch(users)
+
+
+def bench_build_users_batch(users, catalog, workdir):
+    from user_data_generate import build_users_batch
+    seconds, df = _timed(lambda: build_users_batch(users))
+    return seconds, len(df)
+
+
+def bench_email_index(users, catalog, workdir):
+    from email_index import EmailIndex
+    users_df = _users(users)
+    seconds, _ = _timed(lambda: EmailIndex().add(users_df))
+    return seconds, len(users_df)
+
+
+def bench_hash_passwords(users, catalog, workdir):
+    from user_data_generate import hash_passwords
+    passwords = _users(min(users, HASH_SAMPLE))['password'].tolist()
+    seconds, hashed = _timed(lambda: hash_passwords(passwords, rounds=HASH_ROUNDS))
+    return seconds, len(hashed)
+
+
+def bench_course_preperation(users, catalog, workdir):
+    from fake_coursera import make_fake_coursera
+    from course_data_extraction import course_extraction
+    from course_data_preparation import course_preperation
+
+    coursera_path = os.path.join(workdir, f'Coursera_{catalog}.csv')
+    make_fake_coursera(catalog).to_csv(coursera_path, index=False)
+    df = course_extraction(coursera_path)
+
+    seconds, _ = _timed(lambda: course_preperation(df))
+    return seconds, len(df)
+
+
+def bench_course_generation(users, catalog, workdir):
+    from course_data_generation import course_generation
+    classified = _classified_catalog(catalog)
+    users_df = _users(users)
+    seconds, (df_courses, df_course_dept) = _timed(lambda: course_generation(classified, users_df))
+    return seconds, len(df_courses) + len(df_course_dept)
+
+
+def bench_synthetic_course_generation(users, catalog, workdir):
+    from course_data_generation import course_generation
+    classified = _classified_catalog(catalog)
+    users_df = _users(users)
+    seconds, (df_courses, df_course_dept) = _timed(
+        lambda: course_generation(classified, users_df, synthetic_courses=catalog * SYNTHETIC_COURSE_FACTOR))
+    return seconds, len(df_courses) + len(df_course_dept)
+
+
+def bench_create_skill_and_dept_csvs(users, catalog, workdir):
+    from fake_coursera import make_fake_skills
+    from skill_data_generation import create_skill_and_dept_csvs
+
+    skills_path = os.path.join(workdir, f'extracted_skills_{catalog}.csv')
+    make_fake_skills(catalog).to_csv(skills_path, index=False)
+
+    seconds, _ = _timed(lambda: create_skill_and_dept_csvs(skills_path, workdir))
+    with open(os.path.join(workdir, 'SkillDepartment.csv')) as f:
+        rows = sum(1 for _ in f) - 1
+    return seconds, rows
+
+
+def bench_skill_tables_from_courses(users, catalog, workdir):
+    from skill_data_generation import skill_tables_from_courses
+    classified = _classified_catalog(catalog)
+    seconds, (df_skills, df_skill_dept) = _timed(lambda: skill_tables_from_courses(classified))
+    return seconds, len(classified)
+
+
+def bench_generate_skillUsers(users, catalog, workdir):
+    from fake_coursera import make_fake_skills
+    from skill_data_generation import build_skill_tables
+    from skillUsers_data_generation import generate_skillUsers
+
+    _, skill_departments = build_skill_tables(make_fake_skills(catalog))
+    users_df = _users(users)
+    seconds, df = _timed(lambda: generate_skillUsers(users_df, skill_departments, workers=WORKERS))
+    return seconds, len(df)
+
+
+def bench_generate_course_users(users, catalog, workdir):
+    from course_data_generation import course_generation
+    from courseUsers_data_generation import generate_course_users
+
+    users_df = _users(users)
+    _, course_departments = course_generation(_classified_catalog(catalog), users_df)
+    seconds, df = _timed(lambda: generate_course_users(users_df, course_departments, workers=WORKERS))
+    return seconds, len(df)
+
+
+def bench_stream_course_users(users, catalog, workdir):
+    from course_data_generation import course_generation
+    from courseUsers_data_generation import iter_course_users
+    from table_io import ChunkedTableWriter
+
+    users_df = _users(users)
+    _, course_departments = course_generation(_classified_catalog(catalog), users_df)
+
+    def stream():
+        with ChunkedTableWriter(os.path.join(workdir, 'CourseUser.csv.zst'), background=True) as writer:
+            for batch in iter_course_users(users_df, course_departments, workers=WORKERS):
+                writer.write(batch)
+        return writer.rows
+
+    return _timed(stream)
+
+
+def bench_validate_dataset(users, catalog, workdir):
+    from fake_coursera import make_fake_skills
+    from course_data_generation import course_generation
+    from courseUsers_data_generation import generate_course_users
+    from skill_data_generation import build_skill_tables
+    from skillUsers_data_generation import generate_skillUsers
+    from validation import validate_dataset
+
+    users_df = _users(users)
+    skills, skill_departments = build_skill_tables(make_fake_skills(catalog))
+    courses, course_departments = course_generation(_classified_catalog(catalog), users_df)
+    tables = {
+        'User': users_df, 'Course': courses, 'CourseDepartment': course_departments, 'Skill': skills,
+        'SkillDepartment': skill_departments,
+        'SkillUsers': generate_skillUsers(users_df, skill_departments, workers=WORKERS),
+        'CourseUser': generate_course_users(users_df, course_departments, workers=WORKERS),
+    }
+    seconds, _ = _timed(lambda: validate_dataset(tables))
+    return seconds, len(tables['SkillUsers']) + len(tables['CourseUser'])
+
+
+# name -> (function, axis). Cases of a 'users' benchmark use every --users size with the
+# --assignment-catalog size; 'catalog' benchmarks use every --catalog size with --catalog-users users.
+BENCHMARKS = {
+    'build_users_batch': (bench_build_users_batch, 'users'),
+    'email_index': (bench_email_index, 'users'),
+    'hash_passwords': (bench_hash_passwords, 'users'),
+    'course_preperation': (bench_course_preperation, 'catalog'),
+    'course_generation': (bench_course_generation, 'catalog'),
+    'synthetic_course_generation': (bench_synthetic_course_generation, 'catalog'),
+    'create_skill_and_dept_csvs': (bench_create_skill_and_dept_csvs, 'catalog'),
+    'skill_tables_from_courses': (bench_skill_tables_from_courses, 'catalog'),
+    'generate_skillUsers': (bench_generate_skillUsers, 'users'),
+    'generate_course_users': (bench_generate_course_users, 'users'),
+    'stream_course_users': (bench_stream_course_users, 'users'),
+    'validate_dataset': (bench_validate_dataset, 'users'),
+}
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_case(connection, name, users, catalog, workdir):
+    os.environ['TQDM_DISABLE'] = '1'
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            seconds, rows = BENCHMARKS[name][0](users, catalog, workdir)
+        connection.send({'seconds': seconds, 'rows': rows, 'peak_rss_mb': _peak_rss_mb()})
+    except Exception as e:
+        connection.send({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+
+def run_case(name, users, catalog, workdir):
+    """Run one benchmark case in a fresh process and return its measurements."""
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case, args=(child, name, users, catalog, workdir))
+    process.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {'error': f"benchmark process exited with code {process.exitcode}"}
+    process.join()
+
+    result.update({'benchmark': name, 'users': users, 'catalog': catalog})
+    if 'seconds' in result:
+        result['rows_per_sec'] = result['rows'] / result['seconds'] if result['seconds'] > 0 else None
+    return result
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Match results to baseline cases by (benchmark, users, catalog).
+
+    Returns:
+        list[dict]: Cases slower than the baseline by more than `tolerance` (a fraction).
+    """
+    key = lambda case: (case['benchmark'], case['users'], case['catalog'])
+    previous = {key(case): case for case in baseline.get('results', []) if 'seconds' in case}
+
+    regressions = []
+    for case in results:
+        before = previous.get(key(case))
+        if before is None or 'seconds' not in case:
+            continue
+        ratio = case['seconds'] / before['seconds'] if before['seconds'] > 0 else float('inf')
+        if ratio > 1 + tolerance and case['seconds'] - before['seconds'] > NOISE_FLOOR_SECONDS:
+            regressions.append({**case, 'baseline_seconds': before['seconds'], 'ratio': ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every generation stage at several input sizes.")
+    parser.add_argument('--users', type=int, nargs='+', default=DEFAULT_USERS, help="User counts")
+    parser.add_argument('--catalog', type=int, nargs='+', default=DEFAULT_CATALOGS, help="Course/skill catalog sizes")
+    parser.add_argument('--assignment-catalog', type=int, default=200,
+                        help="Catalog size used by the user-scaling benchmarks")
+    parser.add_argument('--catalog-users', type=int, default=1_000,
+                        help="User count used by the catalog-scaling benchmarks")
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON file for the results")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Also store the results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='datagen-bench-') as workdir:
+        for name in args.benchmarks:
+            axis = BENCHMARKS[name][1]
+            cases = ([(users, args.assignment_catalog) for users in args.users] if axis == 'users'
+                     else [(args.catalog_users, catalog) for catalog in args.catalog])
+
+            for users, catalog in cases:
+                result = run_case(name, users, catalog, workdir)
+                results.append(result)
+                if 'error' in result:
+                    print(f"{name:<28} users={users:<9} catalog={catalog:<7} FAILED: {result['error']}")
+                else:
+                    print(f"{name:<28} users={users:<9} catalog={catalog:<7} {result['seconds']:9.3f}s "
+                          f"{result['peak_rss_mb']:9.1f} MB {result['rows_per_sec'] or 0:14,.0f} rows/s")
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'workers': WORKERS,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    exit_code = 0
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for case in regressions:
+            print(f"REGRESSION {case['benchmark']} users={case['users']} catalog={case['catalog']}: "
+                  f"{case['seconds']:.3f}s vs {case['baseline_seconds']:.3f}s ({case['ratio']:.2f}x)")
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"No regressions against {args.baseline}")
+
+    if any('error' in case for case in results):
+        exit_code = 1
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,619 @@
 import os
 import sys
-import pandas as pd
+import argparse
+from functools import partial
 from colorama import Fore, Style
 
-sys.path.append(os.path.join(os.getcwd(), 'src'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
 
-from user_data_generate import generate_user_data
-from course_data_extraction import course_extraction
-from course_data_preparation import course_preperation
-from course_data_generation import course_generation
-from skill_data_generation import create_skill_and_dept_csvs
-from skillUsers_data_generation import generate_skillUsers
-from courseUsers_data_generation import generate_course_users
+# Only lightweight modules are imported here; pandas, scikit-learn, Faker and bcrypt are
+# imported by the stages that use them, so `--help` and cheap stages start quickly
+from pipeline import Stage, TableStore, MANIFEST_NAME, refresh_manifest, run_pipeline
+from telemetry import RunTelemetry
 
-def main():
-    generate_user_data(800)
+NO_OF_USERS = 800
+BCRYPT_ROUNDS = 12
+# bcrypt accepts cost factors in this range
+BCRYPT_ROUNDS_RANGE = (4, 31)
+CLASSIFICATION_THRESHOLD = 0.09
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DATABASE_FILE = 'webapp.db'
+REPORT_FILE = 'run_report.json'
+VALIDATION_REPORT_FILE = 'validation_report.json'
+CLASSIFICATION_CACHE_FILE = '.classification_cache.sqlite'
+CLASSIFICATION_CACHE_SIZE = 1_000_000
+CLASSIFIERS = ['matrix', 'hashing', 'loop']
+# 'batch' builds the users with array operations, 'loop' with one Faker call per field and user
+USER_GENERATORS = ['batch', 'loop']
+# Keys of table_io.OUTPUT_FORMATS and table_io.CSV_COMPRESSIONS, listed here so parsing the
+# command line needs no pandas
+OUTPUT_FORMATS = ['csv', 'parquet']
+COMPRESSIONS = ['gzip', 'zstd']
+# Courses the hashing classifier is compared on against the matrix one, and the classifier
+# in use against the original per-course one with --compare-classifiers
+AGREEMENT_SAMPLE = 10_000
+SHARD_PARTS_DIR = 'shards'
+
+# Database table name -> pipeline table name, in the order the loader expects them
+DATABASE_TABLES = {
+    'User': 'users',
+    'Course': 'courses',
+    'CourseDepartment': 'course_departments',
+    'Skill': 'skills',
+    'SkillDepartment': 'skill_departments',
+    'SkillUsers': 'skill_users',
+    'CourseUser': 'course_users',
+}
+
+
+def build_tables(data_dir=DATA_DIR, output_format='csv', compression=None):
+    """
+    Every table of the pipeline: name -> (file, loader used when it is not in memory).
+    The input files keep their names; generated tables use `output_format`, and the link
+    tables are compressed with `compression` when it is set. Files that are not tables
+    (database, cache, shard parts) have no loader.
+    """
+    from table_io import read_table, table_file
+
+    def data_path(file_name):
+        return os.path.join(data_dir, file_name)
+
+    def output(name, compression=None):
+        return data_path(table_file(name, output_format, compression))
+
+    return {
+        'coursera': (data_path('Coursera.csv'), None),
+        'extracted_skills': (data_path('extracted_skills.csv'), read_table),
+        'users': (output('User'), read_table),
+        'user_passwords': (output('user_data_plain'), read_table),
+        'extracted_courses': (output('extracted_courses'), read_table),
+        # assigned_departments stays in its file form; readers flatten it (`table_io.flatten_id_lists`)
+        'classified_courses': (output('classified_courses'), read_table),
+        'classification_diff': (output('classification_diff'), read_table),
+        'courses': (output('Course'), read_table),
+        'course_departments': (output('CourseDepartment'), read_table),
+        'skills': (output('Skill'), read_table),
+        'skill_departments': (output('SkillDepartment'), read_table),
+        'skill_users': (output('SkillUsers', compression), read_table),
+        'course_users': (output('CourseUser', compression), read_table),
+        'database': (data_path(DATABASE_FILE), None),
+        'validation_report': (data_path(VALIDATION_REPORT_FILE), None),
+        'classification_cache': (data_path(CLASSIFICATION_CACHE_FILE), None),
+        'shard_parts': (data_path(SHARD_PARTS_DIR), None),
+    }
+
+
+def _classification_cache(tables, use_cache):
+    from classification_cache import ClassificationCache
+
+    return ClassificationCache(tables.path('classification_cache'), CLASSIFICATION_CACHE_SIZE) if use_cache else None
+
+
+def run_user_generation(tables, no_of_users=NO_OF_USERS, seed=None, bcrypt_rounds=BCRYPT_ROUNDS, generator='batch'):
+    from seeding import stage_rng
+    from user_data_generate import build_user_tables
+
+    df_users, df_passwords = build_user_tables(no_of_users, bcrypt_rounds=bcrypt_rounds, batch=generator == 'batch',
+                                               rng=stage_rng(seed, 'users'))
+    tables.put('users', df_users)
+    tables.put('user_passwords', df_passwords)
+
+
+def run_course_extraction(tables, chunk_size=None):
+    from course_data_extraction import course_extraction, stream_course_extraction
 
     # For course extraction need coursera csv
-    input_csv_path = os.path.join(os.getcwd(), 'data', 'Coursera.csv')  
-    output_csv_path = os.path.join(os.getcwd(), 'data', 'extracted_courses.csv')
-    course_extraction(input_csv_path, output_csv_path)
+    if chunk_size:
+        # Bounded memory: every chunk is appended to the file as soon as it is read
+        for _ in stream_course_extraction(tables.path('coursera'), tables.path('extracted_courses'), chunk_size):
+            pass
+        tables.written('extracted_courses')
+        return
+
+    tables.put('extracted_courses', course_extraction(tables.path('coursera')))
+
+
+def _compare_classifiers(tables, sample, method, compare_classifiers):
+    """
+    Checks of the classifier in use on a sample of the courses: agreement of the hashing
+    classifier with the matrix one, and with `compare_classifiers` the courses the
+    original per-course classifier assigns other departments to, as a table.
+    """
+    from course_data_preparation import classification_agreement, classification_diff
+
+    if method == 'hashing':
+        classification_agreement(sample, threshold=CLASSIFICATION_THRESHOLD)
+    if compare_classifiers:
+        methods = ('loop', 'matrix' if method == 'loop' else method)
+        tables.put('classification_diff', classification_diff(sample, threshold=CLASSIFICATION_THRESHOLD,
+                                                              methods=methods))
+
+
+def run_course_preparation(tables, chunk_size=None, use_cache=True, method='matrix', compare_classifiers=False):
+    from course_data_preparation import classify_course_chunks, course_preperation
+    from table_io import ChunkedTableWriter, read_table_chunks
+
+    cache = _classification_cache(tables, use_cache)
+    try:
+        if chunk_size:
+            tables.wait(['extracted_courses'])
+            if method == 'hashing' or compare_classifiers:
+                sample = next(read_table_chunks(tables.path('extracted_courses'), AGREEMENT_SAMPLE), None)
+                if sample is not None:
+                    _compare_classifiers(tables, sample, method, compare_classifiers)
+
+            chunks = read_table_chunks(tables.path('extracted_courses'), chunk_size)
+            with ChunkedTableWriter(tables.path('classified_courses')) as writer:
+                for chunk in classify_course_chunks(chunks, threshold=CLASSIFICATION_THRESHOLD, method=method, cache=cache):
+                    writer.write(chunk)
+            tables.written('classified_courses')
+            return
+
+        # Shallow copy: the extracted table may still be being written
+        df_courses = tables.get('extracted_courses').copy(deep=False)
+        _compare_classifiers(tables, df_courses.head(AGREEMENT_SAMPLE), method, compare_classifiers)
+
+        course_preperation(df_courses, threshold=CLASSIFICATION_THRESHOLD, method=method, cache=cache)
+
+        tables.put('classified_courses', df_courses)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def run_course_generation(tables, no_of_users=NO_OF_USERS, seed=None, sharded=False, synthetic_courses=0):
+    from course_data_generation import course_generation
+    from seeding import stage_rng
+    from user_data_generate import admin_users
+
+    # Sharded runs create the users after the courses; creators only need the admin ids
+    users = admin_users(no_of_users) if sharded else tables.get('users')
+    df_courses_output, df_course_dept = course_generation(tables.get('classified_courses'), users,
+                                                          rng=stage_rng(seed, 'courses'),
+                                                          synthetic_courses=synthetic_courses)
+
+    tables.put('courses', df_courses_output)
+    tables.put('course_departments', df_course_dept)
+
+
+def run_skill_generation(tables, from_courses=False):
+    from skill_data_generation import build_skill_tables, skill_tables_from_courses
+
+    if from_courses:
+        df_skills, df_skill_dept = skill_tables_from_courses(tables.get('classified_courses'))
+    else:
+        df_skills, df_skill_dept = build_skill_tables(tables.get('extracted_skills'))
+
+    tables.put('skills', df_skills)
+    tables.put('skill_departments', df_skill_dept)
+
+
+def _stream_table(tables, name, batches):
+    from table_io import ChunkedTableWriter
+
+    # Batches are written (and compressed) on a background thread while the next ones are drawn
+    with ChunkedTableWriter(tables.path(name), background=True) as writer:
+        for batch in batches:
+            writer.write(batch)
+    tables.written(name)
+
+
+def run_skill_users_generation(tables, seed=None, workers=None, stream=False):
+    from seeding import stage_rng
+    from skillUsers_data_generation import generate_skillUsers, iter_skillUsers
+
+    generate = iter_skillUsers if stream else generate_skillUsers
+    skill_users = generate(tables.get('users'), tables.get('skill_departments'), rng=stage_rng(seed, 'skill_users'),
+                           workers=workers or os.cpu_count())
+    if stream:
+        _stream_table(tables, 'skill_users', skill_users)
+    else:
+        tables.put('skill_users', skill_users)
+
+
+def run_course_users_generation(tables, seed=None, workers=None, stream=False):
+    from courseUsers_data_generation import generate_course_users, iter_course_users
+    from seeding import stage_rng
+
+    generate = iter_course_users if stream else generate_course_users
+    course_users = generate(tables.get('users'), tables.get('course_departments'), rng=stage_rng(seed, 'course_users'),
+                            workers=workers or os.cpu_count())
+    if stream:
+        _stream_table(tables, 'course_users', course_users)
+    else:
+        tables.put('course_users', course_users)
+
+
+def run_sharded_user_generation(tables, no_of_users=NO_OF_USERS, seed=None, shard_size=None, workers=None,
+                                bcrypt_rounds=BCRYPT_ROUNDS):
+    from sharded_generation import SHARD_TABLES, generate_sharded
+
+    tables.wait(['skill_departments', 'course_departments'])
+    generate_sharded(no_of_users, tables.get('skill_departments'), tables.get('course_departments'),
+                     {name: tables.path(name) for name in SHARD_TABLES}, tables.path('shard_parts'),
+                     shard_size=shard_size, workers=workers, seed=seed, bcrypt_rounds=bcrypt_rounds)
+    for name in SHARD_TABLES:
+        tables.written(name)
+
+
+def run_validation(tables):
+    from validation import failed_checks, validate_dataset, write_validation_report
+
+    # Tables not produced in this run are read with only the columns the checks need
+    report = validate_dataset({name: tables.get_or_path(table) for name, table in DATABASE_TABLES.items()})
+    write_validation_report(report, tables.path('validation_report'))
+    tables.written('validation_report')
+
+    failures = failed_checks(report)
+    if failures:
+        for line in failures:
+            print(f"{Fore.RED}{line}{Style.RESET_ALL}")
+        raise ValueError(f"{len(failures)} validation checks failed, see {tables.path('validation_report')}")
+    print(f"{Fore.GREEN}Validated {sum(report['rows'].values()):,} rows with {len(report['violations'])} checks "
+          f"in {report['seconds']:.2f}s{Style.RESET_ALL}")
+
+
+def run_database_load(tables):
+    from db_loader import load_sqlite_database
+
+    # Tables not in memory are streamed from their files
+    load_sqlite_database({name: tables.get_or_path(table) for name, table in DATABASE_TABLES.items()},
+                         tables.path('database'))
+
+
+def build_stages(no_of_users=NO_OF_USERS, chunk_size=None, use_cache=True, classifier='matrix', seed=None,
+                 shard_size=None, workers=None, stream_assignments=False, synthetic_courses=0,
+                 skills_from_courses=False, bcrypt_rounds=BCRYPT_ROUNDS, user_generator='batch',
+                 compare_classifiers=False):
+    """
+    The pipeline as a stage graph. Stages are listed in dependency order; each one
+    declares the tables it reads and writes so unchanged stages can be skipped.
+
+    Args:
+        no_of_users (int): Number of users to generate.
+        chunk_size (int): When set, course extraction and classification stream the
+            catalog in chunks of this many rows instead of loading it whole. The output
+            does not depend on it, so it is not a stage parameter.
+        use_cache (bool): Reuse earlier course classifications from the on-disk cache.
+        classifier (str): Course classification method (see `course_preperation`).
+        seed (int): Run seed; every random stage draws from its own stream derived from
+            it (see `seeding.stage_rng`). None gives a different dataset on every run.
+        shard_size (int): When set, users and their skill/course assignments are generated
+            together in shards of this many users on `workers` processes (see
+            `sharded_generation`), after the course and skill tables.
+        workers (int): Worker processes for sharded generation and the skill/course
+            assignments (default: all cores). Does not change the output.
+        stream_assignments (bool): Write the skill/course assignments to their files block
+            by block as they are drawn instead of building them in memory. Does not change
+            the output.
+        synthetic_courses (int): Courses to synthesize after the classified catalog by
+            recombining its names, descriptions and departments (see `course_generation`).
+        skills_from_courses (bool): Build the skill catalog from the skills column of the
+            classified courses instead of extracted_skills.csv.
+        bcrypt_rounds (int): bcrypt cost factor of the hashed passwords.
+        user_generator (str): 'batch' (vectorized, `build_users_batch`) or 'loop' (one
+            Faker call per field and user) for the unsharded user stage.
+        compare_classifiers (bool): Also write the sampled courses the per-course
+            classifier assigns other departments to than `classifier` (classification_diff).
+    """
+    course_stages = [
+        Stage('extract_courses', partial(run_course_extraction, chunk_size=chunk_size),
+              inputs=['coursera'],
+              outputs=['extracted_courses']),
+        Stage('classify_courses', partial(run_course_preparation, chunk_size=chunk_size, use_cache=use_cache,
+                                                 method=classifier, compare_classifiers=compare_classifiers),
+              inputs=['extracted_courses'],
+              outputs=['classified_courses'] + (['classification_diff'] if compare_classifiers else []),
+              params={'threshold': CLASSIFICATION_THRESHOLD, 'classifier': classifier,
+                      'compare_classifiers': compare_classifiers}),
+    ]
+    skill_stage = Stage('skills', partial(run_skill_generation, from_courses=skills_from_courses),
+                        inputs=['classified_courses' if skills_from_courses else 'extracted_skills'],
+                        outputs=['skills', 'skill_departments'],
+                        params={'skills_from_courses': skills_from_courses})
+    # Runs before the database load, so a failed check stops the run
+    validation_stage = Stage('validate', run_validation,
+                             inputs=list(DATABASE_TABLES.values()),
+                             outputs=['validation_report'])
+    database_stage = Stage('load_database', run_database_load,
+                           inputs=list(DATABASE_TABLES.values()),
+                           outputs=['database'])
+
+    if shard_size:
+        return course_stages + [
+            Stage('courses', partial(run_course_generation, no_of_users=no_of_users, seed=seed, sharded=True,
+                                     synthetic_courses=synthetic_courses),
+                  inputs=['classified_courses'],
+                  outputs=['courses', 'course_departments'],
+                  params={'seed': seed, 'no_of_users': no_of_users, 'synthetic_courses': synthetic_courses}),
+            skill_stage,
+            Stage('user_shards', partial(run_sharded_user_generation, no_of_users=no_of_users, seed=seed,
+                                         shard_size=shard_size, workers=workers, bcrypt_rounds=bcrypt_rounds),
+                  inputs=['skill_departments', 'course_departments'],
+                  outputs=['users', 'user_passwords', 'skill_users', 'course_users'],
+                  params={'no_of_users': no_of_users, 'seed': seed, 'shard_size': shard_size,
+                          'bcrypt_rounds': bcrypt_rounds}),
+            validation_stage,
+            database_stage,
+        ]
+
+    return [
+        Stage('users', partial(run_user_generation, no_of_users=no_of_users, seed=seed, bcrypt_rounds=bcrypt_rounds,
+                               generator=user_generator),
+              outputs=['users', 'user_passwords'],
+              params={'no_of_users': no_of_users, 'seed': seed, 'bcrypt_rounds': bcrypt_rounds,
+                      'user_generator': user_generator}),
+    ] + course_stages + [
+        Stage('courses', partial(run_course_generation, seed=seed, synthetic_courses=synthetic_courses),
+              inputs=['classified_courses', 'users'],
+              outputs=['courses', 'course_departments'],
+              params={'seed': seed, 'synthetic_courses': synthetic_courses}),
+        skill_stage,
+        Stage('skill_users', partial(run_skill_users_generation, seed=seed, workers=workers, stream=stream_assignments),
+              inputs=['users', 'skill_departments'],
+              outputs=['skill_users'],
+              params={'seed': seed}),
+        Stage('course_users', partial(run_course_users_generation, seed=seed, workers=workers,
+                                      stream=stream_assignments),
+              inputs=['users', 'course_departments'],
+              outputs=['course_users'],
+              params={'seed': seed}),
+        validation_stage,
+        database_stage,
+    ]
+
+
+def run_append(tables, manifest_path, add_users=None, add_courses=None, seed=None, chunk_size=None, use_cache=True,
+               classifier='matrix', workers=None, bcrypt_rounds=BCRYPT_ROUNDS):
+    """
+    Grow the existing tables instead of regenerating them, then record the new files in
+    the manifest so the next run keeps them and only revalidates and reloads the database.
+    """
+    from append_mode import APPEND_TABLES, append_courses, append_users
+    from course_data_extraction import DEFAULT_CHUNK_SIZE
+    from seeding import stage_rng
+    from table_io import read_last_row
+
+    paths = {name: tables.path(name) for name in APPEND_TABLES}
+    # Stream names include the last existing id, so successive appends draw different numbers
+    if add_users:
+        last_user_id = int(read_last_row(paths['users'])['user_id'].iloc[0])
+        append_users(paths, add_users, rng=stage_rng(seed, 'append_users', last_user_id),
+                     bcrypt_rounds=bcrypt_rounds, hash_workers=workers)
+    if add_courses:
+        last_course_id = int(read_last_row(paths['course_departments'])['course_id'].iloc[0])
+        cache = _classification_cache(tables, use_cache)
+        try:
+            append_courses(paths, add_courses, rng=stage_rng(seed, 'append_courses', last_course_id),
+                           threshold=CLASSIFICATION_THRESHOLD, method=classifier, cache=cache,
+                           chunk_size=chunk_size or DEFAULT_CHUNK_SIZE)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    refresh_manifest(manifest_path, paths.values(), rerun=['validate', 'load_database'])
+
+
+def _bcrypt_rounds(value):
+    rounds = int(value)
+    low, high = BCRYPT_ROUNDS_RANGE
+    if not low <= rounds <= high:
+        raise argparse.ArgumentTypeError(f"bcrypt rounds must be between {low} and {high}")
+    return rounds
+
+
+def _options():
+    """Every command line option: dest -> (flag, `add_argument` keyword arguments)."""
+    return {
+        'data_dir': ('--data-dir', dict(
+            default=DATA_DIR, metavar='DIR',
+            help="Directory of the input files and generated tables (default: data/ next to main.py)")),
+        'format': ('--format', dict(
+            choices=OUTPUT_FORMATS, default='csv',
+            help="File format of the generated tables (parquet needs pyarrow)")),
+        'seed': ('--seed', dict(
+            type=int,
+            help="Seed for every random stage; the same seed reproduces the same files byte for byte")),
+        'users': ('--users', dict(
+            type=int, default=NO_OF_USERS, metavar='N',
+            help=f"Number of users to generate (default: {NO_OF_USERS})")),
+        'bcrypt_rounds': ('--bcrypt-rounds', dict(
+            type=_bcrypt_rounds, default=BCRYPT_ROUNDS, metavar='N',
+            help=f"bcrypt cost factor of the hashed passwords (default: {BCRYPT_ROUNDS}); lower it, "
+                 f"down to {BCRYPT_ROUNDS_RANGE[0]}, for non-production fixtures")),
+        'user_generator': ('--user-generator', dict(
+            choices=USER_GENERATORS, default='batch',
+            help="How the unsharded users stage builds the users: 'batch' samples every column with "
+                 "array operations (default), 'loop' calls Faker once per field and user")),
+        'background_writes': ('--background-writes', dict(
+            action='store_true',
+            help="Write the table artifacts on a background thread while later stages run")),
+        'compression': ('--compression', dict(
+            choices=COMPRESSIONS,
+            help="Compress the skill and course assignment CSVs (SkillUsers, CourseUser) on several "
+                 "threads; zstd needs pyarrow")),
+        'stream_assignments': ('--stream-assignments', dict(
+            action='store_true',
+            help="Write the skill and course assignments block by block while they are drawn, "
+                 "so memory does not grow with their size")),
+        'report': ('--report', dict(
+            nargs='?', const=True, metavar='PATH',
+            help=f"Record per-stage time, memory, row counts and compute/io split to a JSON report "
+                 f"(default path: <data dir>/{REPORT_FILE})")),
+        'profile': ('--profile', dict(
+            metavar='DIR',
+            help="Also run every stage under cProfile and dump <stage>.prof files to DIR (implies --report)")),
+        'chunk_size': ('--chunk-size', dict(
+            type=int, metavar='ROWS',
+            help="Stream course extraction and classification in chunks of ROWS courses, "
+                 "for catalogs too large to load at once")),
+        'no_classification_cache': ('--no-classification-cache', dict(
+            action='store_true',
+            help=f"Classify every course from scratch instead of reusing {CLASSIFICATION_CACHE_FILE} "
+                 f"in the data directory")),
+        'classifier': ('--classifier', dict(
+            choices=CLASSIFIERS, default='matrix',
+            help="Course classifier. 'hashing' needs no vocabulary and runs in constant memory "
+                 "(with --chunk-size); its agreement with 'matrix' is reported on a sample")),
+        'compare_classifiers': ('--compare-classifiers', dict(
+            action='store_true',
+            help=f"Classify the first {AGREEMENT_SAMPLE:,} courses with the original per-course "
+                 f"classifier too and write the courses it assigns other departments to as "
+                 f"classification_diff")),
+        'synthetic_courses': ('--synthetic-courses', dict(
+            type=int, default=0, metavar='N',
+            help="Add N courses recombined from the names, descriptions and departments of the "
+                 "classified catalog, for course-side load tests beyond the size of Coursera.csv")),
+        'skills_from_courses': ('--skills-from-courses', dict(
+            action='store_true',
+            help="Build the skill catalog from the skills listed by the classified courses instead "
+                 "of extracted_skills.csv")),
+        'shard_size': ('--shard-size', dict(
+            type=int, metavar='USERS',
+            help="Generate users with their skill and course assignments in shards of USERS users "
+                 "on a process pool; an interrupted run resumes from the finished shards")),
+        'workers': ('--workers', dict(
+            type=int,
+            help="Worker processes for the user assignments and --shard-size (default: all cores); "
+                 "does not change the output")),
+    }
+
+
+# Options of every command
+COMMON_OPTIONS = ['data_dir', 'format', 'seed']
+# Options of the stage runner, for `run` and the stage commands
+PIPELINE_OPTIONS = ['background_writes', 'report', 'profile']
+# Options each stage command takes besides those; `run` takes every option. --shard-size
+# picks the sharded variant of `courses`; --compression names the assignment files.
+STAGE_OPTIONS = {
+    'users': ['users', 'bcrypt_rounds', 'user_generator'],
+    'extract_courses': ['chunk_size'],
+    'classify_courses': ['chunk_size', 'no_classification_cache', 'classifier', 'compare_classifiers'],
+    'courses': ['users', 'synthetic_courses', 'shard_size'],
+    'skills': ['skills_from_courses'],
+    'skill_users': ['workers', 'stream_assignments', 'compression'],
+    'course_users': ['workers', 'stream_assignments', 'compression'],
+    'user_shards': ['users', 'bcrypt_rounds', 'shard_size', 'workers', 'compression'],
+    'validate': ['compression'],
+    'load_database': ['compression'],
+}
+APPEND_OPTIONS = ['bcrypt_rounds', 'compression', 'workers', 'chunk_size', 'no_classification_cache', 'classifier']
+
+
+def _add_options(parser, options, names):
+    """
+    Add the options `names` to `parser`, in `options` order, and default the others, so
+    every command parses into the same set of attributes.
+    """
+    for dest, (flag, kwargs) in options.items():
+        if dest in names:
+            parser.add_argument(flag, **kwargs)
+        else:
+            parser.set_defaults(**{dest: kwargs.get('default', False if kwargs.get('action') == 'store_true' else None)})
+
 
-    # For course preparation
-    input_csv_path = os.path.join(os.getcwd(), 'data', 'extracted_courses.csv')  
-    df_courses = pd.read_csv(input_csv_path)
+def build_parser(stages):
+    """
+    Command line: `run` (the default command) runs the whole pipeline, every stage name
+    runs that stage alone on the tables already in the data directory, and `append`
+    grows the existing tables. Each command takes only the options it reads.
+    """
+    options = _options()
 
-    dept_assignment_counts = course_preperation(df_courses)
+    parser = argparse.ArgumentParser(description="Generate the webapp datasets.")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
 
-    output_csv_path = os.path.join(os.getcwd(), 'data', 'classified_courses.csv')
-    df_courses.to_csv(output_csv_path, index=False)
+    run = commands.add_parser('run',
+                              help="Run the whole pipeline (default). Stages whose inputs, parameters and outputs "
+                                   "are unchanged since the last run are skipped")
+    _add_options(run, options, options)
+    run.add_argument('--force', action='append', default=[], metavar='STAGE', choices=list(stages) + ['all'],
+                     help=f"Rerun a stage even if it is up to date (repeatable, or 'all'). Stages: {', '.join(stages)}")
 
-    print(f"{Fore.GREEN}Classified courses saved to {output_csv_path}{Style.RESET_ALL}")
+    for name, stage in stages.items():
+        reads = f"reads {', '.join(stage.inputs)}; " if stage.inputs else ''
+        command = commands.add_parser(name, help=f"Run only this stage ({reads}writes {', '.join(stage.outputs)})")
+        _add_options(command, options, COMMON_OPTIONS + STAGE_OPTIONS.get(name, []) + PIPELINE_OPTIONS)
 
-    # For Course Data generation
-    input_classified_courses = os.path.join(os.getcwd(), 'data', 'classified_courses.csv')
-    input_user_data = os.path.join(os.getcwd(), 'data', 'User.csv')
+    append = commands.add_parser('append', help="Grow the existing tables instead of regenerating them")
+    _add_options(append, options, COMMON_OPTIONS + APPEND_OPTIONS)
+    append.add_argument('--add-users', type=int, metavar='N',
+                        help="Append N users, with their skills and courses")
+    append.add_argument('--add-courses', metavar='CSV',
+                        help="Append the courses of a Coursera-format CSV and assign them to the existing users")
+    return parser
 
-    df_courses_output, df_course_dept = course_generation(input_classified_courses, input_user_data)
 
-    output_courses_csv = os.path.join(os.getcwd(), 'data', 'Course.csv')
-    df_courses_output.to_csv(output_courses_csv, index=False)
+def main(argv=None):
+    # Both stage graphs, for the command names; building them imports nothing heavy
+    stages = {}
+    for stage in build_stages() + build_stages(shard_size=1):
+        stages.setdefault(stage.name, stage)
+    parser = build_parser(stages)
 
-    output_dept_csv = os.path.join(os.getcwd(), 'data', 'CourseDepartment.csv')
-    df_course_dept.to_csv(output_dept_csv, index=False)
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0].startswith('-') and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + argv
+    args = parser.parse_args(argv)
 
-    print(f"{Fore.GREEN}Course details saved to {output_courses_csv}{Style.RESET_ALL}")
-    print(f"{Fore.GREEN}Course to department mappings saved to {output_dept_csv}{Style.RESET_ALL}")
+    data_dir = os.path.abspath(args.data_dir)
+    os.makedirs(data_dir, exist_ok=True)
+    manifest_path = os.path.join(data_dir, MANIFEST_NAME)
 
-    # Create skills
-    input_file = os.path.join(os.getcwd(), 'data', 'extracted_skills.csv')
-    output_dir = os.path.join(os.getcwd(), 'data')
+    if args.command == 'append':
+        if not (args.add_users or args.add_courses):
+            parser.error("append needs --add-users and/or --add-courses")
+        run_append(TableStore(build_tables(data_dir, args.format, args.compression)), manifest_path, add_users=args.add_users,
+                   add_courses=args.add_courses, seed=args.seed, chunk_size=args.chunk_size,
+                   use_cache=not args.no_classification_cache, classifier=args.classifier, workers=args.workers,
+                   bcrypt_rounds=args.bcrypt_rounds)
+        print(f"{Fore.GREEN}Appended to the existing tables; the next run revalidates them and reloads {DATABASE_FILE}{Style.RESET_ALL}")
+        return
 
-    create_skill_and_dept_csvs(input_file, output_dir)
+    shard_size = args.shard_size
+    if args.command == 'user_shards' and not shard_size:
+        from sharded_generation import DEFAULT_SHARD_SIZE
+        shard_size = DEFAULT_SHARD_SIZE
+    stages = build_stages(no_of_users=args.users, chunk_size=args.chunk_size, use_cache=not args.no_classification_cache,
+                          classifier=args.classifier, seed=args.seed, shard_size=shard_size, workers=args.workers,
+                          stream_assignments=args.stream_assignments, synthetic_courses=args.synthetic_courses,
+                          skills_from_courses=args.skills_from_courses, bcrypt_rounds=args.bcrypt_rounds,
+                          user_generator=args.user_generator, compare_classifiers=args.compare_classifiers)
+    table_files = build_tables(data_dir, args.format, args.compression)
 
-    # Create skill users
-    user_data_path = os.path.join(os.getcwd(), 'data', 'User.csv')
-    skill_department_path = os.path.join(os.getcwd(), 'data', 'SkillDepartment.csv')
+    if args.command == 'run':
+        force = args.force
+    else:
+        # A stage command always runs its stage, on the tables earlier runs left in the data directory
+        stages = [stage for stage in stages if stage.name == args.command]
+        if not stages:
+            parser.error(f"{args.command} is only part of the {'unsharded' if shard_size else 'sharded'} pipeline")
+        missing = [table_files[name][0] for name in stages[0].inputs if not os.path.exists(table_files[name][0])]
+        if missing:
+            parser.error(f"{args.command} needs {', '.join(missing)}; run the stages before it first")
+        force = [args.command]
 
-    skill_users_df = generate_skillUsers(user_data_path, skill_department_path)
-    output_path = os.path.join(os.getcwd(), 'data', 'SkillUsers.csv')
-    skill_users_df.to_csv(output_path, index=False)
-    print(f"{Fore.GREEN}Stored SkillUsers.csv at : {output_path}{Style.RESET_ALL}")
+    from table_io import BackgroundWriter
 
-    # Create course users
-    user_data_path = os.path.join(os.getcwd(), 'data', 'User.csv')
-    course_department_path = os.path.join(os.getcwd(), 'data', 'CourseDepartment.csv')
+    writer = BackgroundWriter() if args.background_writes else None
+    tables = TableStore(table_files, writer=writer)
+    report_path = args.report if isinstance(args.report, str) else None
+    if args.report is True or (args.profile and report_path is None):
+        report_path = os.path.join(data_dir, REPORT_FILE)
+    telemetry = RunTelemetry(profile_dir=args.profile) if report_path else None
+    try:
+        run_pipeline(stages, tables, manifest_path, force=force, telemetry=telemetry)
+    finally:
+        if writer is not None:
+            writer.close()
 
-    course_users_df = generate_course_users(user_data_path, course_department_path)
-    output_path = os.path.join(os.getcwd(), 'data', 'CourseUser.csv')
-    course_users_df.to_csv(output_path, index=False)
-    print(f"{Fore.GREEN}Stored CourseUsers.csv at : {output_path}{Style.RESET_ALL}")
+    if telemetry is not None:
+        for line in telemetry.summary():
+            print(line)
+        telemetry.write_report(report_path)
+        print(f"{Fore.GREEN}Run report saved to {report_path}{Style.RESET_ALL}")
 
-    print(f"{Fore.GREEN}Created all CSVs{Style.RESET_ALL}")
+    print(f"{Fore.GREEN}Created all tables{Style.RESET_ALL}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,146 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from colorama import Fore, Style
+
+from assignment_engine import assign_items, build_dept_csr, prepare_user_ages
+from course_data_extraction import iter_course_chunks
+from course_data_generation import course_generation
+from course_data_preparation import classify_course_chunks
+from email_index import EmailIndex
+from courseUsers_data_generation import COURSE_COUNT_RULES, SCORE_RULES
+from skillUsers_data_generation import COMPETENCY_RULES, SKILL_COUNT_RULES
+from table_io import append_table, read_last_row, read_table
+from user_data_generate import (DEFAULT_BCRYPT_ROUNDS, END_DATE, admin_users, build_users_batch, default_max_step,
+                                hash_passwords, report_email_collisions)
+
+# Tables an append reads or grows, by pipeline table name
+APPEND_TABLES = ['users', 'user_passwords', 'skill_users', 'course_users', 'courses', 'course_departments',
+                 'skill_departments']
+# Appended users are created at least this long before END_DATE, so they fall in the
+# assignment window and have account ages to draw skills and courses from
+APPEND_MIN_SPAN = timedelta(days=90)
+
+
+def _last_value(path, column, default=0):
+    last_row = read_last_row(path)
+    return default if last_row is None else last_row[column].iloc[0]
+
+
+def _append(name, df, paths):
+    append_table(df, paths[name])
+    print(f"{Fore.GREEN}Appended {len(df)} rows to {paths[name]}{Style.RESET_ALL}")
+
+
+def _continue_ids(df, paths, name):
+    # Generated ids run from 1, so shifting them keeps their dtype
+    df['id'] += int(_last_value(paths[name], 'id'))
+    return df
+
+
+def append_users(paths, no_of_users, rng=None, bcrypt_rounds=DEFAULT_BCRYPT_ROUNDS, hash_workers=None):
+    """
+    Add `no_of_users` users to an existing dataset, with their passwords and their skill
+    and course assignments.
+
+    user_id and createdAt continue from the last row of the user table; the new users
+    are spread over what is left of the date range. When less than APPEND_MIN_SPAN is
+    left, they are spread over the last APPEND_MIN_SPAN before END_DATE instead, so
+    they still get skills and courses. New emails that are already taken get the next
+    numeric suffix. Only the tails of the existing tables, the name columns of the user
+    table (for the email index) and the dept -> skill/course mappings are read, so apart
+    from the email index the cost grows with the number of new users, not with the
+    dataset.
+
+    Args:
+        paths (dict): Pipeline table name -> file, for every table in APPEND_TABLES.
+        no_of_users (int): Number of users to add.
+        rng (np.random.Generator): Random source.
+        bcrypt_rounds (int): bcrypt cost factor.
+        hash_workers (int): Processes used for hashing. Defaults to the available cores.
+
+    Returns:
+        dict: table name -> rows appended.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+
+    last_user = read_last_row(paths['users'])
+    if last_user is None:
+        raise ValueError(f"{paths['users']} is empty; run the full pipeline first")
+    last_user_id = int(last_user['user_id'].iloc[0])
+    created_after = min(pd.Timestamp(last_user['createdAt'].iloc[0]), pd.Timestamp(END_DATE - APPEND_MIN_SPAN))
+
+    users = build_users_batch(no_of_users, start_user_id=last_user_id + 1, created_after=created_after,
+                              max_step=default_max_step(no_of_users, created_after), rng=rng)
+    emails = EmailIndex.from_users(read_table(paths['users'], usecols=['first_name', 'last_name', 'account_type']))
+    report_email_collisions(emails.add(users))
+    passwords = users[['user_id', 'password']].copy()
+    users['password'] = hash_passwords(passwords['password'].tolist(), rounds=bcrypt_rounds, workers=hash_workers, rng=rng)
+
+    user_ages = prepare_user_ages(users)
+    skill_users = assign_items(user_ages, build_dept_csr(read_table(paths['skill_departments']), 'skill_id'),
+                               'skill_id', SKILL_COUNT_RULES, 'competency', COMPETENCY_RULES, rng=rng,
+                               desc="Generating skills for new users")
+    course_users = assign_items(user_ages, build_dept_csr(read_table(paths['course_departments']), 'course_id'),
+                                'course_id', COURSE_COUNT_RULES, 'score', SCORE_RULES, rng=rng,
+                                desc="Generating courses for new users")
+
+    appended = {
+        'users': users,
+        'user_passwords': passwords,
+        'skill_users': _continue_ids(skill_users, paths, 'skill_users'),
+        'course_users': _continue_ids(course_users, paths, 'course_users'),
+    }
+    for name, df in appended.items():
+        _append(name, df, paths)
+    return {name: len(df) for name, df in appended.items()}
+
+
+def append_courses(paths, coursera_csv, rng=None, threshold=0.09, method='matrix', cache=None, chunk_size=50_000):
+    """
+    Add the courses of a Coursera-format CSV to an existing dataset.
+
+    The new courses are classified (reusing `cache`), get course_ids after the last
+    existing course and a creator among the existing admins, and every existing user
+    takes a share of the new courses of their department, drawn with the same age rules
+    as the full generation applied to the new courses only. The existing users are read
+    (three columns) but no existing course or assignment is regenerated.
+
+    Args:
+        paths (dict): Pipeline table name -> file, for every table in APPEND_TABLES.
+        coursera_csv (str): New courses, with the columns of Coursera.csv.
+        rng (np.random.Generator): Random source.
+        threshold (float): Classification threshold.
+        method (str): Classifier (see `course_preperation`).
+        cache (ClassificationCache): Optional classification cache.
+        chunk_size (int): Courses read and classified at a time.
+
+    Returns:
+        dict: table name -> rows appended.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+
+    classified = pd.concat(list(classify_course_chunks(iter_course_chunks(coursera_csv, chunk_size),
+                                                       threshold=threshold, method=method, cache=cache)),
+                           ignore_index=True)
+
+    # Every course has at least one department, so the last CourseDepartment row holds the last course
+    first_course_id = int(_last_value(paths['course_departments'], 'course_id')) + 1
+    last_user_id = int(_last_value(paths['users'], 'user_id'))
+    courses, course_departments = course_generation(classified, admin_users(last_user_id), rng=rng,
+                                                    first_course_id=first_course_id)
+
+    users = read_table(paths['users'], usecols=['user_id', 'dept_id', 'createdAt'])
+    course_users = assign_items(prepare_user_ages(users), build_dept_csr(course_departments, 'course_id'),
+                                'course_id', COURSE_COUNT_RULES, 'score', SCORE_RULES, rng=rng,
+                                desc="Assigning new courses to users")
+    # The user table lists users in user_id order, so these rows are grouped like the existing ones
+    appended = {
+        'courses': courses,
+        'course_departments': course_departments,
+        'course_users': _continue_ids(course_users, paths, 'course_users'),
+    }
+    for name, df in appended.items():
+        _append(name, df, paths)
+    return {name: len(df) for name, df in appended.items()}
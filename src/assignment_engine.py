@@ -0,0 +1,308 @@
+import numpy as np
+import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partialmethod
+from pandas.api.types import union_categoricals
+from tqdm import tqdm
+
+from shared_arrays import SharedArrays, attach_arrays
+from telemetry import section
+
+# Only users created in this window get items, aged relative to CURRENT_DATE
+START_DATE = datetime(2019, 3, 28)
+END_DATE = datetime(2021, 6, 10)
+CURRENT_DATE = datetime(2021, 6, 10)
+
+# Upper bound on the random-key matrix drawn at once (rows x items of one department)
+MAX_KEYS_PER_CHUNK = 4_000_000
+# Assignments whose attribute values are drawn at once (see `sample_values`)
+VALUE_CHUNK_ROWS = 1_000_000
+# Users per independently seeded block in `assign_items_parallel`
+ASSIGNMENT_BLOCK_USERS = 50_000
+
+
+def prepare_user_ages(user_data_df, start_date=START_DATE, end_date=END_DATE, current_date=CURRENT_DATE):
+    """
+    Keep users created between `start_date` and `end_date` and compute their account age.
+
+    Args:
+        user_data_df (pd.DataFrame): User table with user_id, dept_id and createdAt.
+
+    Returns:
+        pd.DataFrame: user_id, dept_id, account_age_days.
+    """
+    created_at = pd.to_datetime(user_data_df['createdAt'])
+    in_window = (created_at >= start_date) & (created_at <= end_date)
+
+    user_data = user_data_df.loc[in_window, ['user_id', 'dept_id']].copy()
+    user_data['account_age_days'] = (current_date - created_at[in_window]).dt.days
+    return user_data.reset_index(drop=True)
+
+
+def build_dept_csr(link_df, item_col):
+    """
+    Build a CSR-style dept -> items lookup from a (dept_id, item) link table.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (indptr, items). The items of department d are
+        items[indptr[d]:indptr[d + 1]], in link table order.
+    """
+    link = link_df[['dept_id', item_col]].dropna()
+    dept_ids = link['dept_id'].to_numpy(dtype=np.int64)
+    items = link[item_col].to_numpy(dtype=np.int32)
+
+    order = np.argsort(dept_ids, kind='stable')
+    counts = np.bincount(dept_ids, minlength=1)
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    return indptr, items[order]
+
+
+def bucket_index(ages, rules):
+    """
+    Index of the age bucket each age falls into. A rule covers ages up to and including
+    its `max_age`; a `max_age` of None (last rule only) is open ended. Ages past the
+    last finite bucket fall into the last rule.
+    """
+    edges = [rule['max_age'] for rule in rules if rule['max_age'] is not None]
+    return np.minimum(np.searchsorted(edges, ages, side='left'), len(rules) - 1)
+
+
+def sample_counts(rng, n_items, ages, count_rules):
+    """
+    Draw how many of its department's items every user gets.
+
+    Each count rule gives `low`/`high` fractions of the available items (truncated to
+    int, as `int(len(items) * fraction)`) and an optional `min` floor. The count is drawn
+    uniformly from [low, high], both inclusive.
+    """
+    bucket = bucket_index(ages, count_rules)
+    low = np.array([rule['low'] for rule in count_rules])[bucket]
+    high = np.array([rule['high'] for rule in count_rules])[bucket]
+    minimum = np.array([rule.get('min', 0) for rule in count_rules])[bucket]
+
+    lo = np.maximum((n_items * low).astype(np.int64), minimum)
+    hi = np.maximum((n_items * high).astype(np.int64), lo)
+    counts = np.minimum(rng.integers(lo, hi, endpoint=True), n_items)
+    counts[n_items == 0] = 0
+    return counts
+
+
+def _smallest_int_dtype(low, high):
+    return next(dtype for dtype in (np.int8, np.int16, np.int32, np.int64)
+                if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max)
+
+
+def sample_values(rng, ages, value_rules, chunk_rows=VALUE_CHUNK_ROWS):
+    """
+    Draw one attribute value per age.
+
+    Rules either hold a `range` (inclusive integer bounds) or `weights`
+    (a {value: weight} mapping for a weighted choice). Ranged values come back in the
+    smallest integer type holding every bound and weighted values as a pd.Categorical.
+    Values are drawn `chunk_rows` at a time, which bounds the per-row temporaries and
+    does not change the draws.
+    """
+    if 'range' in value_rules[0]:
+        lows = np.array([rule['range'][0] for rule in value_rules])
+        highs = np.array([rule['range'][1] for rule in value_rules])
+        values = np.empty(len(ages), dtype=_smallest_int_dtype(lows.min(), highs.max()))
+        for start in range(0, len(ages), chunk_rows):
+            bucket = bucket_index(ages[start:start + chunk_rows], value_rules)
+            values[start:start + chunk_rows] = rng.integers(lows[bucket], highs[bucket], endpoint=True)
+        return values
+
+    categories = list(dict.fromkeys(value for rule in value_rules for value in rule['weights']))
+    weights = np.array([[rule['weights'].get(value, 0) for value in categories] for rule in value_rules], dtype=float)
+    cumulative = np.cumsum(weights / weights.sum(axis=1, keepdims=True), axis=1)
+
+    codes = np.empty(len(ages), dtype=np.int8)
+    for start in range(0, len(ages), chunk_rows):
+        bucket = bucket_index(ages[start:start + chunk_rows], value_rules)
+        draws = rng.random(len(bucket))
+        codes[start:start + chunk_rows] = np.minimum((draws[:, None] >= cumulative[bucket]).sum(axis=1), len(categories) - 1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def _sample_without_replacement(rng, items, counts):
+    """
+    For every row pick counts[row] distinct entries of `items`, in random order.
+    Returns the picks of all rows concatenated in row order.
+    """
+    keys = rng.random((len(counts), len(items)))
+    order = np.argsort(keys, axis=1)
+    keep = np.arange(len(items)) < counts[:, None]
+    return items[order][keep]
+
+
+def _assign_arrays(user_ids, dept_ids, ages, dept_items, count_rules, value_rules, rng, desc):
+    """`assign_items` on plain arrays; returns (user_ids, items, values) of every assignment."""
+    indptr, items = dept_items
+
+    with section('assignment_sampling'):
+        known = (dept_ids >= 0) & (dept_ids < len(indptr) - 1)
+        n_items = np.zeros(len(user_ids), dtype=np.int64)
+        n_items[known] = indptr[dept_ids[known] + 1] - indptr[dept_ids[known]]
+        counts = sample_counts(rng, n_items, ages, count_rules)
+
+        # Users are processed department by department, but each user's picks are written
+        # straight to their slots in user order, so no sort or concatenation is needed
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        assigned = np.empty(int(ends[-1]) if len(ends) else 0, dtype=items.dtype)
+        for dept_id in tqdm(np.unique(dept_ids[counts > 0]), desc=desc):
+            dept_item_ids = items[indptr[dept_id]:indptr[dept_id + 1]]
+            positions = np.flatnonzero((dept_ids == dept_id) & (counts > 0))
+
+            rows_per_chunk = max(1, MAX_KEYS_PER_CHUNK // len(dept_item_ids))
+            for start in range(0, len(positions), rows_per_chunk):
+                chunk = positions[start:start + rows_per_chunk]
+                chunk_counts = counts[chunk]
+                picks = _sample_without_replacement(rng, dept_item_ids, chunk_counts)
+                # Slot of a pick: its user's first slot plus the pick's rank for that user
+                chunk_starts = np.cumsum(chunk_counts) - chunk_counts
+                assigned[np.arange(len(picks)) + np.repeat(starts[chunk] - chunk_starts, chunk_counts)] = picks
+
+        values = sample_values(rng, np.repeat(ages, counts), value_rules)
+
+    return np.repeat(user_ids, counts), assigned, values
+
+
+def _user_arrays(user_data):
+    return (user_data['user_id'].to_numpy(dtype=np.int32),
+            user_data['dept_id'].to_numpy(dtype=np.int64),
+            user_data['account_age_days'].to_numpy(dtype=np.int32))
+
+
+def _concat(parts):
+    if isinstance(parts[0], pd.Categorical):
+        return union_categoricals(parts)
+    return np.concatenate(parts)
+
+
+def _assignment_frame(item_col, value_col, user_ids, items, values, first_id=1):
+    # copy=False: the frame takes over the arrays instead of consolidating them into a copy
+    return pd.DataFrame({
+        'id': np.arange(first_id, first_id + len(user_ids), dtype=np.int32),
+        'user_id': user_ids,
+        item_col: items,
+        value_col: values,
+    }, copy=False)
+
+
+def assign_items(user_data, dept_items, item_col, count_rules, value_col, value_rules, rng=None, desc="Assigning items"):
+    """
+    Assign each user a random subset of their department's items together with one
+    attribute value per assignment, sampling everything with NumPy in batch.
+
+    Args:
+        user_data (pd.DataFrame): user_id, dept_id, account_age_days (see `prepare_user_ages`).
+        dept_items (tuple[np.ndarray, np.ndarray]): dept -> items lookup from `build_dept_csr`.
+        item_col (str): Name of the item column in the result (e.g. 'skill_id').
+        count_rules (list[dict]): Age buckets for the number of items (see `sample_counts`).
+        value_col (str): Name of the attribute column in the result (e.g. 'score').
+        value_rules (list[dict]): Age buckets for the attribute value (see `sample_values`).
+        rng (np.random.Generator): Random source.
+        desc (str): Progress bar label.
+
+    Returns:
+        pd.DataFrame: id, user_id, <item_col>, <value_col>; rows grouped by user in user order.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    assigned = _assign_arrays(*_user_arrays(user_data), dept_items, count_rules, value_rules, rng, desc)
+    return _assignment_frame(item_col, value_col, *assigned)
+
+
+def _assign_block(spec, start, stop, count_rules, value_rules, rng):
+    """Worker side of `assign_items_parallel`: one block of users, read from shared memory."""
+    arrays = attach_arrays(spec)
+    return _assign_arrays(arrays['user_id'][start:stop], arrays['dept_id'][start:stop], arrays['ages'][start:stop],
+                          (arrays['indptr'], arrays['items']), count_rules, value_rules, rng, desc=None)
+
+
+def disable_progress_bars():
+    """
+    Worker initializer: progress bars from several processes would interleave. tqdm
+    reads TQDM_DISABLE when it is imported, so it is switched off on the class instead.
+    """
+    tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def _iter_assigned_blocks(user_data, dept_items, count_rules, value_rules, rng, workers, block_users, desc):
+    """
+    (user_ids, items, values) of every block of `block_users` users, in user order, each
+    drawn from its own child stream of `rng` (see `assign_items_parallel`).
+    """
+    user_ids, dept_ids, ages = _user_arrays(user_data)
+    indptr, items = dept_items
+
+    bounds = [(start, min(start + block_users, len(user_ids))) for start in range(0, len(user_ids), block_users)]
+    block_rngs = rng.spawn(len(bounds))
+
+    with tqdm(total=len(bounds), desc=desc) as progress:
+        if workers == 1 or len(bounds) <= 1:
+            for (start, stop), block_rng in zip(bounds, block_rngs):
+                block = _assign_arrays(user_ids[start:stop], dept_ids[start:stop], ages[start:stop], dept_items,
+                                       count_rules, value_rules, block_rng, desc=None)
+                progress.update()
+                yield block
+            return
+
+        shared = SharedArrays({'user_id': user_ids, 'dept_id': dept_ids, 'ages': ages, 'indptr': indptr, 'items': items})
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=disable_progress_bars) as executor:
+                # At most two blocks per worker are in flight, so finished blocks do not pile up
+                # when the consumer (e.g. a file writer) is slower than the workers
+                pending = deque()
+                for (start, stop), block_rng in zip(bounds, block_rngs):
+                    pending.append(executor.submit(_assign_block, shared.spec, start, stop, count_rules, value_rules,
+                                                   block_rng))
+                    if len(pending) >= 2 * workers:
+                        progress.update()
+                        yield pending.popleft().result()
+                while pending:
+                    progress.update()
+                    yield pending.popleft().result()
+        finally:
+            shared.close()
+
+
+def assign_items_parallel(user_data, dept_items, item_col, count_rules, value_col, value_rules, rng=None,
+                          workers=1, block_users=ASSIGNMENT_BLOCK_USERS, desc="Assigning items"):
+    """
+    `assign_items` over fixed blocks of `block_users` users, on `workers` processes.
+
+    Every block samples from its own child stream of `rng`, and blocks depend only on
+    `block_users`, so the result is the same for any number of workers. The user and
+    dept -> items arrays are published once in shared memory; workers attach to them
+    instead of receiving copies, so memory stays flat as workers are added.
+
+    Returns:
+        pd.DataFrame: id, user_id, <item_col>, <value_col>, as `assign_items`.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    blocks = list(_iter_assigned_blocks(user_data, dept_items, count_rules, value_rules, rng, workers, block_users, desc))
+    if not blocks:
+        return _assignment_frame(item_col, value_col, np.zeros(0, dtype=np.int32), dept_items[1][:0],
+                                 np.zeros(0, dtype=object))
+    return _assignment_frame(item_col, value_col, *(_concat(parts) for parts in zip(*blocks)))
+
+
+def iter_assignments(user_data, dept_items, item_col, count_rules, value_col, value_rules, rng=None, workers=1,
+                     block_users=ASSIGNMENT_BLOCK_USERS, desc="Assigning items"):
+    """
+    `assign_items_parallel` as a stream of per-block frames, each yielded as soon as it is
+    drawn, so the table never has to be held in memory as a whole. ids continue from one
+    block to the next; concatenated, the blocks are exactly `assign_items_parallel`'s
+    result for the same `rng` and `block_users`.
+
+    Yields:
+        pd.DataFrame: id, user_id, <item_col>, <value_col> of one block of users.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    next_id = 1
+    for user_ids, items, values in _iter_assigned_blocks(user_data, dept_items, count_rules, value_rules, rng,
+                                                         workers, block_users, desc):
+        yield _assignment_frame(item_col, value_col, user_ids, items, values, first_id=next_id)
+        next_id += len(user_ids)
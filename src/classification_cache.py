@@ -0,0 +1,118 @@
+import hashlib
+import json
+import sqlite3
+
+from colorama import Fore, Style
+
+from telemetry import count
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+# Keys per SELECT ... IN (...), below SQLite's oldest bound-parameter limit
+LOOKUP_BATCH = 900
+
+
+def classification_fingerprint(departments, threshold, method):
+    """Hash of everything besides the course text that decides a course's departments."""
+    config = {
+        'departments': {str(dept_id): keywords for dept_id, keywords in departments.items()},
+        'threshold': threshold,
+        'method': method,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+class ClassificationCache:
+    """
+    On-disk cache of course classifications (SQLite).
+
+    Entries are keyed by a hash of the course text together with the classification
+    fingerprint (department keywords, threshold and method), so editing the departments
+    or the threshold never returns stale assignments; the old entries simply stop being
+    used and age out. Once the cache holds more than `max_entries`, the least recently
+    used entries are evicted.
+
+    Args:
+        path (str): Cache database file.
+        max_entries (int): Size bound of the cache.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS classification '
+                                '(key TEXT PRIMARY KEY, departments TEXT NOT NULL, last_used INTEGER NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS idx_classification_last_used ON classification (last_used)')
+        # Logical clock for LRU: every lookup/store batch is one tick
+        self.clock = self.connection.execute('SELECT COALESCE(MAX(last_used), 0) FROM classification').fetchone()[0]
+        # Counted once here and kept up to date by `store`, which is called once per chunk
+        self.rows = self.connection.execute('SELECT COUNT(*) FROM classification').fetchone()[0]
+
+    @staticmethod
+    def keys(course_texts, fingerprint):
+        prefix = fingerprint.encode()
+        return [hashlib.sha256(prefix + text.encode()).hexdigest() for text in course_texts]
+
+    def lookup(self, keys):
+        """
+        Cached assignments of `keys`.
+
+        Returns:
+            dict: key -> list of dept ids, for the keys found in the cache.
+        """
+        self.clock += 1
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self.connection:
+            for start in range(0, len(unique_keys), LOOKUP_BATCH):
+                batch = unique_keys[start:start + LOOKUP_BATCH]
+                placeholders = ', '.join('?' * len(batch))
+                rows = self.connection.execute(
+                    f'SELECT key, departments FROM classification WHERE key IN ({placeholders})', batch).fetchall()
+                self.connection.execute(
+                    f'UPDATE classification SET last_used = ? WHERE key IN ({placeholders})', [self.clock] + batch)
+                found.update((key, json.loads(departments)) for key, departments in rows)
+
+        hits = sum(1 for key in keys if key in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        count('classification_cache_hits', hits)
+        count('classification_cache_misses', len(keys) - hits)
+        return found
+
+    def store(self, assignments):
+        """Add `assignments` (key -> list of dept ids) and evict down to `max_entries`."""
+        self.clock += 1
+        rows = [(key, json.dumps(departments), self.clock) for key, departments in assignments.items()]
+        with self.connection:
+            changes = self.connection.total_changes
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO classification (key, departments, last_used) VALUES (?, ?, ?)', rows)
+            added = self.connection.total_changes - changes
+            self.rows += added
+            if added < len(rows):
+                # Some keys were cached already: refresh them instead
+                self.connection.executemany('UPDATE classification SET departments = ?, last_used = ? WHERE key = ?',
+                                            [(departments, last_used, key) for key, departments, last_used in rows])
+
+            excess = self.rows - self.max_entries
+            if excess > 0:
+                self.connection.execute('DELETE FROM classification WHERE key IN '
+                                        '(SELECT key FROM classification ORDER BY last_used LIMIT ?)', (excess,))
+                self.rows -= excess
+                self.evictions += excess
+                count('classification_cache_evictions', excess)
+
+    def report(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        print(f"{Fore.GREEN}Classification cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate), "
+              f"{self.evictions} evicted{Style.RESET_ALL}")
+
+    def close(self):
+        self.connection.close()
+
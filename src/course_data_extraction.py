@@ -1,30 +1,99 @@
+import numpy as np
 import pandas as pd
-import os
 from colorama import Fore, Style
 
-def course_extraction(input_csv, output_csv):
+from table_io import ChunkedTableWriter, read_table
+
+# Coursera column (header names are stripped first) -> extracted column
+EXTRACTED_COLUMNS = {
+    'Course Name': 'course_name',
+    'Course URL': 'course_url',
+    'Course Description': 'course_desc',
+    'Skills': 'skills',
+}
+DEFAULT_CHUNK_SIZE = 50_000
+
+def course_extraction(input_csv, output_csv=None):
     """
     Process the courses from the input CSV and create a new CSV with selected fields
     and a text file with unique skills.
 
     Args:
         input_csv (str): Path to the input CSV file.
-        output_csv (str): Path to the output CSV file.
+        output_csv (str): Path to the output CSV file. When omitted nothing is written.
         skills_file (str): Path to the output text file for unique skills.
+
+    Returns:
+        pd.DataFrame: course_id, course_name, course_url, course_desc, skills.
     """
     print(f"Extracting Courses ---> ")
-    df = pd.read_csv(input_csv)
+    df = read_table(input_csv)
     df.columns = df.columns.str.strip()
     print("Cleaned column names:", df.columns.tolist())
 
     df_filtered = df[['Course Name', 'Course URL', 'Course Description', 'Skills']].copy()
     df_filtered.columns = ['course_name', 'course_url', 'course_desc', 'skills']
-    df_filtered['course_id'] = range(1, len(df_filtered) + 1)
+    df_filtered['course_id'] = np.arange(1, len(df_filtered) + 1, dtype=np.int32)
     df_filtered = df_filtered[['course_id', 'course_name', 'course_url', 'course_desc', 'skills']]
 
-    df_filtered.to_csv(output_csv, index=False)
+    if output_csv is not None:
+        df_filtered.to_csv(output_csv, index=False)
+        print(f"{Fore.GREEN}Processed courses saved to {output_csv}{Style.RESET_ALL}")
+
+    return df_filtered
+
+
+def iter_course_chunks(input_csv, chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Read the Coursera CSV in chunks of `chunksize` rows, parsing only the extracted
+    columns (as strings). Course ids continue across chunks, so the concatenated
+    chunks equal `course_extraction(input_csv)`.
+
+    Yields:
+        pd.DataFrame: course_id, course_name, course_url, course_desc, skills.
+    """
+    reader = pd.read_csv(input_csv, usecols=lambda column: column.strip() in EXTRACTED_COLUMNS,
+                         dtype=str, chunksize=chunksize)
+    next_course_id = 1
+    with reader:
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            chunk = chunk[list(EXTRACTED_COLUMNS)].rename(columns=EXTRACTED_COLUMNS)
+            chunk.insert(0, 'course_id', np.arange(next_course_id, next_course_id + len(chunk), dtype=np.int32))
+            next_course_id += len(chunk)
+            yield chunk
+
+
+def stream_course_extraction(input_csv, output_path=None, chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Streaming version of `course_extraction` for catalogs that do not fit in memory.
+    Each chunk is appended to `output_path` (CSV or Parquet) before it is handed on,
+    so the generator can feed `classify_course_chunks` directly.
+
+    Args:
+        input_csv (str): Path to the Coursera CSV file.
+        output_path (str): Extracted courses file. When omitted nothing is written.
+        chunksize (int): Rows read per chunk.
+
+    Yields:
+        pd.DataFrame: Extracted chunks (see `iter_course_chunks`).
+    """
+    print(f"Extracting Courses in chunks of {chunksize} ---> ")
+    writer = ChunkedTableWriter(output_path) if output_path is not None else None
+    total = 0
+    try:
+        for chunk in iter_course_chunks(input_csv, chunksize):
+            if writer is not None:
+                writer.write(chunk)
+            total += len(chunk)
+            yield chunk
+    finally:
+        if writer is not None:
+            writer.close()
 
-    print(f"{Fore.GREEN}Processed courses saved to {output_csv}{Style.RESET_ALL}")
+    if writer is not None:
+        print(f"{Fore.GREEN}Processed courses saved to {output_path}{Style.RESET_ALL}")
+    print(f"Extracted {total} courses")
 
 # input_csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'Coursera.csv')  
 # output_csv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'extracted_courses.csv')
@@ -1,75 +1,115 @@
 import pandas as pd
-import random
-import os
-import ast
-from tqdm import tqdm  
-
-
-def course_generation(input_classified_courses, input_user_data):
+import numpy as np
+
+from schemas import apply_schema
+from table_io import as_frame, flatten_id_lists
+
+IMAGES_WITH_DEPT_ID = {
+    2: 'https://images.pexels.com/photos/577585/pexels-photo-577585.jpeg',
+    3: 'https://images.pexels.com/photos/669619/pexels-photo-669619.jpeg',
+    4: 'https://images.pexels.com/photos/3862132/pexels-photo-3862132.jpeg',
+    5: 'https://images.pexels.com/photos/1181675/pexels-photo-1181675.jpeg',
+    6: 'https://images.pexels.com/photos/265087/pexels-photo-265087.jpeg',
+    7: 'https://images.pexels.com/photos/11035393/pexels-photo-11035393.jpeg',
+    8: 'https://images.pexels.com/photos/5483240/pexels-photo-5483240.jpeg',
+    9: 'https://images.pexels.com/photos/196644/pexels-photo-196644.jpeg',
+    10: 'https://images.pexels.com/photos/12935051/pexels-photo-12935051.jpeg',
+    11: 'https://images.pexels.com/photos/267401/pexels-photo-267401.jpeg',
+    12: 'https://images.pexels.com/photos/8867382/pexels-photo-8867382.jpeg',
+    13: 'https://images.pexels.com/photos/4344860/pexels-photo-4344860.jpeg',
+    14: 'https://images.pexels.com/photos/128867/coins-currency-investment-insurance-128867.jpeg',
+    15: 'https://images.pexels.com/photos/5668473/pexels-photo-5668473.jpeg',
+}
+
+# Joins the names of the two courses a synthetic course is recombined from
+SYNTHETIC_NAME_SEPARATOR = ': '
+
+def _segments(offsets, rows):
+    """Positions of the flat entries of `rows` (in `offsets`, see `flatten_id_lists`), and their new offsets."""
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    new_offsets = np.concatenate([[0], np.cumsum(lengths)])
+    return np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1]), new_offsets
+
+
+def _course_tables(names, descs, dept_ids, offsets, first_course_id, admin_user_ids, rng):
+    """Course and CourseDepartment rows of the courses given as arrays, with their image and creator drawn."""
+    lengths = np.diff(offsets)
+    course_id = np.arange(first_course_id, first_course_id + len(names), dtype=np.int32)
+
+    # One image per course from one of its departments; a single draw with per-course
+    # bounds gives the same values as one draw per course
+    image_depts = dept_ids[offsets[:-1] + rng.integers(0, lengths)]
+    image_codes = np.full(max(IMAGES_WITH_DEPT_ID) + 1, -1)
+    image_codes[list(IMAGES_WITH_DEPT_ID)] = np.arange(len(IMAGES_WITH_DEPT_ID))
+    course_img = pd.Categorical.from_codes(image_codes[image_depts], categories=list(IMAGES_WITH_DEPT_ID.values()))
+
+    courses = pd.DataFrame({
+        'course_id': course_id,
+        'course_name': names,
+        'course_desc': descs,
+        'course_img': course_img,
+        'course_creator': admin_user_ids[rng.integers(len(admin_user_ids), size=len(names))],
+    })
+    course_dept = pd.DataFrame({'course_id': np.repeat(course_id, lengths), 'dept_id': dept_ids})
+    return courses, course_dept
+
+
+def course_generation(input_classified_courses, input_user_data, rng=None, first_course_id=1, synthetic_courses=0):
     """
     Process course data to generate two DataFrames: one with course details and another with 
     course-department mappings. Assigns images and random course creators for each course.
 
+    Department lists are handled as flat arrays with offsets, and images and creators
+    are drawn for all courses at once.
+
     Args:
-        input_classified_courses (str): Path to the classified courses CSV.
-        input_user_data (str): Path to the user data CSV.
+        input_classified_courses (str | pd.DataFrame): Classified courses, or the path to their CSV.
+        input_user_data (str | pd.DataFrame): User data, or the path to User.csv.
+        rng (np.random.Generator): Random source for images and creators.
+        first_course_id (int): course_id of the first generated course (to append to an existing catalog).
+        synthetic_courses (int): Number of courses to add after the catalog, for load tests
+            beyond the size of Coursera.csv. Each one takes its name and departments from a
+            random catalog course, and its description and the second half of its name from
+            another. The catalog courses are the same with or without them.
 
     Returns:
         df_courses_output (pd.DataFrame): Contains course_id, course_name, course_desc, course_img, course_creator.
         df_course_dept (pd.DataFrame): Contains course_id, dept_id (mapping courses to departments).
     """
-    images_with_dept_id = {
-        2: 'https://images.pexels.com/photos/577585/pexels-photo-577585.jpeg',
-        3: 'https://images.pexels.com/photos/669619/pexels-photo-669619.jpeg',
-        4: 'https://images.pexels.com/photos/3862132/pexels-photo-3862132.jpeg',
-        5: 'https://images.pexels.com/photos/1181675/pexels-photo-1181675.jpeg',
-        6: 'https://images.pexels.com/photos/265087/pexels-photo-265087.jpeg',
-        7: 'https://images.pexels.com/photos/11035393/pexels-photo-11035393.jpeg',
-        8: 'https://images.pexels.com/photos/5483240/pexels-photo-5483240.jpeg',
-        9: 'https://images.pexels.com/photos/196644/pexels-photo-196644.jpeg',
-        10: 'https://images.pexels.com/photos/12935051/pexels-photo-12935051.jpeg',
-        11: 'https://images.pexels.com/photos/267401/pexels-photo-267401.jpeg',
-        12: 'https://images.pexels.com/photos/8867382/pexels-photo-8867382.jpeg',
-        13: 'https://images.pexels.com/photos/4344860/pexels-photo-4344860.jpeg',
-        14: 'https://images.pexels.com/photos/128867/coins-currency-investment-insurance-128867.jpeg',
-        15: 'https://images.pexels.com/photos/5668473/pexels-photo-5668473.jpeg',
-    }
-
-    df_courses = pd.read_csv(input_classified_courses)
-    df_users = pd.read_csv(input_user_data)
+    rng = rng if rng is not None else np.random.default_rng()
 
-    # Get all admin user_ids
-    admin_user_ids = df_users[df_users['account_type'] == 'admin']['user_id'].tolist()
+    df_courses = as_frame(input_classified_courses)
+    df_users = as_frame(input_user_data)
 
-    def convert_to_list(department_str):
-        if isinstance(department_str, str):
-            return ast.literal_eval(department_str)
-        return department_str  
-    
-    df_courses['assigned_departments'] = df_courses['assigned_departments'].apply(convert_to_list)
-    df_filtered_courses = df_courses[df_courses['assigned_departments'].apply(len) > 0].copy()
-    
-    df_filtered_courses['course_id'] = range(1, len(df_filtered_courses) + 1)  
+    # Get all admin user_ids
+    admin_user_ids = df_users.loc[df_users['account_type'] == 'admin', 'user_id'].to_numpy()
 
-    # Function to assign a random image based on assigned departments
-    def assign_random_image(departments):
-        return images_with_dept_id[random.choice(departments)]
+    dept_ids, offsets = flatten_id_lists(df_courses['assigned_departments'])
+    kept = np.flatnonzero(np.diff(offsets) > 0)
+    positions, offsets = _segments(offsets, kept)
+    dept_ids = dept_ids[positions]
 
-    tqdm.pandas(desc="Assigning Images and Creators") 
-    df_filtered_courses['course_name'] = df_filtered_courses['course_name'].str.strip()
-    df_filtered_courses['course_desc'] = df_filtered_courses['course_desc'].str.strip()
+    # Missing names become '' so the synthetic names can be concatenated from them
+    names = df_courses['course_name'].iloc[kept].fillna('').astype(str).str.strip().to_numpy(dtype=object)
+    descs = df_courses['course_desc'].iloc[kept].str.strip().to_numpy(dtype=object)
 
-    df_filtered_courses['course_img'] = df_filtered_courses['assigned_departments'].progress_apply(assign_random_image)
-    df_filtered_courses['course_creator'] = df_filtered_courses['assigned_departments'].apply(lambda _: random.choice(admin_user_ids))
+    tables = [_course_tables(names, descs, dept_ids, offsets, first_course_id, admin_user_ids, rng)]
 
-    # Create the first DataFrame with course details
-    df_courses_output = df_filtered_courses[['course_id', 'course_name', 'course_desc', 'course_img', 'course_creator']]
+    if synthetic_courses:
+        if not len(kept):
+            raise ValueError("No course with a department to synthesize courses from")
+        source = rng.integers(len(kept), size=synthetic_courses)
+        other = rng.integers(len(kept), size=synthetic_courses)
+        synthetic_positions, synthetic_offsets = _segments(offsets, source)
+        tables.append(_course_tables(names[source] + SYNTHETIC_NAME_SEPARATOR + names[other], descs[other],
+                                     dept_ids[synthetic_positions], synthetic_offsets, first_course_id + len(kept),
+                                     admin_user_ids, rng))
 
-    # Create the second DataFrame (course_id, dept_id mapping)
-    df_course_dept = df_filtered_courses.explode('assigned_departments')[['course_id', 'assigned_departments']]
-    df_course_dept.columns = ['course_id', 'dept_id']  
+    df_courses_output = pd.concat([courses for courses, _ in tables], ignore_index=True)
+    df_course_dept = pd.concat([course_dept for _, course_dept in tables], ignore_index=True)
 
-    return df_courses_output, df_course_dept
+    return apply_schema(df_courses_output, 'Course'), apply_schema(df_course_dept, 'CourseDepartment')
 
 
 # # Input CSVs
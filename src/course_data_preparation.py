@@ -1,9 +1,17 @@
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
+import numpy as np
+from functools import lru_cache
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import os
 from tqdm import tqdm  
 
+from classification_cache import classification_fingerprint
+from telemetry import count, section
+
+
+# Hashing classifier: feature space size and courses vectorized at once
+HASHING_FEATURES = 2 ** 20
+HASHING_CHUNK_ROWS = 10_000
 
 departments = {
     2: ['engineering', 'development', 'software', 'coding'],
@@ -22,16 +30,28 @@ departments = {
     15: ['legal', 'compliance', 'law', 'history']
 }
 
-def course_preperation(df, threshold=0.09):
+def build_course_text(df):
+    """
+    Concatenate course name, description and comma separated skills into the text
+    that is matched against the department keywords.
+    """
+    skills = df['skills'].fillna('').astype(str).str.split(',').str.join(' ')
+    return df['course_name'].astype(str) + ' ' + df['course_desc'].astype(str) + ' ' + skills
+
+
+def _classify_loop(df, threshold):
+    """Original classifier: one vectorizer fit and 14 similarity calls per course."""
     department_assignments = []
-    department_counts = {dept_id: 0 for dept_id in departments.keys()}  
 
     vectorizer = TfidfVectorizer()
 
-    for index, row in tqdm(df.iterrows(), total=df.shape[0], desc="Classifying Courses"):
-        course_text = f"{row['course_name']} {row['course_desc']} {' '.join(row['skills'].split(','))}"
-        
-        course_vector = vectorizer.fit_transform([course_text])
+    for course_text in tqdm(build_course_text(df), total=df.shape[0], desc="Classifying Courses"):
+        try:
+            course_vector = vectorizer.fit_transform([course_text])
+        except ValueError:
+            # No token of two or more characters: nothing to match, as in the matrix classifier
+            department_assignments.append([])
+            continue
         
         department_scores = {}
 
@@ -47,15 +67,273 @@ def course_preperation(df, threshold=0.09):
         assigned_departments = [dept for dept, score in department_scores.items() if score > threshold]
         department_assignments.append(assigned_departments)
 
+    return department_assignments
+
+
+def score_departments(course_texts, vectorizer=None):
+    """
+    Score every course against every department with sparse matrix products.
+
+    The per-course classifier fits a fresh TfidfVectorizer on a single document, so
+    every idf is 1 and the department vector only keeps the keywords that occur in
+    the course. The same cosine is obtained here from term counts over one shared
+    vocabulary:
+
+        score[c, d] = sum_t C[c, t] * D[d, t] / (||C[c]|| * sqrt(sum_{t in c} D[d, t]^2))
+
+    Args:
+        course_texts (Sequence[str]): One text per course.
+        vectorizer: Unfitted sklearn text vectorizer producing term counts. Defaults to a
+            CountVectorizer with TfidfVectorizer's tokenization.
+
+    Returns:
+        np.ndarray: (n_courses, n_departments) similarity matrix, columns in `departments` order.
+    """
+    if len(course_texts) == 0:
+        # An empty chunk has no vocabulary to fit
+        return np.zeros((0, len(departments)))
+
+    vectorizer = vectorizer if vectorizer is not None else CountVectorizer()
+
+    with section('vectorize'):
+        course_matrix = vectorizer.fit_transform(course_texts).astype(np.float64).tocsr()
+        dept_matrix = vectorizer.transform([' '.join(keywords) for keywords in departments.values()]).astype(np.float64)
+
+    with section('similarity'):
+        return _cosine_scores(course_matrix, dept_matrix)
+
+
+def _cosine_scores(course_matrix, dept_matrix):
+    course_norms = np.sqrt(np.asarray(course_matrix.multiply(course_matrix).sum(axis=1))).ravel()
+    dot = np.asarray((course_matrix @ dept_matrix.T).todense())
+
+    present = course_matrix.copy()
+    present.data[:] = 1.0
+    dept_norms = np.sqrt(np.asarray((present @ dept_matrix.multiply(dept_matrix).T).todense()))
+
+    denominator = course_norms[:, None] * dept_norms
+    scores = np.zeros_like(dot)
+    np.divide(dot, denominator, out=scores, where=denominator > 0)
+    return scores
+
+
+def assignments_from_scores(scores, threshold):
+    """Turn a (n_courses, n_departments) score matrix into per-course lists of dept ids."""
+    if len(scores) == 0:
+        return []
+
+    dept_ids = np.array(list(departments.keys()))
+    mask = scores > threshold
+    rows, cols = np.nonzero(mask)
+    split_points = np.cumsum(mask.sum(axis=1))[:-1]
+    return [depts.tolist() for depts in np.split(dept_ids[cols], split_points)]
+
+
+def _classify_matrix(df, threshold):
+    scores = score_departments(build_course_text(df))
+    return assignments_from_scores(scores, threshold)
+
+
+def _hashing_vectorizer():
+    # Same tokenization as CountVectorizer, raw term counts, no vocabulary to fit
+    return HashingVectorizer(n_features=HASHING_FEATURES, alternate_sign=False, norm=None)
+
+
+@lru_cache(maxsize=1)
+def _hashed_department_matrix():
+    keywords = [' '.join(keywords) for keywords in departments.values()]
+    return _hashing_vectorizer().transform(keywords).astype(np.float64).tocsr()
+
+
+def _classify_hashing(df, threshold, chunk_rows=HASHING_CHUNK_ROWS):
+    """
+    Out-of-core variant of the matrix classifier: terms are hashed into a fixed feature
+    space instead of a fitted vocabulary, so courses are scored `chunk_rows` at a time
+    against department vectors computed once, with memory independent of the catalog
+    size. Scores match the matrix classifier except where hashed terms collide.
+    """
+    vectorizer = _hashing_vectorizer()
+    dept_matrix = _hashed_department_matrix()
+
+    department_assignments = []
+    for start in range(0, len(df), chunk_rows):
+        course_texts = build_course_text(df.iloc[start:start + chunk_rows])
+        with section('vectorize'):
+            course_matrix = vectorizer.transform(course_texts).astype(np.float64).tocsr()
+        with section('similarity'):
+            scores = _cosine_scores(course_matrix, dept_matrix)
+        department_assignments.extend(assignments_from_scores(scores, threshold))
+    return department_assignments
+
+
+def classification_diff(df, threshold=0.09, methods=('loop', 'matrix')):
+    """
+    Classify `df` with two classifiers and report the courses whose assigned
+    departments differ.
+
+    Args:
+        df (pd.DataFrame): Courses with course_id, course_name, course_desc and skills.
+        threshold (float): Similarity threshold used by both classifiers.
+        methods (tuple[str, str]): The two classifiers to compare (see `course_preperation`).
+
+    Returns:
+        pd.DataFrame: course_id, <method>_departments for both methods, for every differing course.
+    """
+    first, second = methods
+    first_assignments = _classify(df, threshold, first)
+    second_assignments = _classify(df, threshold, second)
+
+    diff = pd.DataFrame({
+        'course_id': df['course_id'].values,
+        f'{first}_departments': first_assignments,
+        f'{second}_departments': second_assignments,
+    })
+    diff = diff[diff[f'{first}_departments'] != diff[f'{second}_departments']].reset_index(drop=True)
+
+    print(f"Courses classified differently by the {second} classifier: {len(diff)} of {len(df)}")
+    return diff
+
+
+def classification_agreement(df, threshold=0.09, method='hashing', reference='matrix'):
+    """
+    How closely `method` agrees with the `reference` classifier on the courses of `df`
+    (typically a sample of the catalog).
+
+    Returns:
+        dict: courses, identical (courses with exactly the same departments),
+        agreement (identical / courses), mean_jaccard (mean Jaccard similarity of the
+        department sets, two empty sets counting as 1) and count_delta (per department,
+        assignments by `method` minus assignments by `reference`).
+    """
+    method_assignments = _classify(df, threshold, method)
+    reference_assignments = _classify(df, threshold, reference)
+
+    identical = 0
+    jaccard = 0.0
+    count_delta = {dept_id: 0 for dept_id in departments.keys()}
+    for ours, theirs in zip(method_assignments, reference_assignments):
+        ours, theirs = set(ours), set(theirs)
+        identical += ours == theirs
+        union = ours | theirs
+        jaccard += len(ours & theirs) / len(union) if union else 1.0
+        for dept in ours:
+            count_delta[dept] += 1
+        for dept in theirs:
+            count_delta[dept] -= 1
+
+    courses = len(df)
+    agreement = {
+        'courses': courses,
+        'identical': identical,
+        'agreement': identical / courses if courses else 1.0,
+        'mean_jaccard': jaccard / courses if courses else 1.0,
+        'count_delta': count_delta,
+    }
+    count('classification_agreement_courses', courses)
+    count('classification_agreement_identical', identical)
+    print(f"{method} vs {reference} classifier on {courses} courses: {agreement['agreement']:.2%} identical, "
+          f"mean Jaccard {agreement['mean_jaccard']:.4f}")
+    return agreement
+
+
+def course_preperation(df, threshold=0.09, method='matrix', cache=None):
+    """
+    Assign departments to every course in `df` (in place, as `assigned_departments`).
+
+    Args:
+        df (pd.DataFrame): Courses with course_name, course_desc and skills.
+        threshold (float): Minimum similarity for a department to be assigned.
+        method (str): 'matrix' scores all courses with one shared vocabulary and a single
+                sparse product; 'hashing' scores them in fixed-size chunks over hashed terms
+                (constant memory, see `_classify_hashing`); 'loop' is the original
+                per-course classifier.
+        cache (ClassificationCache): Optional cache of earlier classifications; only
+                courses whose text is not in it are classified.
+
+    Returns:
+        list[int]: Number of courses assigned to each department, in `departments` order.
+    """
+    print(f"Classifying Courses ({method}) --->")
+    department_assignments = _assign_departments(df, threshold, method, cache)
+    df['assigned_departments'] = department_assignments
+
+    department_counts = {dept_id: 0 for dept_id in departments.keys()}  
+    courses_with_depts = _count_assignments(department_assignments, department_counts)
+    if cache is not None:
+        cache.report()
+    return _report_counts(courses_with_depts, department_counts)
+
+
+def classify_course_chunks(chunks, threshold=0.09, method='matrix', cache=None):
+    """
+    Streaming version of `course_preperation`: classify courses one chunk at a time,
+    e.g. straight from `stream_course_extraction`. A course's scores only depend on its
+    own text and the department keywords, so chunking does not change the assignments.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Course chunks with course_name, course_desc and skills.
+        threshold (float): Minimum similarity for a department to be assigned.
+        method (str): Classifier, see `course_preperation`.
+        cache (ClassificationCache): Optional cache, see `course_preperation`.
+
+    Yields:
+        pd.DataFrame: Every chunk with its `assigned_departments` column added.
+    """
+    department_counts = {dept_id: 0 for dept_id in departments.keys()}
+    courses_with_depts = 0
+
+    for chunk in tqdm(chunks, desc=f"Classifying Courses ({method})", unit='chunk'):
+        department_assignments = _assign_departments(chunk, threshold, method, cache)
+        chunk['assigned_departments'] = department_assignments
+        courses_with_depts += _count_assignments(department_assignments, department_counts)
+        yield chunk
+
+    if cache is not None:
+        cache.report()
+    _report_counts(courses_with_depts, department_counts)
+
+
+def _assign_departments(df, threshold, method, cache=None):
+    if cache is None:
+        return _classify(df, threshold, method)
+
+    with section('classification_cache', kind='io'):
+        keys = cache.keys(build_course_text(df), classification_fingerprint(departments, threshold, method))
+        cached = cache.lookup(keys)
+
+    missing = [position for position, key in enumerate(keys) if key not in cached]
+    if missing:
+        computed = _classify(df.iloc[missing], threshold, method)
+        new_entries = {keys[position]: depts for position, depts in zip(missing, computed)}
+        with section('classification_cache', kind='io'):
+            cache.store(new_entries)
+        cached.update(new_entries)
+
+    return [list(cached[key]) for key in keys]
+
+
+def _classify(df, threshold, method):
+    if method == 'matrix':
+        return _classify_matrix(df, threshold)
+    if method == 'hashing':
+        return _classify_hashing(df, threshold)
+    if method == 'loop':
+        with section('classification_loop'):
+            return _classify_loop(df, threshold)
+    raise ValueError(f"Unknown classification method: {method}")
+
+
+def _count_assignments(department_assignments, department_counts):
+    """Add the assignments to `department_counts`; returns how many courses got a department."""
+    for assigned_departments in department_assignments:
         for dept in assigned_departments:
             department_counts[dept] += 1
+    return sum(1 for depts in department_assignments if len(depts) > 0)
 
-    df['assigned_departments'] = department_assignments
 
-    courses_with_depts = sum(1 for depts in department_assignments if len(depts) > 0)
+def _report_counts(courses_with_depts, department_counts):
     print(f"Number of courses with at least one department assigned: {courses_with_depts}")
-    
-    
+
     dept_assignment_counts = [department_counts[dept_id] for dept_id in departments.keys()]
     print(f"Department assignment counts: {dept_assignment_counts}")
 
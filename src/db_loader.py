@@ -0,0 +1,250 @@
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+
+import pandas as pd
+from colorama import Fore, Style
+
+from table_io import read_table_chunks
+from telemetry import section
+
+# Tables in foreign-key order: every table only references tables listed before it.
+# Department ids are not checked, the Department table is owned by the webapp.
+TABLE_DEFINITIONS = [
+    {
+        'name': 'User',
+        'columns': [('user_id', 'INTEGER'), ('first_name', 'TEXT'), ('last_name', 'TEXT'), ('email', 'TEXT'),
+                    ('password', 'TEXT'), ('account_type', 'TEXT'), ('dept_id', 'INTEGER'),
+                    ('createdAt', 'TIMESTAMP'), ('updatedAt', 'TIMESTAMP')],
+        'primary_key': 'user_id',
+        'foreign_keys': [],
+        'indexes': [['dept_id']],
+    },
+    {
+        'name': 'Course',
+        'columns': [('course_id', 'INTEGER'), ('course_name', 'TEXT'), ('course_desc', 'TEXT'),
+                    ('course_img', 'TEXT'), ('course_creator', 'INTEGER')],
+        'primary_key': 'course_id',
+        'foreign_keys': [('course_creator', 'User', 'user_id')],
+        'indexes': [['course_creator']],
+    },
+    {
+        'name': 'CourseDepartment',
+        'columns': [('course_id', 'INTEGER'), ('dept_id', 'INTEGER')],
+        'primary_key': None,
+        'foreign_keys': [('course_id', 'Course', 'course_id')],
+        'indexes': [['course_id'], ['dept_id']],
+    },
+    {
+        'name': 'Skill',
+        'columns': [('skill_id', 'INTEGER'), ('skill_name', 'TEXT')],
+        'primary_key': 'skill_id',
+        'foreign_keys': [],
+        'indexes': [],
+    },
+    {
+        'name': 'SkillDepartment',
+        'columns': [('id', 'INTEGER'), ('skill_id', 'INTEGER'), ('dept_id', 'INTEGER')],
+        'primary_key': 'id',
+        'foreign_keys': [('skill_id', 'Skill', 'skill_id')],
+        'indexes': [['skill_id'], ['dept_id']],
+    },
+    {
+        'name': 'SkillUsers',
+        'columns': [('id', 'INTEGER'), ('user_id', 'INTEGER'), ('skill_id', 'INTEGER'), ('competency', 'TEXT')],
+        'primary_key': 'id',
+        'foreign_keys': [('user_id', 'User', 'user_id'), ('skill_id', 'Skill', 'skill_id')],
+        'indexes': [['user_id'], ['skill_id']],
+    },
+    {
+        'name': 'CourseUser',
+        'columns': [('id', 'INTEGER'), ('user_id', 'INTEGER'), ('course_id', 'INTEGER'), ('score', 'INTEGER')],
+        'primary_key': 'id',
+        'foreign_keys': [('user_id', 'User', 'user_id'), ('course_id', 'Course', 'course_id')],
+        'indexes': [['user_id'], ['course_id']],
+    },
+]
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+# Rows converted to Python values and inserted at a time, so memory does not grow with the table
+LOAD_CHUNK_ROWS = 200_000
+
+
+def _table_chunks(table, chunk_rows):
+    """A table given as a DataFrame or as its file, `chunk_rows` rows at a time."""
+    if isinstance(table, pd.DataFrame):
+        for start in range(0, len(table), chunk_rows):
+            yield table.iloc[start:start + chunk_rows]
+        return
+    yield from read_table_chunks(table, chunk_rows)
+
+
+def _rows(df, columns):
+    """Rows of `df` as tuples of plain Python values (NULL for missing, text for datetimes)."""
+    values = []
+    for column in columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime(DATETIME_FORMAT)
+        series = series.astype(object)
+        values.append(series.where(series.notna(), None).tolist())
+    return zip(*values)
+
+
+class DatabaseAdapter(ABC):
+    """
+    What `load_database` needs from a database backend.
+
+    A backend creates each table without secondary indexes, bulk loads its rows in one
+    transaction, and builds indexes and checks constraints only once every table is in.
+    """
+
+    @abstractmethod
+    def create_table(self, definition):
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_rows(self, definition, chunks):
+        """
+        Load every row of `chunks` (DataFrames) into the table in one transaction;
+        returns the number of rows loaded.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_indexes(self, definition):
+        raise NotImplementedError
+
+    @abstractmethod
+    def check_constraints(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self):
+        raise NotImplementedError
+
+
+class SQLiteAdapter(DatabaseAdapter):
+    """
+    SQLite backend (stdlib). SQLite cannot add constraints to an existing table, so the
+    foreign keys are declared up front but not enforced during the load; they are
+    verified with `PRAGMA foreign_key_check` afterwards.
+
+    Args:
+        path (str): Database file.
+        batch_rows (int): Rows sent per multi-row INSERT statement, capped by SQLite's
+            bound-parameter limit.
+    """
+
+    def __init__(self, path, batch_rows=5000):
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute('PRAGMA foreign_keys = OFF')
+        self.connection.execute('PRAGMA journal_mode = MEMORY')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.batch_rows = batch_rows
+        self.max_variables = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+    def create_table(self, definition):
+        columns = [f'"{name}" {sql_type}' for name, sql_type in definition['columns']]
+        if definition['primary_key']:
+            columns.append(f'PRIMARY KEY ("{definition["primary_key"]}")')
+        for column, ref_table, ref_column in definition['foreign_keys']:
+            columns.append(f'FOREIGN KEY ("{column}") REFERENCES "{ref_table}" ("{ref_column}")')
+
+        self.connection.execute(f'DROP TABLE IF EXISTS "{definition["name"]}"')
+        self.connection.execute(f'CREATE TABLE "{definition["name"]}" ({", ".join(columns)})')
+
+    def _insert_statement(self, definition, n_rows):
+        names = ', '.join(f'"{name}"' for name, _ in definition['columns'])
+        placeholders = '(' + ', '.join('?' * len(definition['columns'])) + ')'
+        return f'INSERT INTO "{definition["name"]}" ({names}) VALUES ' + ', '.join([placeholders] * n_rows)
+
+    def load_rows(self, definition, chunks):
+        columns = [name for name, _ in definition['columns']]
+        rows_per_statement = max(1, min(self.batch_rows, self.max_variables // len(columns)))
+        full_statement = self._insert_statement(definition, rows_per_statement)
+
+        cursor = self.connection.cursor()
+        cursor.execute('BEGIN')
+        batch = []
+        loaded = 0
+        for df in chunks:
+            for row in _rows(df, columns):
+                batch.extend(row)
+                if len(batch) == rows_per_statement * len(columns):
+                    cursor.execute(full_statement, batch)
+                    loaded += rows_per_statement
+                    batch = []
+        if batch:
+            remaining = len(batch) // len(columns)
+            cursor.execute(self._insert_statement(definition, remaining), batch)
+            loaded += remaining
+        cursor.execute('COMMIT')
+        return loaded
+
+    def create_indexes(self, definition):
+        for columns in definition['indexes']:
+            index_name = f'idx_{definition["name"]}_{"_".join(columns)}'
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            self.connection.execute(f'CREATE INDEX "{index_name}" ON "{definition["name"]}" ({column_list})')
+
+    def check_constraints(self):
+        violations = self.connection.execute('PRAGMA foreign_key_check').fetchall()
+        if violations:
+            table, rowid, parent, _ = violations[0]
+            raise ValueError(f"{len(violations)} foreign key violations, first: {table} row {rowid} -> {parent}")
+        self.connection.execute('PRAGMA foreign_keys = ON')
+
+    def close(self):
+        self.connection.close()
+
+
+def load_database(tables, adapter, chunk_rows=LOAD_CHUNK_ROWS):
+    """
+    Bulk load the generated tables into a database in foreign-key order, one
+    transaction per table, with indexes and constraint checks after the load. Tables
+    are converted and inserted `chunk_rows` rows at a time; tables given as files are
+    read chunk by chunk, so memory stays bounded for the largest link tables.
+
+    Args:
+        tables (dict): Table name (e.g. 'User') -> DataFrame or path to its file.
+        adapter (DatabaseAdapter): Target database.
+        chunk_rows (int): Rows read and inserted at a time.
+
+    Returns:
+        list[dict]: Per table: name, rows, seconds and rows_per_sec.
+    """
+    stats = []
+    for definition in TABLE_DEFINITIONS:
+        adapter.create_table(definition)
+
+        start = time.perf_counter()
+        with section('database_load', kind='io'):
+            rows = adapter.load_rows(definition, _table_chunks(tables[definition['name']], chunk_rows))
+        seconds = time.perf_counter() - start
+
+        rows_per_sec = rows / seconds if seconds > 0 else float('inf')
+        stats.append({'name': definition['name'], 'rows': rows, 'seconds': seconds, 'rows_per_sec': rows_per_sec})
+        print(f"{Fore.GREEN}Loaded {rows} rows into {definition['name']} in {seconds:.2f}s ({rows_per_sec:,.0f} rows/s){Style.RESET_ALL}")
+
+    start = time.perf_counter()
+    with section('database_indexes', kind='io'):
+        for definition in TABLE_DEFINITIONS:
+            adapter.create_indexes(definition)
+        adapter.check_constraints()
+    print(f"Indexes and constraint checks done in {time.perf_counter() - start:.2f}s")
+
+    return stats
+
+
+def load_sqlite_database(tables, db_path):
+    """Load `tables` into a fresh SQLite database at `db_path`."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    adapter = SQLiteAdapter(db_path)
+    try:
+        return load_database(tables, adapter)
+    finally:
+        adapter.close()
@@ -0,0 +1,133 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Digits right before the '$admin' marker or the domain: where the numeric suffix of a
+# duplicate address goes (and where an earlier suffix is replaced)
+_SUFFIX_POSITION = re.compile(r'\d*(?=[$@])')
+
+# Odd multiplier that makes the key depend on which name is first and which is last
+_FIRST_NAME_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_ADMIN_SALT = np.uint64(0xD6E8FEB86659FD93)
+
+
+def _name_hashes(names):
+    """64-bit hash of every lowercased name, computed once per distinct name."""
+    codes, uniques = pd.factorize(np.asarray(names, dtype=object), use_na_sentinel=False)
+    lowered = np.array([str(name).lower() for name in uniques], dtype=object)
+    return pd.util.hash_array(lowered, categorize=False)[codes]
+
+
+def email_keys(users):
+    """
+    Key of the address every user's email is built from (`first.last@...` or
+    `first.last$admin@...`, before any numeric suffix), as a 64-bit hash of the lowercased
+    names and the account type. Users whose addresses would be equal get equal keys.
+
+    Args:
+        users (pd.DataFrame): first_name, last_name, account_type.
+
+    Returns:
+        np.ndarray: uint64 key per user.
+    """
+    is_admin = (users['account_type'] == 'admin').to_numpy()
+    keys = _name_hashes(users['first_name']) * _FIRST_NAME_MULTIPLIER ^ _name_hashes(users['last_name'])
+    return keys ^ (is_admin.astype(np.uint64) * _ADMIN_SALT)
+
+
+def _with_suffixes(emails, occurrences):
+    return np.array([_SUFFIX_POSITION.sub(str(n), email, count=1)
+                     for email, n in zip(emails, occurrences.tolist())], dtype=object)
+
+
+class EmailIndex:
+    """
+    Number of users holding each address so far, keyed by `email_keys`: 12 bytes per
+    distinct address in two sorted arrays, so it stays small at tens of millions of users.
+
+    Every user whose address is already taken gets the next numeric suffix of that
+    address (`john.smith2@jmangroup.com`, then `john.smith3@...`), in row order, so the
+    result only depends on the order the users are added in. Two different addresses
+    with the same 64-bit key only cost one of them a needless suffix; equal addresses
+    always share a key, so the emails stay unique either way.
+    """
+
+    def __init__(self):
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self.collisions = 0
+
+    @classmethod
+    def from_users(cls, users):
+        """Index of an existing user table, e.g. to append users to it."""
+        index = cls()
+        keys, counts = np.unique(email_keys(users), return_counts=True)
+        index._keys, index._counts = keys, counts.astype(np.int64)
+        return index
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _held(self, keys):
+        """
+        Users already holding each of the (sorted, distinct) `keys`, with the position of
+        every key in the index (its insertion point when it is not there yet).
+        """
+        positions = np.searchsorted(self._keys, keys)
+        found = positions < len(self._keys)
+        found[found] = self._keys[positions[found]] == keys[found]
+        held = np.zeros(len(keys), dtype=np.int64)
+        held[found] = self._counts[positions[found]]
+        return held, positions, found
+
+    def add(self, users, keys=None, local_suffixes=False):
+        """
+        Register `users` in row order and give every one whose address is taken (by an
+        earlier batch or an earlier row of this one) a numeric suffix. `users['email']` is
+        rewritten in place for those rows.
+
+        Args:
+            users (pd.DataFrame): first_name, last_name, account_type, email.
+            keys (np.ndarray): `email_keys(users)`, when already computed.
+            local_suffixes (bool): The emails already carry the suffixes they got from an
+                index of their own (a shard part), so only the rows that collide with
+                earlier batches are rewritten.
+
+        Returns:
+            int: Number of users that got a suffix, i.e. collisions resolved.
+        """
+        keys = email_keys(users) if keys is None else keys
+        if not len(keys):
+            return 0
+
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(keys)])
+        groups = np.repeat(np.arange(len(starts)), sizes)
+        rank = np.arange(len(keys)) - starts[groups]
+
+        distinct = sorted_keys[starts]
+        held, positions, found = self._held(distinct)
+
+        occurrences = np.empty(len(keys), dtype=np.int64)
+        occurrences[order] = held[groups] + rank + 1
+
+        rewrite = occurrences > 1
+        if local_suffixes:
+            prior = np.empty(len(keys), dtype=np.int64)
+            prior[order] = held[groups]
+            rewrite &= prior > 0
+        if rewrite.any():
+            emails = users['email'].to_numpy(dtype=object, copy=True)
+            emails[rewrite] = _with_suffixes(emails[rewrite], occurrences[rewrite])
+            users['email'] = emails
+
+        self._counts[positions[found]] += sizes[found]
+        self._keys = np.insert(self._keys, positions[~found], distinct[~found])
+        self._counts = np.insert(self._counts, positions[~found], sizes[~found])
+
+        collisions = int((occurrences > 1).sum())
+        self.collisions += collisions
+        return collisions
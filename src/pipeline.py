@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Callable
+
+from colorama import Fore, Style
+
+MANIFEST_NAME = '.pipeline_manifest.json'
+HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class Stage:
+    """
+    One step of the generation pipeline.
+
+    Args:
+        name (str): Stage name, used by `--force` and in the manifest.
+        run (Callable[[TableStore], None]): Does the work, reading its inputs from the
+            store and putting every table in `outputs` back into it (or writing it to its
+            file and calling `TableStore.written`).
+        inputs (list[str]): Names of the tables the stage reads.
+        outputs (list[str]): Names of the tables the stage produces.
+        params (dict): JSON-serializable parameters; changing any of them reruns the stage.
+    """
+    name: str
+    run: Callable[['TableStore'], None]
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+
+
+class TableStore:
+    """
+    In-memory copies of the pipeline tables, keyed by name.
+
+    Every table is backed by a file. A table produced in this run is handed to the
+    next stages as the same DataFrame and only written out as an artifact (on a
+    background writer when one is given); a table whose producing stage was skipped
+    is loaded from its file on first use.
+
+    Args:
+        tables (dict): name -> (path, loader). `loader(path)` reads the file back with
+            proper dtypes; `None` for raw input files that stages open themselves.
+        writer (BackgroundWriter): Optional writer for the artifacts. Without one, tables
+            are written synchronously in `put`.
+    """
+
+    def __init__(self, tables, writer=None):
+        self.tables = tables
+        self.writer = writer
+        self.frames = {}
+
+    def path(self, name):
+        return self.tables[name][0]
+
+    def get(self, name):
+        if name not in self.frames:
+            path, loader = self.tables[name]
+            self.frames[name] = loader(path)
+        return self.frames[name]
+
+    def get_or_path(self, name):
+        """
+        The in-memory table when there is one, else its file, for readers that load only
+        part of a table (see `table_io.as_frame`).
+        """
+        return self.frames.get(name, self.path(name))
+
+    def put(self, name, df, write=None):
+        if write is None:
+            # Imported here so building a pipeline does not load pandas
+            from table_io import write_table as write
+        path = self.path(name)
+        self.frames[name] = df
+        if self.writer is not None:
+            self.writer.submit(df, path, write)
+        else:
+            write(df, path)
+        print(f"{Fore.GREEN}Stored {name} at : {path}{Style.RESET_ALL}")
+
+    def written(self, name):
+        """
+        Record that a stage streamed `name` straight to its file instead of putting a
+        frame; later stages load it from the file.
+        """
+        self.frames.pop(name, None)
+        print(f"{Fore.GREEN}Stored {name} at : {self.path(name)}{Style.RESET_ALL}")
+
+    def wait(self, names=None):
+        """Block until the artifacts of `names` (default: all tables) are on disk."""
+        if self.writer is not None:
+            self.writer.wait(None if names is None else [self.path(name) for name in names])
+
+
+def file_fingerprint(path, previous=None):
+    """
+    Content hash of `path` along with its size and mtime.
+
+    When `previous` (an earlier fingerprint of the same file) has the same size and
+    mtime, its hash is reused instead of reading the file again.
+
+    Returns:
+        dict | None: {'sha256', 'size', 'mtime_ns'}, or None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+
+    stat = os.stat(path)
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        return previous
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return {'sha256': digest.hexdigest(), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def manifest_key(path, manifest_path):
+    """
+    Manifest entry key of `path`: the path relative to the manifest's directory (the
+    data directory), so a moved or copied data directory keeps its entries.
+    """
+    return os.path.relpath(os.path.abspath(path), os.path.dirname(os.path.abspath(manifest_path)))
+
+
+def refresh_manifest(manifest_path, paths, rerun=()):
+    """
+    Record the current content of `paths` in the manifest after they were changed
+    outside a pipeline run (e.g. by an append that keeps them consistent with each
+    other), so the next run does not regenerate them. The entries of the stages in
+    `rerun` are dropped instead, so those stages run again next time.
+    """
+    manifest = load_manifest(manifest_path)
+    fingerprints = _fingerprints(paths, {}, manifest_path)
+    for stage_name in list(manifest):
+        if stage_name in rerun:
+            del manifest[stage_name]
+            continue
+        for key in ('inputs', 'outputs'):
+            recorded = manifest[stage_name].get(key, {})
+            recorded.update((key, fingerprint) for key, fingerprint in fingerprints.items() if key in recorded)
+    save_manifest(manifest, manifest_path)
+
+
+def _paths(store, names):
+    return [store.path(name) for name in names]
+
+
+def _fingerprints(paths, previous, manifest_path):
+    fingerprints = {}
+    for path in paths:
+        key = manifest_key(path, manifest_path)
+        fingerprints[key] = file_fingerprint(path, previous.get(key))
+    return fingerprints
+
+
+def _same_content(recorded, current):
+    if recorded is None or current is None:
+        return recorded is current
+    return recorded['sha256'] == current['sha256']
+
+
+def stale_reason(stage, entry, store, manifest_path):
+    """
+    Why `stage` has to run given its manifest `entry` (of the manifest at
+    `manifest_path`), or None if it is up to date.
+    """
+    if entry is None:
+        return "never run"
+
+    if entry.get('params') != json.loads(json.dumps(stage.params)):
+        return "parameters changed"
+
+    recorded_inputs = entry.get('inputs', {})
+    for key, fingerprint in _fingerprints(_paths(store, stage.inputs), recorded_inputs, manifest_path).items():
+        if not _same_content(recorded_inputs.get(key), fingerprint):
+            return f"input changed: {os.path.basename(key)}"
+
+    recorded_outputs = entry.get('outputs', {})
+    for key, fingerprint in _fingerprints(_paths(store, stage.outputs), recorded_outputs, manifest_path).items():
+        if fingerprint is None:
+            return f"output missing: {os.path.basename(key)}"
+        if not _same_content(recorded_outputs.get(key), fingerprint):
+            return f"output modified: {os.path.basename(key)}"
+
+    return None
+
+
+def _row_count(store, names):
+    frames = [store.frames[name] for name in names if hasattr(store.frames.get(name), '__len__')]
+    return sum(len(frame) for frame in frames) if frames else None
+
+
+def run_pipeline(stages, store, manifest_path, force=(), telemetry=None):
+    """
+    Run `stages` in order, skipping those whose inputs, parameters and outputs match
+    the manifest. A stage that reruns rewrites its outputs, which changes the input
+    hashes of the stages reading them, so everything downstream of a change reruns too.
+
+    Tables are passed between stages through `store`; artifacts still being written
+    in the background are only waited for when a later stage needs their hash, and
+    at the end of the run.
+
+    Args:
+        stages (list[Stage]): Stages in dependency order.
+        store (TableStore): Tables shared by the stages.
+        manifest_path (str): JSON file holding the hashes of the last successful runs, in
+            the data directory; files are recorded relative to it (see `manifest_key`).
+        force (Iterable[str]): Stage names to rerun regardless of the manifest ('all' forces every stage).
+        telemetry (RunTelemetry): Optional recorder for per-stage time, memory and row counts.
+
+    Returns:
+        list[str]: Names of the stages that ran.
+    """
+    force = set(force)
+    manifest = load_manifest(manifest_path)
+    pending = {}
+    ran = []
+
+    def finalize(stage_name):
+        entry = pending.pop(stage_name)
+        outputs = entry.pop('output_tables')
+        store.wait(outputs)
+        entry['outputs'] = _fingerprints(_paths(store, outputs), {}, manifest_path)
+        manifest[stage_name] = entry
+        save_manifest(manifest, manifest_path)
+
+    for stage in stages:
+        # Outputs of earlier stages must be on disk before they can be hashed as inputs
+        for name in [name for name, entry in pending.items() if set(entry['output_tables']) & set(stage.inputs)]:
+            finalize(name)
+
+        entry = manifest.get(stage.name)
+        reason = "forced" if stage.name in force or 'all' in force else stale_reason(stage, entry, store, manifest_path)
+
+        if reason is None:
+            print(f"{Fore.CYAN}Skipping {stage.name} (up to date){Style.RESET_ALL}")
+            if telemetry is not None:
+                telemetry.skipped(stage.name)
+            continue
+
+        print(f"{Fore.YELLOW}Running {stage.name} ({reason}){Style.RESET_ALL}")
+        previous = entry or {}
+        inputs = _fingerprints(_paths(store, stage.inputs), previous.get('inputs', {}), manifest_path)
+
+        if telemetry is None:
+            stage.run(store)
+        else:
+            with telemetry.stage(stage.name) as report:
+                stage.run(store)
+                report['reason'] = reason
+                report['input_rows'] = _row_count(store, stage.inputs)
+                report['output_rows'] = _row_count(store, stage.outputs)
+
+        pending[stage.name] = {
+            'params': json.loads(json.dumps(stage.params)),
+            'inputs': inputs,
+            'output_tables': list(stage.outputs),
+        }
+        ran.append(stage.name)
+
+    for name in list(pending):
+        finalize(name)
+
+    return ran
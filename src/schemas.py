@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+COMPETENCY_LEVELS = ['beginner', 'intermediate', 'advanced']
+
+# Pandas dtype of every column type used in TABLE_SCHEMAS. Ids fit in int32 and dept
+# ids and scores in int8; free text stays object, which is what the CSV reader produces.
+COLUMN_TYPES = {
+    'id': np.dtype('int32'),
+    'small_int': np.dtype('int8'),
+    'nullable_small_int': pd.Int8Dtype(),
+    'text': np.dtype('object'),
+    'label': pd.CategoricalDtype(),
+    'competency': pd.CategoricalDtype(COMPETENCY_LEVELS, ordered=True),
+    'timestamp': np.dtype('datetime64[us]'),
+    'id_list': np.dtype('object'),
+}
+
+# Column types of the generated tables, keyed by file stem, in column order
+TABLE_SCHEMAS = {
+    'User': {
+        'user_id': 'id', 'first_name': 'text', 'last_name': 'text', 'email': 'text', 'password': 'text',
+        'account_type': 'label', 'dept_id': 'small_int', 'createdAt': 'timestamp', 'updatedAt': 'timestamp',
+    },
+    'user_data_plain': {'user_id': 'id', 'password': 'text'},
+    'Course': {
+        'course_id': 'id', 'course_name': 'text', 'course_desc': 'text', 'course_img': 'label', 'course_creator': 'id',
+    },
+    'CourseDepartment': {'course_id': 'id', 'dept_id': 'small_int'},
+    'Skill': {'skill_id': 'id', 'skill_name': 'text'},
+    # Skills listed without a department keep an empty dept_id
+    'SkillDepartment': {'id': 'id', 'skill_id': 'id', 'dept_id': 'nullable_small_int'},
+    'SkillUsers': {'id': 'id', 'user_id': 'id', 'skill_id': 'id', 'competency': 'competency'},
+    'CourseUser': {'id': 'id', 'user_id': 'id', 'course_id': 'id', 'score': 'small_int'},
+    'extracted_courses': {
+        'course_id': 'id', 'course_name': 'text', 'course_url': 'text', 'course_desc': 'text', 'skills': 'text',
+    },
+    'classified_courses': {
+        'course_id': 'id', 'course_name': 'text', 'course_url': 'text', 'course_desc': 'text', 'skills': 'text',
+        'assigned_departments': 'id_list',
+    },
+}
+
+
+def column_dtypes(table, columns=None):
+    """
+    Pandas dtypes of the columns of `table` (a file stem such as 'User').
+
+    Args:
+        table (str): Table name.
+        columns (Iterable[str]): Only these columns. Defaults to every column.
+
+    Returns:
+        dict: column -> dtype. Empty for tables without a schema.
+    """
+    schema = TABLE_SCHEMAS.get(table, {})
+    names = schema if columns is None else [column for column in columns if column in schema]
+    return {column: COLUMN_TYPES[schema[column]] for column in names}
+
+
+def _has_dtype(series, dtype):
+    # A categorical type without fixed categories accepts any categorical column
+    if isinstance(dtype, pd.CategoricalDtype) and dtype.categories is None:
+        return isinstance(series.dtype, pd.CategoricalDtype)
+    return series.dtype == dtype
+
+
+def _cast(series, dtype):
+    if pd.api.types.is_integer_dtype(dtype) and series.notna().any():
+        info = np.iinfo(getattr(dtype, 'numpy_dtype', dtype))
+        if series.min() < info.min or series.max() > info.max:
+            raise ValueError(f"{series.name} does not fit in {dtype}: values range "
+                             f"from {series.min()} to {series.max()}")
+    return series.astype(dtype)
+
+
+def apply_schema(df, table):
+    """
+    `df` with the columns listed in the schema of `table` cast to their dtypes. Columns
+    already in the right dtype are shared, not copied; other columns are kept as they are.
+
+    Raises:
+        ValueError: If integers do not fit in the schema's integer type.
+    """
+    casts = {column: dtype for column, dtype in column_dtypes(table, df.columns).items()
+             if dtype != object and not _has_dtype(df[column], dtype)}
+    if not casts:
+        return df
+    df = df.copy(deep=False)
+    for column, dtype in casts.items():
+        df[column] = _cast(df[column], dtype)
+    return df
+
+
+def csv_read_options(table, usecols=None):
+    """
+    `pd.read_csv` arguments that read `table` straight into its dtypes. Object columns
+    are read as text even when they look numeric; timestamps are parsed here and
+    converted to their resolution by `apply_schema`.
+    """
+    dtypes = column_dtypes(table, usecols)
+    timestamps = [column for column, dtype in dtypes.items() if dtype.kind == 'M']
+    return {
+        'dtype': {column: str if dtype == object else dtype for column, dtype in dtypes.items() if column not in timestamps},
+        'parse_dates': timestamps,
+    }
@@ -0,0 +1,65 @@
+import base64
+import random
+import zlib
+
+import numpy as np
+from faker import Faker
+
+# bcrypt's base64 is the standard encoding over a different alphabet
+_STANDARD_B64 = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+_BCRYPT_B64 = b'./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+_TO_BCRYPT_B64 = bytes.maketrans(_STANDARD_B64, _BCRYPT_B64)
+
+
+def stage_seed(seed, stage, shard=0):
+    """
+    Seed sequence of one shard of one stage.
+
+    Every (stage, shard) pair gets an independent stream derived from the run seed, so
+    the numbers a shard draws do not depend on which other stages ran or how many
+    workers process the shards.
+
+    Args:
+        seed (int | None): Run seed (`--seed`). None draws fresh OS entropy.
+        stage (str): Stage name, e.g. 'users'.
+        shard (int): Shard number within the stage.
+
+    Returns:
+        np.random.SeedSequence
+    """
+    # crc32 rather than hash(): str hashes are salted per process
+    return np.random.SeedSequence(seed, spawn_key=(zlib.crc32(stage.encode()), shard))
+
+
+def stage_rng(seed, stage, shard=0):
+    """NumPy generator for one shard of one stage (see `stage_seed`)."""
+    return np.random.default_rng(stage_seed(seed, stage, shard))
+
+
+def _derived_int(rng):
+    return int(rng.integers(0, 2 ** 63))
+
+
+def seeded_faker(rng):
+    """A Faker instance seeded from `rng`, for generators that still need Faker's data."""
+    faker = Faker()
+    faker.seed_instance(_derived_int(rng))
+    return faker
+
+
+def seeded_random(rng):
+    """A `random.Random` seeded from `rng`, for code written against the stdlib API."""
+    return random.Random(_derived_int(rng))
+
+
+def bcrypt_salts(rng, count, rounds):
+    """
+    `count` bcrypt salts drawn from `rng` (bcrypt.gensalt() reads the OS entropy pool).
+
+    Returns:
+        list[bytes]: Salts of the form b'$2b$<rounds>$<22 chars>', usable with bcrypt.hashpw.
+    """
+    raw = rng.bytes(16 * count)
+    prefix = b'$2b$%02d$' % rounds
+    return [prefix + base64.b64encode(raw[i:i + 16]).rstrip(b'=').translate(_TO_BCRYPT_B64)
+            for i in range(0, len(raw), 16)]
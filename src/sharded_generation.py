@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from colorama import Fore, Style
+from tqdm import tqdm
+
+from assignment_engine import disable_progress_bars, assign_items, build_dept_csr, prepare_user_ages
+from courseUsers_data_generation import COURSE_COUNT_RULES, SCORE_RULES
+from email_index import EmailIndex, email_keys
+from seeding import stage_rng
+from shared_arrays import SharedArrays, attach_arrays
+from skillUsers_data_generation import COMPETENCY_RULES, SKILL_COUNT_RULES
+from table_io import ChunkedTableWriter, as_frame, read_table, write_table
+from telemetry import section
+from user_data_generate import (DEFAULT_BCRYPT_ROUNDS, MAX_CREATED_STEP, START_DATE, build_users_batch,
+                                created_offsets_scale, default_max_step, draw_created_offsets, hash_passwords,
+                                report_email_collisions, scale_created_offsets)
+
+DEFAULT_SHARD_SIZE = 20_000
+SHARD_CONFIG = 'shards.json'
+# Email keys of a shard's users (`email_index.email_keys`), kept for the merge
+EMAIL_KEYS_FILE = 'email_keys.npy'
+
+# Tables every shard writes a part of; the value is the id column renumbered on merge
+SHARD_TABLES = {
+    'users': None,
+    'user_passwords': None,
+    'skill_users': 'id',
+    'course_users': 'id',
+}
+
+
+def shard_ranges(no_of_users, shard_size):
+    """(first user_id, number of users) of every shard."""
+    return [(start, min(shard_size, no_of_users - start + 1)) for start in range(1, no_of_users + 1, shard_size)]
+
+
+def _shard_dir(parts_dir, shard):
+    return os.path.join(parts_dir, f'shard-{shard:05d}')
+
+
+def _part_path(parts_dir, shard, output_path):
+    return os.path.join(_shard_dir(parts_dir, shard), os.path.basename(output_path))
+
+
+def _shard_offsets(entropy, shard, size, max_step, scale):
+    offsets = draw_created_offsets(stage_rng(entropy, 'user_created_at', shard), size, max_step)
+    return scale_created_offsets(offsets, scale)
+
+
+def _created_bases(entropy, ranges, max_step):
+    """
+    createdAt of the user preceding every shard, and the factor every shard scales its
+    createdAt gaps by so that the last user is created by END_DATE (see
+    `created_offsets_scale`). Each shard draws its gaps from its own stream, so the bases
+    only need the sum of every earlier shard's gaps, not the shards themselves.
+    """
+    origin = START_DATE + stage_rng(entropy, 'user_created_origin').random() * MAX_CREATED_STEP
+    base_us = (pd.Timestamp(origin) - pd.Timestamp(0)) // pd.Timedelta(microseconds=1)
+
+    total_us = sum(int(_shard_offsets(entropy, shard, size, max_step, 1.0).sum())
+                   for shard, (_, size) in enumerate(ranges))
+    scale = created_offsets_scale(total_us, origin)
+
+    bases = []
+    for shard, (_, size) in enumerate(ranges):
+        bases.append(pd.Timestamp(base_us, unit='us'))
+        base_us += int(_shard_offsets(entropy, shard, size, max_step, scale).sum())
+    return bases, scale
+
+
+# Dept -> skills/courses arrays of the worker process, attached by `_init_worker`
+_links = None
+
+
+def _run_shard(task, links=None):
+    """Generate and write one shard: users, their passwords and their skill/course assignments."""
+    links = links if links is not None else _links
+    shard, entropy = task['shard'], task['entropy']
+    rng = stage_rng(entropy, 'users', shard)
+    offsets = _shard_offsets(entropy, shard, task['size'], task['max_step'], task['created_scale'])
+
+    users = build_users_batch(task['size'], start_user_id=task['start'], created_after=task['created_after'],
+                              max_step=task['max_step'], rng=rng, created_offsets=offsets)
+    # Emails are made unique within the shard here; the merge only renumbers the ones
+    # that collide with an earlier shard
+    keys = email_keys(users)
+    EmailIndex().add(users, keys)
+    passwords = users[['user_id', 'password']].copy()
+    users['password'] = hash_passwords(passwords['password'].tolist(), rounds=task['bcrypt_rounds'], workers=1, rng=rng)
+
+    user_ages = prepare_user_ages(users)
+    frames = {
+        'users': users,
+        'user_passwords': passwords,
+        'skill_users': assign_items(user_ages, (links['skill_indptr'], links['skills']), 'skill_id', SKILL_COUNT_RULES,
+                                    'competency', COMPETENCY_RULES, rng=stage_rng(entropy, 'skill_users', shard)),
+        'course_users': assign_items(user_ages, (links['course_indptr'], links['courses']), 'course_id', COURSE_COUNT_RULES,
+                                     'score', SCORE_RULES, rng=stage_rng(entropy, 'course_users', shard)),
+    }
+
+    # Write into a scratch directory and rename it, so a shard directory is always complete
+    final_dir = _shard_dir(task['parts_dir'], shard)
+    scratch_dir = f"{final_dir}.tmp"
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+    os.makedirs(scratch_dir)
+    for name, df in frames.items():
+        write_table(df, os.path.join(scratch_dir, os.path.basename(task['output_paths'][name])))
+    np.save(os.path.join(scratch_dir, EMAIL_KEYS_FILE), keys)
+    os.replace(scratch_dir, final_dir)
+
+    return shard
+
+
+def _init_worker(links_spec):
+    global _links
+    disable_progress_bars()
+    _links = attach_arrays(links_spec)
+
+
+def _link_digest(*csr_arrays):
+    digest = hashlib.sha256()
+    for array in csr_arrays:
+        digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def _prepare_parts_dir(parts_dir, config):
+    """
+    Keep the finished shards of an earlier, interrupted run with the same configuration;
+    start over otherwise. Returns the configuration in effect (with its entropy).
+    """
+    config_path = os.path.join(parts_dir, SHARD_CONFIG)
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            previous = json.load(f)
+        if {key: value for key, value in previous.items() if key != 'entropy'} == config:
+            return previous
+        shutil.rmtree(parts_dir)
+
+    os.makedirs(parts_dir, exist_ok=True)
+    # Without a seed the run still needs one fixed entropy, shared by the coordinator and
+    # every worker and kept for a resumed run
+    entropy = config['seed'] if config['seed'] is not None else np.random.SeedSequence().entropy
+    config = {**config, 'entropy': entropy}
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+def merge_shards(parts_dir, n_shards, output_paths):
+    """
+    Concatenate the shard parts into the output tables in shard order, renumbering the
+    global id columns and the email suffixes that collide across shards. Parts are
+    streamed, so only one part (and the email index) is in memory at a time.
+
+    Returns:
+        dict: table name -> rows written.
+    """
+    rows = {}
+    emails = EmailIndex()
+    for name, id_column in SHARD_TABLES.items():
+        # Parts are written on a background thread while the next one is read
+        with section('merge_shards', kind='io'), ChunkedTableWriter(output_paths[name], background=True) as writer:
+            for shard in range(n_shards):
+                # CSV parts are copied as text so values round-trip unchanged
+                part = read_table(_part_path(parts_dir, shard, output_paths[name]), dtype=str, keep_default_na=False)
+                if id_column is not None:
+                    part[id_column] = np.arange(writer.rows + 1, writer.rows + len(part) + 1)
+                if name == 'users':
+                    emails.add(part, np.load(os.path.join(_shard_dir(parts_dir, shard), EMAIL_KEYS_FILE)),
+                               local_suffixes=True)
+                writer.write(part)
+            rows[name] = writer.rows
+    report_email_collisions(emails.collisions)
+    return rows
+
+
+def generate_sharded(no_of_users, skill_departments, course_departments, output_paths, parts_dir,
+                     shard_size=DEFAULT_SHARD_SIZE, workers=None, seed=None, bcrypt_rounds=DEFAULT_BCRYPT_ROUNDS):
+    """
+    Generate users together with their skill and course assignments in shards of
+    `shard_size` user ids, on a process pool, and merge the shard parts into the output
+    tables.
+
+    Every shard draws from its own random streams (`seeding.stage_rng` with the shard
+    number), so for a given seed the output does not depend on `workers`. Finished
+    shards are kept in `parts_dir` until the merge; rerunning after a crash with the
+    same arguments only generates the missing shards.
+
+    Args:
+        no_of_users (int): Total number of users.
+        skill_departments (str | pd.DataFrame): SkillDepartment table, or its path.
+        course_departments (str | pd.DataFrame): CourseDepartment table, or its path.
+        output_paths (dict): Output file of every table in SHARD_TABLES (users,
+            user_passwords, skill_users, course_users).
+        parts_dir (str): Directory for the shard parts.
+        shard_size (int): Users per shard.
+        workers (int): Worker processes. Defaults to the available cores.
+        seed (int): Run seed.
+        bcrypt_rounds (int): bcrypt cost factor.
+
+    Returns:
+        dict: table name -> rows written.
+    """
+    dept_skills = build_dept_csr(as_frame(skill_departments), 'skill_id')
+    dept_courses = build_dept_csr(as_frame(course_departments), 'course_id')
+
+    config = _prepare_parts_dir(parts_dir, {
+        'no_of_users': no_of_users,
+        'shard_size': shard_size,
+        'seed': seed,
+        'bcrypt_rounds': bcrypt_rounds,
+        'outputs': sorted(os.path.basename(path) for path in output_paths.values()),
+        'links': _link_digest(*dept_skills, *dept_courses),
+        # Parts written without their email keys are not resumed
+        'email_keys': EMAIL_KEYS_FILE,
+    })
+    entropy = config['entropy']
+
+    ranges = shard_ranges(no_of_users, shard_size)
+    max_step = default_max_step(no_of_users)
+    bases, created_scale = _created_bases(entropy, ranges, max_step)
+
+    pending = [shard for shard in range(len(ranges)) if not os.path.isdir(_shard_dir(parts_dir, shard))]
+    if len(pending) < len(ranges):
+        print(f"Resuming: {len(ranges) - len(pending)} of {len(ranges)} shards already done")
+
+    tasks = [{
+        'shard': shard, 'start': ranges[shard][0], 'size': ranges[shard][1], 'created_after': bases[shard],
+        'max_step': max_step, 'created_scale': created_scale, 'entropy': entropy, 'bcrypt_rounds': bcrypt_rounds,
+        'parts_dir': parts_dir, 'output_paths': output_paths,
+    } for shard in pending]
+    links = {'skill_indptr': dept_skills[0], 'skills': dept_skills[1],
+             'course_indptr': dept_courses[0], 'courses': dept_courses[1]}
+
+    workers = workers or os.cpu_count() or 1
+    with section('shard_generation'):
+        if workers == 1:
+            for task in tqdm(tasks, desc="Generating user shards"):
+                _run_shard(task, links)
+        else:
+            # The dept mappings are published once; workers attach instead of unpickling a copy per shard
+            with SharedArrays(links) as shared, \
+                    ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.spec,)) as executor:
+                futures = [executor.submit(_run_shard, task) for task in tasks]
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Generating user shards"):
+                    future.result()
+
+    rows = merge_shards(parts_dir, len(ranges), output_paths)
+    shutil.rmtree(parts_dir)
+
+    for name, count in rows.items():
+        print(f"{Fore.GREEN}Merged {len(ranges)} shards into {output_paths[name]} ({count} rows){Style.RESET_ALL}")
+    return rows
@@ -0,0 +1,72 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Byte alignment of every array inside the block
+ALIGNMENT = 64
+
+# Blocks attached in this process: shared memory name -> (SharedMemory, arrays)
+_attached = {}
+
+
+def _views(buffer, layout):
+    return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer, offset=offset)
+            for name, (offset, dtype, shape) in layout.items()}
+
+
+class SharedArrays:
+    """
+    Publish NumPy arrays once in a single shared memory block, so worker processes can
+    read them without each receiving a pickled copy.
+
+    Only `spec` (block name and array layout, a few hundred bytes) is sent to the
+    workers, which call `attach_arrays(spec)` to get read-only views. The publisher
+    owns the block and frees it on `close`.
+
+    Usage:
+        with SharedArrays({'indptr': indptr, 'items': items}) as shared:
+            pool = ProcessPoolExecutor(initializer=attach_arrays, initargs=(shared.spec,))
+    """
+
+    def __init__(self, arrays):
+        layout = {}
+        size = 0
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            layout[name] = (size, array.dtype.str, array.shape)
+            size += array.nbytes
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.arrays = _views(self._shm.buf, layout)
+        for name, array in arrays.items():
+            self.arrays[name][...] = array
+        self.spec = {'name': self._shm.name, 'layout': layout}
+
+    def close(self):
+        self.arrays = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_arrays(spec):
+    """
+    Views of the arrays published under `spec`, without copying them. The block stays
+    attached for the life of the process, so repeated calls are free.
+
+    Returns:
+        dict: name -> read-only np.ndarray.
+    """
+    if spec['name'] not in _attached:
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        arrays = _views(shm.buf, spec['layout'])
+        for array in arrays.values():
+            array.flags.writeable = False
+        _attached[spec['name']] = (shm, arrays)
+    return _attached[spec['name']][1]
@@ -1,78 +1,68 @@
-import os
-import pandas as pd
-import random
-from datetime import datetime
-from tqdm import tqdm 
+from assignment_engine import prepare_user_ages, build_dept_csr, assign_items, assign_items_parallel, iter_assignments
+from schemas import apply_schema
+from table_io import as_frame
 
-def generate_skillUsers(user_data_path, skill_department_path):
-    
-    skill_department_df = pd.read_csv(skill_department_path)
-    user_data_df = pd.read_csv(user_data_path)
+# Share of the department's skills a user holds, by account age
+SKILL_COUNT_RULES = [
+    {'max_age': 200, 'low': 0.0, 'high': 0.4, 'min': 1},
+    {'max_age': 500, 'low': 0.2, 'high': 0.6},
+    {'max_age': 700, 'low': 0.5, 'high': 0.8},
+    {'max_age': None, 'low': 0.7, 'high': 1.0},
+]
 
-    start_date = datetime(2019, 3, 28)
-    end_date = datetime(2021, 6, 10)  
-    current_date = datetime(2021, 6, 10)
+COMPETENCY_RULES = [
+    {'max_age': 200, 'weights': {'beginner': 3, 'intermediate': 1}},
+    {'max_age': 500, 'weights': {'beginner': 2, 'intermediate': 3, 'advanced': 1}},
+    {'max_age': 700, 'weights': {'intermediate': 1, 'advanced': 2}},
+    {'max_age': None, 'weights': {'intermediate': 1, 'advanced': 4}},
+]
 
-    user_data_df['createdAt'] = pd.to_datetime(user_data_df['createdAt'])
-    filtered_users = user_data_df[(user_data_df['createdAt'] >= start_date) & (user_data_df['createdAt'] <= end_date)]
-    filtered_users['account_age_days'] = (current_date - filtered_users['createdAt']).dt.days
-    user_data = filtered_users[['user_id', 'dept_id', 'account_age_days']]
+def generate_skillUsers(user_data_path, skill_department_path, rng=None, workers=None):
+    """
+    Assign every user a random subset of their department's skills with a competency
+    level that grows with account age.
 
-    merged_df = pd.merge(user_data, skill_department_df, on='dept_id', how='left')
-    user_skills = merged_df.groupby('user_id')['skill_id'].apply(lambda x: [int(s) for s in x if pd.notna(s)]).reset_index()
-    user_data = pd.merge(user_data, user_skills, on='user_id', how='left')
-    user_data['skill_id'] = user_data['skill_id'].apply(lambda x: [] if len(x) == 0 or pd.isna(x).any() else x)
+    Args:
+        user_data_path (str | pd.DataFrame): User table, or the path to User.csv.
+        skill_department_path (str | pd.DataFrame): SkillDepartment table, or the path to SkillDepartment.csv.
+        rng (np.random.Generator): Random source for the assignments.
+        workers (int): When set, users are assigned in fixed blocks on this many processes
+            sharing the lookup arrays (`assign_items_parallel`); the result then depends on
+            `rng` only, not on the number of workers.
 
-    def get_competency(account_age_days):
-        if account_age_days <= 200:
-            competencies = ['beginner'] * 3 + ['intermediate'] * 1
-        elif 201 <= account_age_days <= 500:
-            competencies = ['beginner'] * 2 + ['intermediate'] * 3 + ['advanced'] * 1
-        elif 501 <= account_age_days <= 700:
-            competencies = ['intermediate'] * 1 + ['advanced'] * 2
-        elif 701 <= account_age_days <= 1000:
-            competencies = ['intermediate'] * 1 + ['advanced'] * 4
-        return random.choice(competencies)
+    Returns:
+        pd.DataFrame: id, user_id, skill_id, competency.
+    """
+    skill_department_df = as_frame(skill_department_path)
+    user_data_df = as_frame(user_data_path)
 
-    def get_num_skills(skill_ids, account_age_days):
-        if len(skill_ids) == 0:
-            return 0  
-        
-        if account_age_days <= 200:
-            return max(1, random.randint(1, int(len(skill_ids) * 0.4)))
-        elif 201 <= account_age_days <= 500:
-            return random.randint(int(len(skill_ids) * 0.2), int(len(skill_ids) * 0.6))
-        elif 501 <= account_age_days <= 700:
-            return random.randint(int(len(skill_ids) * 0.5), int(len(skill_ids) * 0.8))
-        else:
-            return random.randint(int(len(skill_ids) * 0.7), len(skill_ids))
+    user_data = prepare_user_ages(user_data_df)
+    dept_skills = build_dept_csr(skill_department_df, 'skill_id')
 
-    skill_users_df = pd.DataFrame(columns=['skill_id', 'user_id', 'competency'])
+    if workers is not None:
+        skill_users = assign_items_parallel(user_data, dept_skills, 'skill_id', SKILL_COUNT_RULES, 'competency', COMPETENCY_RULES,
+                                            rng=rng, workers=workers, desc="Generating skills for users")
+    else:
+        skill_users = assign_items(user_data, dept_skills, 'skill_id', SKILL_COUNT_RULES, 'competency', COMPETENCY_RULES,
+                                   rng=rng, desc="Generating skills for users")
+    return apply_schema(skill_users, 'SkillUsers')
 
-    for user_index, user_row in tqdm(user_data.iterrows(), total=user_data.shape[0], desc="Generating skills for users"):
-        user_id = user_row['user_id']
-        account_age_days = user_row['account_age_days']
-        skill_ids = user_row['skill_id']
 
-        if len(skill_ids) > 0:  
-            num_skills = get_num_skills(skill_ids, account_age_days)
-            assigned_skills = random.sample(skill_ids, num_skills)
+def iter_skillUsers(user_data_path, skill_department_path, rng=None, workers=1):
+    """
+    The rows of the parallel `generate_skillUsers` (same `rng`, same rows) as a stream of
+    per-block frames with ids continuing across blocks, for writing tables too large
+    to hold in memory (see `table_io.ChunkedTableWriter`).
 
-            new_entries = []
-            for skill in assigned_skills:
-                competency = get_competency(account_age_days)
-                new_entries.append({  
-                    'skill_id': skill,
-                    'user_id': user_id,
-                    'competency': competency
-                })
+    Yields:
+        pd.DataFrame: id, user_id, skill_id, competency.
+    """
+    user_data = prepare_user_ages(as_frame(user_data_path))
+    dept_skills = build_dept_csr(as_frame(skill_department_path), 'skill_id')
 
-            skill_users_df = pd.concat([skill_users_df, pd.DataFrame(new_entries)], ignore_index=True)
-    
-    skill_users_df['id'] = range(1, len(skill_users_df) + 1)
-    skill_users_df = skill_users_df[['id', 'user_id', 'skill_id', 'competency']]
-
-    return skill_users_df
+    for batch in iter_assignments(user_data, dept_skills, 'skill_id', SKILL_COUNT_RULES, 'competency', COMPETENCY_RULES,
+                                  rng=rng, workers=workers, desc="Generating skills for users"):
+        yield apply_schema(batch, 'SkillUsers')
 
 # user_data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'User.csv')
 # skill_department_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'SkillDepartment.csv')
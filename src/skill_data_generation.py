@@ -1,6 +1,127 @@
 import os
+import re
+
+import numpy as np
 import pandas as pd
 
+from schemas import apply_schema
+from table_io import flatten_id_lists, read_table
+
+# Separators between the skills of a course: commas, and the runs of two or more spaces
+# Coursera.csv puts between them (rewritten to commas before splitting)
+SKILL_SEPARATOR = ','
+_WHITESPACE_SEPARATOR = re.compile(r'\s\s+')
+# Joins the skill lists of all courses so they are split in one pass
+_COURSE_DELIMITER = '\x00'
+# Department bit masks are uint64
+MAX_DEPT_ID = 63
+
+
+def _skill_department_rows(skill_ids, dept_ids, offsets):
+    """
+    SkillDepartment rows of skills whose dept ids are given flat with offsets; a skill
+    without a department keeps one row with an empty dept_id.
+    """
+    lengths = np.diff(offsets)
+    rows = np.maximum(lengths, 1)
+    row_offsets = np.concatenate([[0], np.cumsum(rows)])
+    dept_id = pd.array(np.zeros(row_offsets[-1], dtype=np.int64), dtype='Int64')
+    dept_id[:] = pd.NA
+    listed = np.repeat(row_offsets[:-1] - offsets[:-1], lengths) + np.arange(offsets[-1])
+    dept_id[listed] = dept_ids
+
+    return pd.DataFrame({
+        'id': np.arange(1, row_offsets[-1] + 1),
+        'skill_id': np.repeat(skill_ids, rows),
+        'dept_id': dept_id,
+    })
+
+
+def build_skill_tables(df):
+    """
+    Build the Skill and SkillDepartment tables from the extracted skills.
+
+    Args:
+    df (pd.DataFrame): Extracted skills with skill_id, skill_name and dept_ids.
+
+    Returns:
+    tuple[pd.DataFrame, pd.DataFrame]: Skill (skill_id, skill_name) and
+    SkillDepartment (id, skill_id, dept_id) with integer dept ids.
+    """
+    df_skills = df[['skill_id', 'skill_name']]
+
+    # One row per skill and department, with a counter 'id'
+    dept_ids, offsets = flatten_id_lists(df['dept_ids'])
+    df_exploded = _skill_department_rows(df['skill_id'].to_numpy(), dept_ids, offsets)
+
+    return apply_schema(df_skills, 'Skill'), apply_schema(df_exploded, 'SkillDepartment')
+
+
+def skill_tables_from_courses(classified_courses, min_courses=1):
+    """
+    Build the Skill and SkillDepartment tables from the `skills` column of the classified
+    courses instead of a prepared extracted_skills.csv.
+
+    The skill lists are split and counted as flat arrays. Skills are identified case-
+    insensitively and numbered by first appearance, keeping that first spelling as the
+    name. An inverted index then maps every skill to the courses that list it (sorted
+    (skill, course) pairs with offsets), and each course to its assigned departments (a
+    bit mask); a skill belongs to every department of its courses.
+
+    Args:
+        classified_courses (pd.DataFrame): Courses with skills and assigned_departments.
+        min_courses (int): Skills listed by fewer courses are left out.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: Skill (skill_id, skill_name) and
+        SkillDepartment (id, skill_id, dept_id), as `build_skill_tables`.
+    """
+    dept_ids, dept_offsets = flatten_id_lists(classified_courses['assigned_departments'])
+    # Only as many department bits as the highest dept id needs are unpacked below
+    n_dept_bits = int(dept_ids.max()) + 1 if len(dept_ids) else 0
+    if len(dept_ids) and (dept_ids.min() < 0 or n_dept_bits > MAX_DEPT_ID + 1):
+        raise ValueError(f"Department ids must be between 0 and {MAX_DEPT_ID} to fit the 64-bit department "
+                         f"masks, got {int(dept_ids.min())} to {n_dept_bits - 1}")
+    course_depts = np.zeros(len(dept_offsets) - 1, dtype=np.uint64)
+    listed = np.diff(dept_offsets) > 0
+    course_depts[listed] = np.bitwise_or.reduceat(np.left_shift(np.uint64(1), dept_ids.astype(np.uint64)),
+                                                  dept_offsets[:-1][listed])
+
+    # Tokenize: (course, skill) pairs of every course's skill list, split in one pass over
+    # the joined lists; a list with k separators holds k + 1 tokens
+    text = _WHITESPACE_SEPARATOR.sub(SKILL_SEPARATOR, _COURSE_DELIMITER.join(
+        classified_courses['skills'].fillna('').str.strip()))
+    n_courses = len(classified_courses)
+    lengths = np.fromiter((skills.count(SKILL_SEPARATOR) + 1 for skills in text.split(_COURSE_DELIMITER)),
+                          dtype=np.int64, count=n_courses) if n_courses else np.zeros(0, dtype=np.int64)
+    tokens = pd.Series(text.replace(_COURSE_DELIMITER, SKILL_SEPARATOR).split(SKILL_SEPARATOR) if n_courses else [],
+                       dtype=object).str.strip()
+    token_course = np.repeat(np.arange(n_courses), lengths)
+    named = (tokens != '').to_numpy()
+    tokens, token_course = tokens[named], token_course[named]
+
+    codes, _ = pd.factorize(tokens.str.lower())
+    names = tokens.to_numpy()[np.unique(codes, return_index=True)[1]]
+
+    # Inverted index: the courses of every skill, each (skill, course) pair once
+    pairs = np.unique(codes.astype(np.int64) * n_courses + token_course)
+    pair_skill, pair_course = np.divmod(pairs, n_courses)
+    course_counts = np.bincount(pair_skill, minlength=len(names))
+    starts = np.concatenate([[0], np.cumsum(course_counts)[:-1]])
+    skill_depts = np.bitwise_or.reduceat(course_depts[pair_course], starts) if len(pairs) else course_depts[:0]
+
+    kept = np.flatnonzero(course_counts >= min_courses)
+    skill_ids = np.arange(1, len(kept) + 1)
+    bits = (skill_depts[kept, None] >> np.arange(n_dept_bits, dtype=np.uint64)) & np.uint64(1)
+    skill_pos, skill_dept_ids = np.nonzero(bits)
+    dept_counts = np.bincount(skill_pos, minlength=len(kept))
+
+    df_skills = pd.DataFrame({'skill_id': skill_ids, 'skill_name': names[kept]})
+    df_skill_dept = _skill_department_rows(skill_ids, skill_dept_ids,
+                                           np.concatenate([[0], np.cumsum(dept_counts)]))
+    return apply_schema(df_skills, 'Skill'), apply_schema(df_skill_dept, 'SkillDepartment')
+
+
 def create_skill_and_dept_csvs(input_file_path: str, output_dir: str):
     """
     Creates two CSVs from the input file: Skill.csv with skill_id and skill_name,
@@ -13,24 +134,12 @@ def create_skill_and_dept_csvs(input_file_path: str, output_dir: str):
 
     print(f'Generating Skill Data')
     # Read the input CSV file
-    df = pd.read_csv(input_file_path)
-    
-    # Enclose dept_ids in quotes in the original dataframe before any processing
-    df['dept_ids'] = df['dept_ids'].apply(lambda x: f'"{x}"')
+    df = read_table(input_file_path)
+
+    df_skills, df_exploded = build_skill_tables(df)
     
     # Create Skill.csv with skill_id and skill_name
-    df[['skill_id', 'skill_name']].to_csv(os.path.join(output_dir, 'Skill.csv'), index=False)
-    
-    # Exploding dept_ids and saving to SkillDepartment.csv with a counter 'id'
-    df['dept_ids'] = df['dept_ids'].str.strip('[]"').str.split(', ')  # Remove brackets and split into list
-    df_exploded = df[['skill_id', 'dept_ids']].explode('dept_ids')
-    df_exploded.rename(columns={'dept_ids': 'dept_id'}, inplace=True)
-    
-    # Add an id column that increments as a counter
-    df_exploded['id'] = range(1, len(df_exploded) + 1)
-    
-    # Reorder columns to have 'id', 'skill_id', and 'dept_id'
-    df_exploded = df_exploded[['id', 'skill_id', 'dept_id']]
+    df_skills.to_csv(os.path.join(output_dir, 'Skill.csv'), index=False)
     
     # Save to SkillDepartment.csv
     df_exploded.to_csv(os.path.join(output_dir, 'SkillDepartment.csv'), index=False)
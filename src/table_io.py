@@ -0,0 +1,457 @@
+import io
+import os
+import queue
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, repeat
+
+import numpy as np
+import pandas as pd
+
+from schemas import TABLE_SCHEMAS, apply_schema, csv_read_options
+from telemetry import section
+
+OUTPUT_FORMATS = {'csv': '.csv', 'parquet': '.parquet'}
+PARQUET_COMPRESSION = 'zstd'
+# Compressed CSV tables: codec -> file suffix after '.csv'. Compressed files are written as a
+# sequence of independently compressed blocks (gzip members / zstd frames), which gzip, zstd
+# and pandas read as one stream and which lets the blocks be compressed on several threads.
+CSV_COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+COMPRESSION_BLOCK_SIZE = 4 << 20
+COMPRESSION_THREADS = os.cpu_count() or 1
+GZIP_LEVEL = 6
+# Rows read at a time when a compressed table has to be scanned for its last row
+LAST_ROW_SCAN_ROWS = 1_000_000
+_LIST_ID = re.compile(r'\d+')
+
+
+def _arrow(feature="Parquet output"):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(f"{feature} needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def _arrow_csv():
+    """pyarrow with its CSV module, or None when pyarrow is not installed (it is optional for CSV)."""
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        return None
+    return pyarrow
+
+
+# Arrow type of every column type of schemas.COLUMN_TYPES
+_ARROW_TYPES = {
+    'id': lambda pa: pa.int32(),
+    'small_int': lambda pa: pa.int8(),
+    'nullable_small_int': lambda pa: pa.int8(),
+    'text': lambda pa: pa.string(),
+    'label': lambda pa: pa.dictionary(pa.int8(), pa.string()),
+    'competency': lambda pa: pa.dictionary(pa.int8(), pa.string()),
+    'timestamp': lambda pa: pa.timestamp('us'),
+    'id_list': lambda pa: pa.list_(pa.int32()),
+}
+
+
+def table_schemas():
+    """
+    Explicit Arrow schemas of the generated tables, keyed by file stem, derived from
+    `schemas.TABLE_SCHEMAS`. Tables without an entry are written with the inferred schema.
+    """
+    pa = _arrow()
+    return {table: pa.schema([(column, _ARROW_TYPES[column_type](pa)) for column, column_type in columns.items()])
+            for table, columns in TABLE_SCHEMAS.items()}
+
+
+def table_file(name, output_format='csv', compression=None):
+    """
+    File name of table `name` (e.g. 'User') in the given output format. `compression`
+    (a key of CSV_COMPRESSIONS) applies to CSV only; Parquet is always zstd-compressed.
+    """
+    suffix = CSV_COMPRESSIONS[compression] if compression and output_format == 'csv' else ''
+    return f"{name}{OUTPUT_FORMATS[output_format]}{suffix}"
+
+
+def _compression(path):
+    return next((codec for codec, suffix in CSV_COMPRESSIONS.items() if path.endswith(suffix)), None)
+
+
+def _compress_block(block, codec):
+    if codec == 'gzip':
+        # wbits 31: a complete gzip member rather than a raw zlib stream
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(block) + compressor.flush()
+    # zstd comes with pyarrow, which releases the GIL while compressing
+    return _arrow("zstd compression").compress(block, codec='zstd', asbytes=True)
+
+
+def _write_compressed(f, data, codec, executor):
+    """Compress `data` in blocks of COMPRESSION_BLOCK_SIZE on `executor`'s threads and write them in order."""
+    view = memoryview(data)
+    blocks = [view[start:start + COMPRESSION_BLOCK_SIZE] for start in range(0, len(view), COMPRESSION_BLOCK_SIZE)]
+    for compressed in executor.map(_compress_block, blocks, repeat(codec)):
+        f.write(compressed)
+
+
+def _csv_source(path):
+    """
+    What pandas reads a CSV table from: the path itself, or for zstd a decompressing stream
+    (pandas only reads zstd through the zstandard package).
+    """
+    if _compression(path) == 'zstd':
+        return _arrow("Reading zstd tables").input_stream(path, compression='zstd')
+    return path
+
+
+def _write_csv_rows(df, f, header=True):
+    """
+    Write `df` to the binary file `f` exactly as `df.to_csv(index=False)` would. Frames of
+    integers only (CourseUser, id tables) go through pyarrow's multi-threaded CSV writer
+    when pyarrow is installed, which writes the same bytes several times faster.
+    """
+    pa = _arrow_csv()
+    if pa is None or not all(dtype.kind in 'iu' for dtype in df.dtypes):
+        df.to_csv(f, index=False, header=header)
+        return
+    # pyarrow quotes header names, so the header is written here
+    if header:
+        f.write((','.join(df.columns) + '\n').encode())
+    pa.csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), f, pa.csv.WriteOptions(include_header=False))
+
+
+def _csv_bytes(df, header=True):
+    buffer = io.BytesIO()
+    _write_csv_rows(df, buffer, header)
+    return buffer.getbuffer()
+
+
+def write_csv(df, path):
+    codec = _compression(path)
+    with open(path, 'wb') as f:
+        if codec is None:
+            _write_csv_rows(df, f)
+            return
+        with ThreadPoolExecutor(COMPRESSION_THREADS) as executor:
+            _write_compressed(f, _csv_bytes(df), codec, executor)
+
+
+def _arrow_table(df, path):
+    """`df` as an Arrow table, cast to the schema of the table stored at `path` if it has one."""
+    pa = _arrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    schema = table_schemas().get(_table_name(path))
+    if schema is not None:
+        table = table.select(schema.names).cast(schema)
+    return table
+
+
+def write_parquet(df, path):
+    _arrow().parquet.write_table(_arrow_table(df, path), path, compression=PARQUET_COMPRESSION)
+
+
+def write_table(df, path):
+    """Write `df` as CSV or Parquet depending on the extension of `path`."""
+    with section('write_table', kind='io'):
+        if path.endswith('.parquet'):
+            write_parquet(df, path)
+        else:
+            write_csv(df, path)
+
+
+def _table_name(path):
+    name = os.path.basename(path)
+    codec = _compression(path)
+    if codec is not None:
+        name = name[:-len(CSV_COMPRESSIONS[codec])]
+    return os.path.splitext(name)[0]
+
+
+def _csv_options(path, csv_kwargs):
+    """`csv_kwargs` plus the schema dtypes of the table at `path`, unless the caller chose the dtypes."""
+    if 'dtype' in csv_kwargs:
+        return csv_kwargs
+    usecols = csv_kwargs.get('usecols')
+    return {**csv_read_options(_table_name(path), None if callable(usecols) else usecols), **csv_kwargs}
+
+
+def _finish(df, path, csv_kwargs):
+    return df if 'dtype' in csv_kwargs else apply_schema(df, _table_name(path))
+
+
+def read_table(path, **csv_kwargs):
+    """
+    Read a CSV or Parquet table depending on the extension of `path`, in the dtypes of
+    its schema (see `schemas.TABLE_SCHEMAS`) unless `dtype` is passed.
+    """
+    with section('read_table', kind='io'):
+        if path.endswith('.parquet'):
+            return _finish(pd.read_parquet(path, columns=csv_kwargs.get('usecols')), path, {})
+        return _finish(pd.read_csv(_csv_source(path), **_csv_options(path, csv_kwargs)), path, csv_kwargs)
+
+
+def read_table_chunks(path, chunksize, **csv_kwargs):
+    """Read a CSV or Parquet table as a sequence of DataFrames of at most `chunksize` rows."""
+    if path.endswith('.parquet'):
+        for batch in _arrow().parquet.ParquetFile(path).iter_batches(batch_size=chunksize):
+            with section('read_table', kind='io'):
+                chunk = _finish(batch.to_pandas(), path, {})
+            yield chunk
+        return
+
+    with pd.read_csv(_csv_source(path), chunksize=chunksize, **_csv_options(path, csv_kwargs)) as reader:
+        while True:
+            with section('read_table', kind='io'):
+                chunk = next(reader, None)
+                if chunk is not None:
+                    chunk = _finish(chunk, path, csv_kwargs)
+            if chunk is None:
+                return
+            yield chunk
+
+
+def read_last_row(path, block_size=1 << 16):
+    """
+    Last row of a table, reading only the end of the file (the last non-empty row group
+    for Parquet). CSV tables must not have line breaks inside values; the generated link
+    and user tables do not. Compressed CSV tables are scanned in full.
+
+    Returns:
+        pd.DataFrame | None: One row with the table's columns, or None if the table is empty.
+    """
+    with section('read_table', kind='io'):
+        if path.endswith('.parquet'):
+            parquet_file = _arrow().parquet.ParquetFile(path)
+            if parquet_file.metadata.num_rows == 0:
+                return None
+            # Files written by other tools may end with empty row groups
+            last_group = next(group for group in reversed(range(parquet_file.num_row_groups))
+                              if parquet_file.metadata.row_group(group).num_rows)
+            last_rows = parquet_file.read_row_group(last_group).to_pandas()
+            return _finish(last_rows.tail(1).reset_index(drop=True), path, {})
+
+        if _compression(path) is not None:
+            # A compressed file can only be decompressed from the start
+            last_row = None
+            for chunk in read_table_chunks(path, LAST_ROW_SCAN_ROWS):
+                if len(chunk):
+                    last_row = chunk.tail(1).reset_index(drop=True)
+            return last_row
+
+        with open(path, 'rb') as f:
+            header = f.readline()
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            tail = b''
+            position = end
+            while position > len(header) and tail.rstrip(b'\r\n').count(b'\n') < 1:
+                position = max(len(header), position - block_size)
+                f.seek(position)
+                tail = f.read(end - position)
+
+        lines = tail.rstrip(b'\r\n').split(b'\n')
+        if not lines[-1].strip():
+            return None
+        return _finish(pd.read_csv(io.BytesIO(header + lines[-1] + b'\n'), **_csv_options(path, {})), path, {})
+
+
+def append_table(df, path):
+    """
+    Append the rows of `df` to an existing table. CSV rows are appended in place (cost
+    grows with `df` only; compressed CSV gets new compressed blocks); Parquet files cannot
+    grow, so they are rewritten row group by row group with `df` added at the end.
+    Appending no rows leaves the file as it is.
+    """
+    if df.empty:
+        return
+    with section('write_table', kind='io'):
+        if path.endswith('.parquet'):
+            pa = _arrow()
+            existing = pa.parquet.ParquetFile(path)
+            tmp_path = f"{path}.tmp"
+            with pa.parquet.ParquetWriter(tmp_path, existing.schema_arrow, compression=PARQUET_COMPRESSION) as writer:
+                for group in range(existing.num_row_groups):
+                    writer.write_table(existing.read_row_group(group))
+                writer.write_table(_arrow_table(df, path).cast(existing.schema_arrow))
+            os.replace(tmp_path, path)
+        elif _compression(path) is not None:
+            with open(path, 'ab') as f, ThreadPoolExecutor(COMPRESSION_THREADS) as executor:
+                _write_compressed(f, _csv_bytes(df, header=False), _compression(path), executor)
+        else:
+            with open(path, 'ab') as f:
+                _write_csv_rows(df, f, header=False)
+
+
+class ChunkedTableWriter:
+    """
+    Write a table to CSV or Parquet one DataFrame chunk at a time, so it never has to
+    be held in memory as a whole. Chunks must all have the same columns.
+
+    With `background=True`, `write` only queues the chunk and a writer thread serializes,
+    compresses and writes it while the caller produces the next one. At most
+    `queue_chunks` chunks wait in the queue (`write` blocks while it is full), so memory
+    stays bounded however large the table grows. Compressed CSV (see CSV_COMPRESSIONS)
+    is compressed on `threads` threads.
+
+    Usage:
+        with ChunkedTableWriter(path) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+
+    Args:
+        path (str): Output file; its extension picks the format and compression.
+        background (bool): Write on a background thread.
+        threads (int): Compression threads.
+        queue_chunks (int): Chunks queued for the background thread at most.
+    """
+
+    def __init__(self, path, background=False, threads=COMPRESSION_THREADS, queue_chunks=1):
+        self.path = path
+        self.rows = 0
+        self._parquet_writer = None
+        self._file = None
+        self._codec = _compression(path)
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='table-compress') if self._codec else None
+        self._queue = None
+        self._error = None
+        if background:
+            self._queue = queue.Queue(maxsize=queue_chunks)
+            self._thread = threading.Thread(target=self._drain, name='chunk-writer', daemon=True)
+            self._thread.start()
+
+    def write(self, df):
+        """Write `df` (or queue it, in the background); `rows` counts the rows written so far."""
+        if self._queue is None:
+            self._write(df)
+        else:
+            if self._error is not None:
+                raise self._error
+            self._queue.put(df)
+        self.rows += len(df)
+
+    def _drain(self):
+        while True:
+            df = self._queue.get()
+            if df is None:
+                return
+            # After a failure the queue is still emptied, so `write` never blocks on it
+            if self._error is None:
+                try:
+                    self._write(df)
+                except BaseException as e:
+                    self._error = e
+
+    def _write(self, df):
+        with section('write_table', kind='io'):
+            if self.path.endswith('.parquet'):
+                table = _arrow_table(df, self.path)
+                if self._parquet_writer is None:
+                    self._parquet_writer = _arrow().parquet.ParquetWriter(
+                        self.path, table.schema, compression=PARQUET_COMPRESSION)
+                self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+                return
+
+            header = self._file is None
+            if header:
+                self._file = open(self.path, 'wb')
+            if self._codec is None:
+                _write_csv_rows(df, self._file, header)
+            else:
+                _write_compressed(self._file, _csv_bytes(df, header), self._codec, self._executor)
+
+    def close(self):
+        if self._queue is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._queue = None
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def as_frame(table, reader=read_table):
+    """
+    Accept either an in-memory DataFrame or a path to one, so stage functions can be
+    chained in memory and still be called on files.
+    """
+    if isinstance(table, pd.DataFrame):
+        return table
+    return reader(table)
+
+
+def flatten_id_lists(lists):
+    """
+    An id-list column (e.g. assigned_departments) as one flat array with offsets, without
+    a Python list per row.
+
+    Args:
+        lists (pd.Series): Lists (or arrays) of ids, or their text form ('[2, 5]') as read
+            from CSV. Missing values count as empty lists.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The ids of every row one after the other, and the
+        offsets of every row's ids in them (one more than the rows).
+    """
+    values = lists.to_numpy(dtype=object)
+    if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        text = lists.fillna('')
+        lengths = text.str.count(_LIST_ID.pattern).to_numpy(dtype=np.int64)
+        ids = np.array(_LIST_ID.findall(' '.join(text)), dtype=np.int64)
+    else:
+        lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+        ids = np.fromiter(chain.from_iterable(values), dtype=np.int64, count=int(lengths.sum()))
+    return ids, np.concatenate([[0], np.cumsum(lengths)])
+
+
+class BackgroundWriter:
+    """
+    Serialize frames to disk on a worker thread while the pipeline keeps going.
+
+    Frames handed to `submit` must not be modified afterwards; stages that need to
+    change a table work on a (shallow) copy.
+    """
+
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='table-writer')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, df, path, write=write_table):
+        with self._lock:
+            self._pending[path] = self._executor.submit(write, df, path)
+
+    def wait(self, paths=None):
+        """Block until the given paths (default: every pending path) are written."""
+        with self._lock:
+            paths = list(self._pending) if paths is None else [path for path in paths if path in self._pending]
+            futures = [(path, self._pending[path]) for path in paths]
+
+        for path, future in futures:
+            future.result()
+            with self._lock:
+                if self._pending.get(path) is future:
+                    del self._pending[path]
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
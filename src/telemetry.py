@@ -0,0 +1,153 @@
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Stage currently being measured, if any. Sections opened outside a measured stage,
+# or on another thread (e.g. the background writer), are not recorded.
+_active = None
+
+
+class _StageRecord:
+    def __init__(self, name):
+        self.name = name
+        self.thread = threading.current_thread()
+        self.sections = {}
+        self.kind_seconds = {'compute': 0.0, 'io': 0.0}
+        self.counters = {}
+        self.depth = 0
+
+
+@contextmanager
+def section(name, kind='compute'):
+    """
+    Time a block inside the running stage under `name`. `kind` is 'compute' or 'io'.
+    Only outermost sections count towards the stage's compute/io split, so nested
+    sections (a read inside a compute block) are not counted twice.
+    """
+    record = _active
+    if record is None or threading.current_thread() is not record.thread:
+        yield
+        return
+
+    record.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        record.depth -= 1
+
+        entry = record.sections.setdefault(name, {'kind': kind, 'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+        if record.depth == 0:
+            record.kind_seconds[kind] += seconds
+
+
+def count(name, value=1):
+    """Add `value` to the counter `name` of the running stage (e.g. cache hits)."""
+    record = _active
+    if record is None or threading.current_thread() is not record.thread:
+        return
+    record.counters[name] = record.counters.get(name, 0) + value
+
+
+class RunTelemetry:
+    """
+    Per-stage measurements for one pipeline run: wall and CPU time, peak traced memory,
+    row counts, throughput and the compute/io split of the instrumented sections.
+
+    Args:
+        profile_dir (str): When set, every stage is also run under cProfile and its stats
+            are dumped to `<profile_dir>/<stage>.prof`.
+    """
+
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.stages = []
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the stage run inside the block; yields the report entry to add row counts to."""
+        global _active
+
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+        entry = {'name': name, 'status': 'ran'}
+        record = _StageRecord(name)
+        profiler = cProfile.Profile() if self.profile_dir else None
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        _active = record
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield entry
+        finally:
+            if profiler:
+                profiler.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            _active = None
+
+            _, peak = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+
+            entry.update({
+                'wall_seconds': wall,
+                'cpu_seconds': cpu,
+                'peak_memory_mb': peak / (1024 * 1024),
+                'compute_seconds': record.kind_seconds['compute'],
+                'io_seconds': record.kind_seconds['io'],
+                'other_seconds': max(wall - record.kind_seconds['compute'] - record.kind_seconds['io'], 0.0),
+                'sections': record.sections,
+                'counters': record.counters,
+            })
+            output_rows = entry.get('output_rows')
+            entry['rows_per_sec'] = output_rows / wall if output_rows is not None and wall > 0 else None
+
+            if profiler:
+                entry['profile'] = os.path.join(self.profile_dir, f"{name}.prof")
+                profiler.dump_stats(entry['profile'])
+
+            self.stages.append(entry)
+
+    def skipped(self, name, reason="up to date"):
+        self.stages.append({'name': name, 'status': 'skipped', 'reason': reason})
+
+    def report(self):
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'total_seconds': time.time() - self.started,
+            'stages': self.stages,
+        }
+
+    def write_report(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def summary(self):
+        """One line per stage that ran, for the console."""
+        lines = []
+        for entry in self.stages:
+            if entry['status'] != 'ran':
+                continue
+            rows = f"{entry['rows_per_sec']:,.0f} rows/s" if entry.get('rows_per_sec') else "-"
+            lines.append(f"{entry['name']:<18} {entry['wall_seconds']:8.2f}s wall {entry['cpu_seconds']:8.2f}s cpu "
+                         f"{entry['peak_memory_mb']:9.1f} MB peak  compute {entry['compute_seconds']:6.2f}s "
+                         f"io {entry['io_seconds']:6.2f}s  {rows}")
+        return lines
@@ -1,121 +1,395 @@
 import pandas as pd
+import numpy as np
 from faker import Faker
 from datetime import datetime, timedelta
 import os
 import random
 import bcrypt
-from tqdm import tqdm  
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from tqdm import tqdm
 from colorama import Fore, Style
 
+from email_index import EmailIndex
+from schemas import apply_schema
+from seeding import bcrypt_salts, seeded_faker, seeded_random
+from telemetry import count, section
+
 fake = Faker()
 
-def generate_user_data(no_of_users):
+# bcrypt's own default cost. Lower it (minimum 4) for non-production fixtures.
+DEFAULT_BCRYPT_ROUNDS = 12
+HASH_BATCH_SIZE = 256
+
+USER_TO_ADMIN_RATIO = 100
+ADMIN_DEPT_ID = 1
+
+DEPT_DISTRIBUTION = {
+    2: 20,
+    3: 12,
+    4: 5,
+    5: 7,
+    6: 6,
+    7: 9,
+    8: 9,
+    9: 12,
+    10: 8,
+    11: 6,
+    12: 3,
+    13: 5,
+    14: 6,
+    15: 1
+}
+
+START_DATE = datetime(2019, 3, 28)
+END_DATE = datetime(2021, 6, 9)
+MAX_CREATED_STEP = timedelta(days=2)
+
+# Batch mode draws names from pools instead of calling Faker once per user
+NAME_POOL_SIZE = 5000
+PASSWORD_LENGTH = 8
+PASSWORD_SPECIAL_CHARS = '!@#$%^&*()_+'
+PASSWORD_CHAR_CLASSES = [
+    PASSWORD_SPECIAL_CHARS,
+    '0123456789',
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    'abcdefghijklmnopqrstuvwxyz',
+]
+
+USER_COLUMNS = ['user_id', 'first_name', 'last_name', 'email', 'password', 'account_type', 'dept_id', 'createdAt', 'updatedAt']
+
+
+def _hash_batch(passwords, rounds, salts=None):
+    salts = salts if salts is not None else [bcrypt.gensalt(rounds) for _ in passwords]
+    return [bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8') for password, salt in zip(passwords, salts)]
+
+
+def hash_passwords(passwords, rounds=DEFAULT_BCRYPT_ROUNDS, workers=None, batch_size=HASH_BATCH_SIZE, rng=None):
     """
-    Generate a CSV file with fake user data and store it in the data folder.
-    
+    Hash plaintext passwords with bcrypt, sending fixed-size batches to a process pool.
+
+    Batches are returned in submission order, so the i-th hash always belongs to the
+    i-th password whatever the number of workers.
+
     Args:
-        no_of_users (int): The number of user entries to generate.
+        passwords (list[str]): Plaintext passwords.
+        rounds (int): bcrypt cost factor (4-31).
+        workers (int): Number of worker processes. Defaults to the available cores.
+        batch_size (int): Number of passwords sent to a worker at a time.
+        rng (np.random.Generator): When given, the salts are drawn from it up front, so
+            the hashes are reproducible and do not depend on `workers`. Otherwise every
+            salt comes from bcrypt.gensalt().
 
-    The generated CSV will contain the following fields:
-        - user_id: A counter starting from 1.
-        - first_name: A randomly generated first name.
-        - last_name: A randomly generated last name.
-        - email: Email with format based on account type. Admin accounts have `admin@jamngroup.com`, 
-                user accounts have `@jmangroup.com`.
-        - password: A randomly generated 8-character string, hashed using bcrypt.
-        - account_type: Either "user" or "admin". The first entry is always an admin, and the user-to-admin ratio is 100:1.
-        - dept_id: Assigned based on account_type and specified user distribution.
-        - createdAt: A timestamp between 1-Oct-2020 and 7-Oct-2024. The values will be strictly increasing and within 14 days of the previous entry.
-        - updatedAt: A timestamp after createdAt, within the same date range.
+    Returns:
+        list[str]: bcrypt hashes, aligned with `passwords`.
+    """
+    workers = workers or os.cpu_count() or 1
+    batches = [passwords[i:i + batch_size] for i in range(0, len(passwords), batch_size)]
+    salts = bcrypt_salts(rng, len(passwords), rounds) if rng is not None else None
+    salt_batches = [salts[i:i + batch_size] if salts else None for i in range(0, len(passwords), batch_size)]
 
-    The output is saved to the `data/user_data_without_hash.csv` and `data/user_data_with_hash.csv`.
+    with section('password_hashing'):
+        if workers == 1 or len(batches) <= 1:
+            hashed_batches = [_hash_batch(batch, rounds, batch_salts)
+                              for batch, batch_salts in tqdm(zip(batches, salt_batches), total=len(batches), desc="Hashing Passwords")]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                hashed_batches = list(tqdm(executor.map(_hash_batch, batches, repeat(rounds), salt_batches), total=len(batches), desc="Hashing Passwords"))
+
+    return [hashed for batch in hashed_batches for hashed in batch]
+
+
+def _build_users_loop(no_of_users, rng=None):
+    """
+    Build the user table one row at a time with Faker (the original generator).
+    Passwords are left in plaintext. With `rng`, Faker and the department shuffle are
+    seeded from it; otherwise the module-level Faker and `random` are used.
     """
+    fake_users = seeded_faker(rng) if rng is not None else fake
+    shuffler = seeded_random(rng) if rng is not None else random
+
     data = []
-    password_data = []  
-    user_to_admin_ratio = 100
-
-    dept_distribution = {
-        2: 20,
-        3: 12,
-        4: 5,
-        5: 7,
-        6: 6,
-        7: 9,
-        8: 9,
-        9: 12,
-        10: 8,
-        11: 6,
-        12: 3,
-        13: 5,
-        14: 6,
-        15: 1
-    }
 
     dept_list = []
-    for dept_id, count in dept_distribution.items():
+    for dept_id, count in DEPT_DISTRIBUTION.items():
         dept_list.extend([dept_id] * count)
-    
-    start_date = datetime(2019, 3, 28)  
-    end_date = datetime(2021, 6, 9)  
 
-    created_at = fake.date_time_between(start_date=start_date, end_date=(start_date + timedelta(days=2)))
+    created_at = fake_users.date_time_between(start_date=START_DATE, end_date=(START_DATE + MAX_CREATED_STEP))
 
     # Use tqdm to show progress
     for user_id in tqdm(range(1, no_of_users + 1), desc="Generating Users"):
-        first_name = fake.first_name()
-        last_name = fake.last_name()
-        password = fake.password(length=8)
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        first_name = fake_users.first_name()
+        last_name = fake_users.last_name()
+        password = fake_users.password(length=PASSWORD_LENGTH)
 
         if user_id == 1:
             account_type = "admin"
             email = f"{first_name.lower()}.{last_name.lower()}$admin@jmangroup.com"
-            dept_id = 1 
+            dept_id = ADMIN_DEPT_ID
         else:
-            if user_id % user_to_admin_ratio == 0:
+            if user_id % USER_TO_ADMIN_RATIO == 0:
                 account_type = "admin"
                 email = f"{first_name.lower()}.{last_name.lower()}$admin@jmangroup.com"
-                dept_id = 1  
+                dept_id = ADMIN_DEPT_ID
             else:
                 account_type = "user"
                 email = f"{first_name.lower()}.{last_name.lower()}@jmangroup.com"
-                if not dept_list:  
-                    for dept_id, count in dept_distribution.items():
+                if not dept_list:
+                    for dept_id, count in DEPT_DISTRIBUTION.items():
                         dept_list.extend([dept_id] * count)
-                    random.shuffle(dept_list)  
-                
+                    shuffler.shuffle(dept_list)
+
                 dept_id = dept_list.pop(0)
 
-        max_created_at = created_at + timedelta(days=2)
-        created_at = fake.date_time_between(start_date=created_at, end_date=max_created_at)
+        max_created_at = created_at + MAX_CREATED_STEP
+        created_at = fake_users.date_time_between(start_date=created_at, end_date=max_created_at)
 
-        updated_at = fake.date_time_between(start_date=created_at, end_date=end_date)
+        updated_at = fake_users.date_time_between(start_date=created_at, end_date=END_DATE)
 
         data.append({
             "user_id": user_id,
             "first_name": first_name,
             "last_name": last_name,
             "email": email,
-            "password": hashed_password,  
+            "password": password,
             "account_type": account_type,
             "dept_id": dept_id,
             "createdAt": created_at,
             "updatedAt": updated_at
         })
-        
-        password_data.append({
-            "user_id": user_id,
-            "password": password  
-        })
 
-    df = pd.DataFrame(data)
-    password_df = pd.DataFrame(password_data)
+    return apply_schema(pd.DataFrame(data, columns=USER_COLUMNS), 'User')
+
+
+def _random_passwords(rng, size):
+    """
+    Draw `size` passwords of PASSWORD_LENGTH characters at once. Like Faker's
+    password(), each one holds at least one special, digit, upper and lower case character.
+    """
+    alphabet = np.array(list(''.join(PASSWORD_CHAR_CLASSES)))
+    chars = alphabet[rng.integers(0, len(alphabet), size=(size, PASSWORD_LENGTH))]
+
+    for position, char_class in enumerate(PASSWORD_CHAR_CLASSES):
+        class_chars = np.array(list(char_class))
+        chars[:, position] = class_chars[rng.integers(0, len(class_chars), size=size)]
+
+    # Shuffle every row so the guaranteed classes do not always sit in front
+    order = np.argsort(rng.random((size, PASSWORD_LENGTH)), axis=1)
+    chars = np.take_along_axis(chars, order, axis=1)
+
+    return np.ascontiguousarray(chars).view(f'<U{PASSWORD_LENGTH}').ravel()
+
+
+def is_admin_user(user_id):
+    """Admin rule (works on arrays): the first user and every USER_TO_ADMIN_RATIO-th one."""
+    return (user_id == 1) | (user_id % USER_TO_ADMIN_RATIO == 0)
+
+
+def admin_users(no_of_users):
+    """
+    The admins among user ids 1..no_of_users, known without generating the users.
+
+    Returns:
+        pd.DataFrame: user_id, account_type ('admin').
+    """
+    user_id = np.arange(1, no_of_users + 1, dtype=np.int32)
+    admin_ids = user_id[is_admin_user(user_id)]
+    return pd.DataFrame({'user_id': admin_ids, 'account_type': 'admin'})
+
+
+def default_max_step(no_of_users, created_after=START_DATE):
+    """
+    Largest createdAt gap for `no_of_users` users created after `created_after`: the gaps
+    average span / n, so the users spread over the rest of the date range. That only
+    puts the expected last createdAt at END_DATE; `fit_created_offsets` bounds it.
+    """
+    span = max(END_DATE - created_after, timedelta(0))
+    return min(MAX_CREATED_STEP, 2 * span / max(no_of_users, 1))
+
+
+def draw_created_offsets(rng, size, max_step):
+    """Gaps in microseconds between consecutive createdAt values, uniform in [1, max_step]."""
+    max_step_us = max(max_step // timedelta(microseconds=1), 1)
+    return rng.integers(1, max_step_us, size=size, endpoint=True)
+
+
+def created_offsets_scale(total_us, created_after):
+    """
+    Factor (at most 1) that shrinks createdAt gaps summing to `total_us` microseconds so
+    that users created after `created_after` are all created by END_DATE.
+    """
+    span_us = (pd.Timestamp(END_DATE) - pd.Timestamp(created_after)) // pd.Timedelta(microseconds=1)
+    return min(1.0, max(span_us, 0) / total_us) if total_us > 0 else 1.0
+
+
+def scale_created_offsets(offsets, scale):
+    """
+    `offsets` multiplied by `scale`, rounded down so their sum stays within the scaled
+    total, and kept at 1 microsecond or more so createdAt stays strictly increasing.
+    """
+    if scale >= 1:
+        return offsets
+    return np.maximum((offsets * scale).astype(np.int64), 1)
+
+
+def fit_created_offsets(offsets, created_after):
+    """`offsets` shrunk, if needed, so the last of them ends by END_DATE (see `created_offsets_scale`)."""
+    return scale_created_offsets(offsets, created_offsets_scale(int(offsets.sum()), created_after))
+
+
+def build_users_batch(no_of_users, start_user_id=1, created_after=None, max_step=None, rng=None,
+                      created_offsets=None):
+    """
+    Build the user table with array operations instead of a per-row Faker loop.
+
+    Names come from Faker pools sampled by index, departments are drawn from
+    DEPT_DISTRIBUTION, createdAt is the cumulative sum of random positive offsets
+    (so strictly increasing) and updatedAt is computed in one array operation.
+    Passwords are left in plaintext.
+
+    Args:
+        no_of_users (int): The number of user entries to generate.
+        start_user_id (int): user_id of the first generated row.
+        created_after (datetime): createdAt of the row preceding this batch. Defaults
+            to a random instant in the first two days after START_DATE.
+        max_step (timedelta): Largest gap between consecutive createdAt values. Defaults
+            to MAX_CREATED_STEP, shrunk so that large batches spread over the date range.
+            Drawn gaps that would run past END_DATE are scaled down to end by it.
+        rng (np.random.Generator): Random source.
+        created_offsets (np.ndarray): Precomputed createdAt gaps (see `draw_created_offsets`),
+            used as given instead of drawing them from `rng`. Lets shards start where the
+            previous shard ends without generating it.
+
+    Returns:
+        pd.DataFrame: Users with the same columns as User.csv.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+
+    pool_faker = seeded_faker(rng)
+    pool_size = min(NAME_POOL_SIZE, max(no_of_users, 1))
+    first_names = np.array([pool_faker.first_name() for _ in range(pool_size)], dtype=object)
+    last_names = np.array([pool_faker.last_name() for _ in range(pool_size)], dtype=object)
+    first_name = first_names[rng.integers(0, pool_size, size=no_of_users)]
+    last_name = last_names[rng.integers(0, pool_size, size=no_of_users)]
+
+    user_id = np.arange(start_user_id, start_user_id + no_of_users, dtype=np.int32)
+    is_admin = is_admin_user(user_id)
+
+    dept_ids = np.array(list(DEPT_DISTRIBUTION.keys()))
+    dept_weights = np.array(list(DEPT_DISTRIBUTION.values()), dtype=float)
+    dept_id = rng.choice(dept_ids, size=no_of_users, p=dept_weights / dept_weights.sum()).astype(np.int8)
+    dept_id[is_admin] = ADMIN_DEPT_ID
+
+    if created_after is None:
+        created_after = START_DATE + (rng.random() * MAX_CREATED_STEP)
+    if max_step is None:
+        max_step = default_max_step(no_of_users)
+    if created_offsets is None:
+        created_offsets = fit_created_offsets(draw_created_offsets(rng, no_of_users, max_step), created_after)
+
+    base_us = (pd.Timestamp(created_after) - pd.Timestamp(0)) // pd.Timedelta(microseconds=1)
+    created_us = base_us + np.cumsum(created_offsets)
+
+    end_us = (pd.Timestamp(END_DATE) - pd.Timestamp(0)) // pd.Timedelta(microseconds=1)
+    updated_us = created_us + (rng.random(no_of_users) * np.maximum(end_us - created_us, 0)).astype(np.int64)
+
+    first_lower = pd.Series(first_name).str.lower()
+    last_lower = pd.Series(last_name).str.lower()
+    email = first_lower + '.' + last_lower + np.where(is_admin, '$admin@jmangroup.com', '@jmangroup.com')
+
+    return pd.DataFrame({
+        "user_id": user_id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+        "password": _random_passwords(rng, no_of_users),
+        "account_type": pd.Categorical.from_codes(is_admin.astype(np.int8), categories=['user', 'admin']),
+        "dept_id": dept_id,
+        "createdAt": created_us.astype('datetime64[us]'),
+        "updatedAt": updated_us.astype('datetime64[us]')
+    }, columns=USER_COLUMNS)
+
+
+def report_email_collisions(collisions):
+    """Print and count (`telemetry.count`) the duplicate emails that got a numeric suffix."""
+    count('email_collisions', collisions)
+    if collisions:
+        print(f"{Fore.YELLOW}Resolved {collisions} duplicate emails with numeric suffixes{Style.RESET_ALL}")
+
+
+def build_user_tables(no_of_users, bcrypt_rounds=DEFAULT_BCRYPT_ROUNDS, hash_workers=None, batch=False, rng=None):
+    """
+    Generate the user table in memory, with hashed passwords, plus the matching plaintext passwords.
+    Users whose email is already taken get the next numeric suffix (see `email_index.EmailIndex`).
+
+    Args:
+        no_of_users (int): The number of user entries to generate.
+        bcrypt_rounds (int): bcrypt cost factor used for the hashed passwords.
+        hash_workers (int): Number of processes used for hashing. Defaults to the available cores.
+        batch (bool): Use `build_users_batch` instead of the per-row Faker loop.
+        rng (np.random.Generator): Random source for the users and the password salts
+            (see `seeding.stage_rng`). Without it every run differs.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The User.csv table (createdAt/updatedAt as datetimes)
+        and the user_data_plain.csv table (user_id, password).
+    """
+    with section('user_generation'):
+        if batch:
+            df = build_users_batch(no_of_users, rng=rng)
+        else:
+            df = _build_users_loop(no_of_users, rng=rng)
+
+    with section('email_index'):
+        collisions = EmailIndex().add(df)
+    report_email_collisions(collisions)
+
+    password_df = df[['user_id', 'password']].copy()
+
+    # Hashing dominates the run time, so it is done in one parallel pass once all plaintexts exist
+    df['password'] = hash_passwords(password_df['password'].tolist(), rounds=bcrypt_rounds, workers=hash_workers, rng=rng)
+
+    return df, password_df
+
+
+def generate_user_data(no_of_users, bcrypt_rounds=DEFAULT_BCRYPT_ROUNDS, hash_workers=None, batch=False, rng=None):
+    """
+    Generate a CSV file with fake user data and store it in the data folder.
+
+    Args:
+        no_of_users (int): The number of user entries to generate.
+        bcrypt_rounds (int): bcrypt cost factor used for the hashed passwords.
+        hash_workers (int): Number of processes used for hashing. Defaults to the available cores.
+        batch (bool): Build the table with vectorized sampling (`build_users_batch`) instead
+                of the per-row Faker loop. Meant for large load-test fixtures.
+        rng (np.random.Generator): Random source, e.g. `seeding.stage_rng(seed, 'users')`.
+                The same generator state gives byte-identical output for any `hash_workers`.
+
+    The generated CSV will contain the following fields:
+        - user_id: A counter starting from 1.
+        - first_name: A randomly generated first name.
+        - last_name: A randomly generated last name.
+        - email: Email with format based on account type. Admin accounts have `admin@jamngroup.com`,
+                user accounts have `@jmangroup.com`. Repeated names get a numeric suffix
+                (`john.smith2@jmangroup.com`), so every email is unique.
+        - password: A randomly generated 8-character string, hashed using bcrypt.
+        - account_type: Either "user" or "admin". The first entry is always an admin, and the user-to-admin ratio is 100:1.
+        - dept_id: Assigned based on account_type and specified user distribution.
+        - createdAt: A timestamp between 1-Oct-2020 and 7-Oct-2024. The values will be strictly increasing and within 14 days of the previous entry.
+        - updatedAt: A timestamp after createdAt, within the same date range.
+
+    The output is saved to the `data/user_data_without_hash.csv` and `data/user_data_with_hash.csv`.
+
+    Returns:
+        pd.DataFrame: The generated User.csv table.
+    """
+    df, password_df = build_user_tables(no_of_users, bcrypt_rounds, hash_workers, batch, rng)
 
     output_directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-    
+
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
-    
+
     csv_filename_with_hash = os.path.join(output_directory, "User.csv")
     df.to_csv(csv_filename_with_hash, index=False)
 
@@ -125,4 +399,6 @@ def generate_user_data(no_of_users):
     print(f"{Fore.GREEN}{csv_filename_with_hash} created with {no_of_users} entries.{Style.RESET_ALL}")
     print(f"{Fore.GREEN}{csv_filename_plain} created with {no_of_users} entries.{Style.RESET_ALL}")
 
+    return df
+
 # generate_user_data(800)
@@ -0,0 +1,381 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from assignment_engine import bucket_index, prepare_user_ages
+from courseUsers_data_generation import SCORE_RULES
+from skillUsers_data_generation import COMPETENCY_RULES
+from table_io import read_table
+from telemetry import section
+from user_data_generate import ADMIN_DEPT_ID, DEPT_DISTRIBUTION
+
+# Departments a user can belong to; courses and skills only belong to the non-admin ones
+USER_DEPARTMENTS = [ADMIN_DEPT_ID, *DEPT_DISTRIBUTION]
+ITEM_DEPARTMENTS = list(DEPT_DISTRIBUTION)
+
+# Link-table rows checked at once, which bounds the per-row temporaries
+CHECK_CHUNK_ROWS = 10_000_000
+# Keys spanning less than DENSITY x their count (+ MIN_SPAN) values are indexed with a
+# direct lookup table, others with a sorted array (see `KeyIndex`)
+LOOKUP_TABLE_DENSITY = 8
+LOOKUP_TABLE_MIN_SPAN = 1 << 20
+
+# Columns the checks read from every table; tables given as files are read with only these
+CHECKED_COLUMNS = {
+    'User': ['user_id', 'email', 'account_type', 'dept_id', 'createdAt'],
+    'Course': ['course_id', 'course_creator'],
+    'CourseDepartment': ['course_id', 'dept_id'],
+    'Skill': ['skill_id'],
+    'SkillDepartment': ['id', 'skill_id', 'dept_id'],
+    'SkillUsers': ['id', 'user_id', 'skill_id', 'competency'],
+    'CourseUser': ['id', 'user_id', 'course_id', 'score'],
+}
+
+# The user <-> item link tables, the tables they refer to and the age rules their values were drawn with
+LINK_TABLES = {
+    'SkillUsers': {'items': 'Skill', 'departments': 'SkillDepartment', 'item_col': 'skill_id',
+                   'value_col': 'competency', 'value_rules': COMPETENCY_RULES},
+    'CourseUser': {'items': 'Course', 'departments': 'CourseDepartment', 'item_col': 'course_id',
+                   'value_col': 'score', 'value_rules': SCORE_RULES},
+}
+
+
+class KeyIndex:
+    """
+    Positions of a set of integer keys, looked up for whole arrays at once. Dense keys
+    (generated ids run from 1) get a direct lookup table; sparse ones are sorted and
+    searched with np.searchsorted.
+
+    Args:
+        keys (np.ndarray): Integer keys; a repeated key resolves to its last position.
+    """
+
+    def __init__(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        self.size = len(keys)
+        self.table = None
+        if len(keys) and keys.min() >= 0 and keys.max() < LOOKUP_TABLE_DENSITY * len(keys) + LOOKUP_TABLE_MIN_SPAN:
+            self.table = np.full(int(keys.max()) + 1, -1, dtype=np.int32 if len(keys) < 2 ** 31 else np.int64)
+            self.table[keys] = np.arange(len(keys))
+        else:
+            self.order = np.argsort(keys, kind='stable')
+            self.sorted = keys[self.order]
+
+    def lookup(self, values, missing=-1):
+        """Position of every value among the keys, `missing` for values that are not keys."""
+        values = np.asarray(values)
+        if self.table is not None:
+            if len(values) and values.min() >= 0 and values.max() < len(self.table):
+                positions = self.table[values]
+            else:
+                inside = (values >= 0) & (values < len(self.table))
+                positions = np.full(len(values), -1, dtype=self.table.dtype)
+                positions[inside] = self.table[values[inside]]
+        elif self.size:
+            found = np.minimum(np.searchsorted(self.sorted, values), self.size - 1)
+            positions = np.where(self.sorted[found] == values, self.order[found], -1)
+        else:
+            positions = np.full(len(values), -1, dtype=np.int64)
+
+        if missing != -1:
+            positions[positions < 0] = missing
+        return positions
+
+    def contains(self, values):
+        return self.lookup(values) >= 0
+
+
+def _column(df, column, dtype=np.int64):
+    return df[column].to_numpy(dtype=dtype)
+
+
+def _duplicates(values):
+    """Number of repeated values; ids written in increasing order are confirmed without a sort."""
+    values = np.asarray(values)
+    if np.all(values[1:] > values[:-1]):
+        return 0
+    return len(values) - len(np.unique(values))
+
+
+def _bucket_labels(rules):
+    labels, low = [], 0
+    for rule in rules:
+        labels.append(f"{low}-{rule['max_age']}" if rule['max_age'] is not None else f"{low}+")
+        low = (rule['max_age'] or 0) + 1
+    return labels
+
+
+def _rule_categories(value_rules):
+    return None if 'range' in value_rules[0] else list(dict.fromkeys(
+        value for rule in value_rules for value in rule['weights']))
+
+
+def _value_array(values, categories):
+    """
+    Values as a NumPy array: the numbers themselves for ranged rules, codes in the rule
+    `categories` (-1 for missing or unknown values) for weighted ones.
+    """
+    if categories is None:
+        return values.to_numpy()
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return pd.Categorical(values, categories=categories).codes.astype(np.int64)
+    mapping = np.array([categories.index(value) if value in categories else -1
+                        for value in values.cat.categories] + [-1], dtype=np.int64)
+    return mapping[values.cat.codes.to_numpy()]
+
+
+def _value_violations(values, bucket, value_rules, categories):
+    """Rows whose value (see `_value_array`) the rule of their age bucket could not have drawn."""
+    if categories is None:
+        lows = np.array([rule['range'][0] for rule in value_rules])
+        highs = np.array([rule['range'][1] for rule in value_rules])
+        # Compare in the values' own integer type when the bounds fit, which halves the work for int8 scores
+        if values.dtype.kind in 'iu':
+            info = np.iinfo(values.dtype)
+            if info.min <= lows.min() and highs.max() <= info.max:
+                lows, highs = lows.astype(values.dtype), highs.astype(values.dtype)
+        return ~((values >= lows[bucket]) & (values <= highs[bucket]))
+
+    allowed = np.array([[rule['weights'].get(value, 0) > 0 for value in categories] for rule in value_rules])
+    return (values < 0) | ~allowed[bucket, np.maximum(values, 0)]
+
+
+def _dept_bits(dept_ids, n_depts):
+    """One bit per department, in the smallest unsigned type holding `n_depts` bits."""
+    dtype = next(dtype for dtype in (np.uint8, np.uint16, np.uint32, np.uint64) if np.iinfo(dtype).bits >= n_depts)
+    return np.left_shift(dtype(1), dept_ids.astype(dtype)), dtype
+
+
+def _user_groups(users, n_depts, value_rules):
+    """
+    Per-user arrays the link checks gather by user position, each with a trailing
+    sentinel for user ids that are not in the user table: department bit, age bucket
+    (len(rules) when created outside the assignment window) and dept x bucket group
+    (-1 for unknown departments).
+    """
+    dept_ids = users['dept_ids']
+    n_slots = len(value_rules) + 1
+    valid = (dept_ids >= 0) & (dept_ids < n_depts)
+    bits, _ = _dept_bits(np.where(valid, dept_ids, 0), n_depts)
+    bits[~valid] = 0
+
+    buckets = np.full(len(dept_ids), len(value_rules), dtype=np.int8)
+    in_window = users['ages'] >= 0
+    buckets[in_window] = bucket_index(users['ages'][in_window], value_rules)
+    groups = np.where(valid, dept_ids * n_slots + buckets, -1)
+    return (np.append(bits, bits.dtype.type(0)), np.append(buckets, np.int8(len(value_rules))),
+            np.append(groups, -1).astype(np.int32))
+
+
+def _stats_entry(users, assignments, values, value_col, categories):
+    entry = {'users': int(users), 'assignments': int(assignments),
+             'items_per_user': round(assignments / users, 4) if users else None}
+    if categories is None:
+        entry[f'mean_{value_col}'] = round(values / assignments, 4) if assignments else None
+    else:
+        total = values.sum()
+        entry[value_col] = {category: round(int(n) / total, 4) if total else None
+                            for category, n in zip(categories, values)}
+    return entry
+
+
+def _check_link_table(links, spec, users, item_index, item_depts, dept_item_counts, chunk_rows):
+    """Violations and per-department / per-age-bucket statistics of one link table."""
+    item_col, value_col, value_rules = spec['item_col'], spec['value_col'], spec['value_rules']
+    categories = _rule_categories(value_rules)
+    n_depts, n_buckets = len(dept_item_counts), len(value_rules)
+    n_users = len(users['dept_ids'])
+    user_bits, user_buckets, user_groups = _user_groups(users, n_depts, value_rules)
+
+    # Value sums (or per-value counts) of every dept x age bucket, the last bucket holding
+    # users created outside the window; assignment counts come from the per-user counts
+    n_groups = n_depts * (n_buckets + 1)
+    value_totals = np.zeros(n_groups) if categories is None else np.zeros(n_groups * len(categories), dtype=np.int64)
+    user_items = np.zeros(n_users + 1, dtype=np.int64)
+    counts = dict.fromkeys(['user', 'item', 'department', 'window', 'value'], 0)
+
+    for start in range(0, len(links), chunk_rows):
+        chunk = links.iloc[start:start + chunk_rows]
+        user_pos = users['index'].lookup(chunk['user_id'].to_numpy(), missing=n_users)
+        item_pos = item_index.lookup(chunk[item_col].to_numpy(), missing=item_index.size)
+        values = _value_array(chunk[value_col], categories)
+        known_user = user_pos < n_users
+        known_item = item_pos < item_index.size
+        bucket = user_buckets[user_pos]
+        in_window = bucket < n_buckets
+        in_dept = (item_depts[item_pos] & user_bits[user_pos]) != 0
+
+        counts['user'] += int((~known_user).sum())
+        counts['item'] += int((~known_item).sum())
+        counts['department'] += int((known_user & known_item & ~in_dept).sum())
+        counts['window'] += int((known_user & ~in_window).sum())
+        counts['value'] += int((in_window & _value_violations(values, np.minimum(bucket, n_buckets - 1),
+                                                              value_rules, categories)).sum())
+
+        groups = user_groups[user_pos]
+        grouped = groups >= 0
+        if not grouped.all():
+            groups, values = groups[grouped], values[grouped]
+        if categories is None:
+            value_totals += np.bincount(groups, weights=values, minlength=n_groups)
+        else:
+            known = values >= 0
+            value_totals += np.bincount(groups[known] * len(categories) + values[known], minlength=len(value_totals))
+        user_items += np.bincount(user_pos, minlength=n_users + 1)
+
+    name = spec['name']
+    violations = {
+        f"{name}.id duplicated": _duplicates(links['id'].to_numpy()),
+        f"{name}.user_id not in User": counts['user'],
+        f"{name}.{item_col} not in {spec['items']}": counts['item'],
+        f"{name}.{item_col} not in the user's department": counts['department'],
+        f"{name} user created outside the assignment window": counts['window'],
+        f"{name}.{value_col} not drawable in its age bucket": counts['value'],
+    }
+
+    # Users and the share of their department's items they hold (what the count rules
+    # draw), per dept x bucket
+    user_items = user_items[:n_users]
+    user_groups = user_groups[:n_users]
+    grouped = user_groups >= 0
+    available = dept_item_counts[user_groups[grouped] // (n_buckets + 1)]
+    shares = np.divide(user_items[grouped], available, out=np.zeros(len(available)), where=available > 0)
+    users_per_group = np.bincount(user_groups[grouped], minlength=n_groups).reshape(n_depts, n_buckets + 1)
+    share_sums = np.bincount(user_groups[grouped], weights=shares, minlength=n_groups).reshape(n_depts, n_buckets + 1)
+    assignments = np.bincount(user_groups[grouped], weights=user_items[grouped],
+                              minlength=n_groups).astype(np.int64).reshape(n_depts, n_buckets + 1)
+    value_totals = value_totals.reshape(n_depts, n_buckets + 1, *([] if categories is None else [len(categories)]))
+
+    by_department = {}
+    for dept in range(n_depts):
+        if users_per_group[dept].sum() or assignments[dept].sum():
+            by_department[str(dept)] = _stats_entry(users_per_group[dept].sum(), assignments[dept].sum(),
+                                                    value_totals[dept].sum(axis=0), value_col, categories)
+    by_age_bucket = {}
+    for bucket, label in enumerate(_bucket_labels(value_rules)):
+        users_in_bucket = users_per_group[:, bucket].sum()
+        entry = _stats_entry(users_in_bucket, assignments[:, bucket].sum(), value_totals[:, bucket].sum(axis=0),
+                             value_col, categories)
+        entry['mean_share_of_department_items'] = (round(share_sums[:, bucket].sum() / users_in_bucket, 4)
+                                                   if users_in_bucket else None)
+        by_age_bucket[label] = entry
+
+    return violations, {'by_department': by_department, 'by_age_bucket': by_age_bucket}
+
+
+def _department_links(df, item_col, item_index, n_depts):
+    """
+    Violations of a dept <-> item table, the departments of every item as a bit mask (by
+    item position, with a trailing 0 for unknown items) and the item count of every
+    department.
+    """
+    items = df[item_col].to_numpy()
+    depts = df['dept_id']
+    listed = depts.notna().to_numpy()
+    dept_ids = depts.to_numpy(dtype=np.float64, na_value=np.nan)
+    valid_dept = listed & np.isin(dept_ids, ITEM_DEPARTMENTS)
+    dept_ids = dept_ids[valid_dept].astype(np.int64)
+
+    item_pos = item_index.lookup(items[valid_dept], missing=item_index.size)
+    bits, dtype = _dept_bits(dept_ids, n_depts)
+    item_depts = np.zeros(item_index.size + 1, dtype=dtype)
+    np.bitwise_or.at(item_depts, item_pos, bits)
+    item_depts[-1] = 0
+
+    violations = {
+        'item': int((~item_index.contains(items)).sum()),
+        'department': int((listed & ~valid_dept).sum()),
+    }
+    return violations, item_depts, np.bincount(dept_ids, minlength=n_depts)[:n_depts]
+
+
+def validate_dataset(tables, chunk_rows=CHECK_CHUNK_ROWS):
+    """
+    Check that the generated tables are consistent with each other and with the rules
+    they were drawn with, and collect the distribution statistics of the assignments.
+
+    Checks: unique ids and emails; every foreign key (user, course, skill, course creator) exists;
+    department ids are known departments; every assigned item belongs to the user's
+    department; users with assignments were created in the assignment window; every
+    score / competency is one its age bucket's rule can draw. Keys are resolved for
+    whole columns through `KeyIndex`, and per-user and per-item attributes (department,
+    age bucket) are gathered by position, so link tables are checked without any
+    per-row lookup or join, `chunk_rows` rows at a time.
+
+    Args:
+        tables (dict): Table name (e.g. 'User') -> DataFrame or path to its file, for every
+            table in CHECKED_COLUMNS. Files are read with only the checked columns.
+        chunk_rows (int): Link-table rows checked at once.
+
+    Returns:
+        dict: 'passed', 'rows' per table, 'violations' (check -> violating rows, every
+        check listed), per link table 'distributions' by department and by age bucket,
+        and 'seconds'.
+    """
+    started = time.perf_counter()
+    frames = {name: tables[name] if isinstance(tables[name], pd.DataFrame) else read_table(tables[name], usecols=columns)
+              for name, columns in CHECKED_COLUMNS.items()}
+
+    with section('validation'):
+        users = frames['User']
+        user_ids = _column(users, 'user_id')
+        user_index = KeyIndex(user_ids)
+        ages = np.full(len(users), -1, dtype=np.int64)
+        in_window = prepare_user_ages(users)
+        ages[user_index.lookup(in_window['user_id'].to_numpy())] = _column(in_window, 'account_age_days')
+        user_lookup = {'index': user_index, 'dept_ids': _column(users, 'dept_id'), 'ages': ages}
+        admins = KeyIndex(user_ids[(users['account_type'] == 'admin').to_numpy()])
+        n_depts = max(USER_DEPARTMENTS) + 1
+
+        courses = frames['Course']
+        course_ids = _column(courses, 'course_id')
+        skill_ids = _column(frames['Skill'], 'skill_id')
+        item_indexes = {'Course': KeyIndex(course_ids), 'Skill': KeyIndex(skill_ids)}
+        # Department table -> (violations, departments of every item, items of every department)
+        department_links = {spec['departments']: _department_links(frames[spec['departments']], spec['item_col'],
+                                                                   item_indexes[spec['items']], n_depts)
+                            for spec in LINK_TABLES.values()}
+
+        violations = {
+            'User.user_id duplicated': _duplicates(user_ids),
+            'User.email duplicated': int(users['email'].duplicated().sum()),
+            'User.dept_id not a department': int((~np.isin(user_lookup['dept_ids'], USER_DEPARTMENTS)).sum()),
+            'Course.course_id duplicated': _duplicates(course_ids),
+            'Course.course_creator not an admin': int((~admins.contains(courses['course_creator'].to_numpy())).sum()),
+            'Course without a department': int((department_links['CourseDepartment'][1][:-1] == 0).sum()),
+            'Skill.skill_id duplicated': _duplicates(skill_ids),
+            'SkillDepartment.id duplicated': _duplicates(frames['SkillDepartment']['id'].to_numpy()),
+        }
+        for spec in LINK_TABLES.values():
+            link_violations = department_links[spec['departments']][0]
+            violations[f"{spec['departments']}.{spec['item_col']} not in {spec['items']}"] = link_violations['item']
+            violations[f"{spec['departments']}.dept_id not a department"] = link_violations['department']
+
+        distributions = {}
+        for name, spec in LINK_TABLES.items():
+            _, item_depts, dept_item_counts = department_links[spec['departments']]
+            link_violations, distributions[name] = _check_link_table(
+                frames[name], {**spec, 'name': name}, user_lookup, item_indexes[spec['items']], item_depts,
+                dept_item_counts, chunk_rows)
+            violations.update(link_violations)
+
+    return {
+        'passed': not any(violations.values()),
+        'rows': {name: len(df) for name, df in frames.items()},
+        'violations': violations,
+        'distributions': distributions,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def failed_checks(report):
+    """Checks of a `validate_dataset` report that found violations, as 'check: rows' lines."""
+    return [f"{check}: {rows:,} rows" for check, rows in report['violations'].items() if rows]
+
+
+def write_validation_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
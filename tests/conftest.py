@@ -0,0 +1,106 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules under src/ import each other by their plain names, as main.py runs them;
+# benchmarks/ has the fake catalog generator
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+sys.path.insert(1, os.path.join(ROOT_DIR, 'benchmarks'))
+
+from validation import ITEM_DEPARTMENTS  # noqa: E402
+
+# Small enough that a whole sharded run takes a few seconds
+NO_OF_USERS = 600
+SHARD_SIZE = 200
+BCRYPT_ROUNDS = 4
+SEED = 11
+
+
+def _department_links(item_col, n_items):
+    """Every item in one department, and every third item in a second one."""
+    item_ids = np.arange(1, n_items + 1)
+    depts = np.array(ITEM_DEPARTMENTS)
+    extra = item_ids[::3]
+    links = pd.DataFrame({
+        item_col: np.r_[item_ids, extra],
+        'dept_id': np.r_[depts[item_ids % len(depts)], depts[(extra + 5) % len(depts)]],
+    })
+    return links.sort_values([item_col, 'dept_id'], ignore_index=True)
+
+
+def extracted_catalog(n_courses, seed=0):
+    """A fake catalog with the columns of extracted_courses.csv."""
+    from fake_coursera import make_fake_coursera
+
+    df = make_fake_coursera(n_courses, seed=seed).rename(columns={
+        'Course Name': 'course_name', 'Course URL': 'course_url', 'Course Description': 'course_desc', 'Skills': 'skills',
+    })[['course_name', 'course_url', 'course_desc', 'skills']]
+    df.insert(0, 'course_id', np.arange(1, len(df) + 1, dtype=np.int32))
+    return df
+
+
+@pytest.fixture(scope='session')
+def skill_departments():
+    df = _department_links('skill_id', 80)
+    df.insert(0, 'id', np.arange(1, len(df) + 1))
+    return df
+
+
+@pytest.fixture(scope='session')
+def course_departments():
+    return _department_links('course_id', 50)
+
+
+def output_paths(directory):
+    """Output file of every table generated by `sharded_generation.generate_sharded`."""
+    return {
+        'users': os.path.join(directory, 'User.csv'),
+        'user_passwords': os.path.join(directory, 'user_data_plain.csv'),
+        'skill_users': os.path.join(directory, 'SkillUsers.csv'),
+        'course_users': os.path.join(directory, 'CourseUser.csv'),
+    }
+
+
+def generate(directory, skill_departments, course_departments, workers=1):
+    from sharded_generation import generate_sharded
+
+    paths = output_paths(str(directory))
+    generate_sharded(NO_OF_USERS, skill_departments, course_departments, paths, os.path.join(str(directory), 'shards'),
+                     shard_size=SHARD_SIZE, workers=workers, seed=SEED, bcrypt_rounds=BCRYPT_ROUNDS)
+    return paths
+
+
+@pytest.fixture(scope='session')
+def sharded_run(tmp_path_factory, skill_departments, course_departments):
+    """Output files of one uninterrupted sharded run."""
+    return generate(tmp_path_factory.mktemp('sharded'), skill_departments, course_departments)
+
+
+@pytest.fixture
+def dataset(sharded_run, skill_departments, course_departments):
+    """A consistent dataset: the sharded run's tables with matching course and skill tables."""
+    from table_io import read_table
+    from user_data_generate import admin_users
+
+    course_ids = np.unique(course_departments['course_id'])
+    skill_ids = np.unique(skill_departments['skill_id'])
+    admins = admin_users(NO_OF_USERS)['user_id'].to_numpy()
+    return {
+        'User': read_table(sharded_run['users']),
+        'Course': pd.DataFrame({
+            'course_id': course_ids,
+            'course_name': [f'Course {course}' for course in course_ids],
+            'course_desc': 'A course',
+            'course_img': 'course.png',
+            'course_creator': admins[course_ids % len(admins)],
+        }),
+        'CourseDepartment': course_departments.copy(),
+        'Skill': pd.DataFrame({'skill_id': skill_ids, 'skill_name': [f'skill {skill}' for skill in skill_ids]}),
+        'SkillDepartment': skill_departments.copy(),
+        'SkillUsers': read_table(sharded_run['skill_users']),
+        'CourseUser': read_table(sharded_run['course_users']),
+    }
@@ -0,0 +1,155 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from append_mode import APPEND_TABLES, append_users
+from pipeline import MANIFEST_NAME, Stage, TableStore, refresh_manifest, run_pipeline
+from table_io import append_table, read_last_row, read_table, write_table
+from user_data_generate import END_DATE
+from validation import failed_checks, validate_dataset
+
+from conftest import BCRYPT_ROUNDS, NO_OF_USERS
+
+NEW_USERS = 60
+# Pipeline table name -> table name in the `dataset` fixture
+DATASET_TABLES = {
+    'users': 'User',
+    'courses': 'Course',
+    'course_departments': 'CourseDepartment',
+    'skills': 'Skill',
+    'skill_departments': 'SkillDepartment',
+    'skill_users': 'SkillUsers',
+    'course_users': 'CourseUser',
+}
+
+
+def _write_dataset(directory, dataset, sharded_run, output_format='csv'):
+    """The `dataset` tables and the sharded run's passwords as files of `output_format`."""
+    paths = {name: os.path.join(str(directory), f'{table}.{output_format}') for name, table in DATASET_TABLES.items()}
+    paths['user_passwords'] = os.path.join(str(directory), f'user_data_plain.{output_format}')
+    for name, table in DATASET_TABLES.items():
+        write_table(dataset[table], paths[name])
+    write_table(read_table(sharded_run['user_passwords']), paths['user_passwords'])
+    return paths
+
+
+def _read_dataset(paths):
+    return {table: read_table(paths[name]) for name, table in DATASET_TABLES.items()}
+
+
+def _append(paths, seed=7):
+    return append_users({name: paths[name] for name in APPEND_TABLES}, NEW_USERS, rng=np.random.default_rng(seed),
+                        bcrypt_rounds=BCRYPT_ROUNDS, hash_workers=1)
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet'])
+def test_appended_users_continue_the_tables(tmp_path, dataset, sharded_run, output_format):
+    paths = _write_dataset(tmp_path, dataset, sharded_run, output_format)
+    _append(paths)
+    grown = _read_dataset(paths)
+
+    assert failed_checks(validate_dataset(grown)) == []
+    users = grown['User']
+    assert users['user_id'].tolist() == list(range(1, NO_OF_USERS + NEW_USERS + 1))
+    assert read_table(paths['user_passwords'])['user_id'].tolist() == users['user_id'].tolist()
+    for table in ('SkillUsers', 'CourseUser'):
+        assert grown[table]['id'].tolist() == list(range(1, len(grown[table]) + 1))
+        pd.testing.assert_frame_equal(grown[table].head(len(dataset[table])), dataset[table], check_dtype=False)
+
+    new_users = set(users['user_id'].tail(NEW_USERS))
+    assert new_users <= set(grown['SkillUsers']['user_id'])
+    assert new_users & set(grown['CourseUser']['user_id'])
+
+
+def test_users_appended_after_the_end_date_still_get_assignments(tmp_path, dataset, sharded_run):
+    dataset['User'].loc[dataset['User'].index[-1], 'createdAt'] = pd.Timestamp(END_DATE) + pd.Timedelta(days=5)
+    paths = _write_dataset(tmp_path, dataset, sharded_run)
+    _append(paths)
+    grown = _read_dataset(paths)
+
+    new_users = grown['User'].tail(NEW_USERS)
+    assert pd.to_datetime(new_users['createdAt']).max() <= END_DATE
+    assert set(new_users['user_id']) <= set(grown['SkillUsers']['user_id'])
+    assert set(new_users['user_id']) & set(grown['CourseUser']['user_id'])
+
+
+def _email_suffixes(emails):
+    """Email address without its numeric suffix -> suffix (1 when there is none)."""
+    parts = emails.str.extract(r'^(?P<name>[^$@]*?)(?P<suffix>\d*)(?P<domain>(?:\$admin)?@.*)$')
+    keys = parts['name'] + parts['domain']
+    return dict(zip(keys, parts['suffix'].replace('', '1').astype(int)))
+
+
+def test_appended_email_suffixes_continue(tmp_path, dataset, sharded_run):
+    paths = _write_dataset(tmp_path, dataset, sharded_run)
+    _append(paths)
+    first = read_table(paths['users'])['email'].tail(NEW_USERS)
+    # The same seed draws the same names again, so nearly every address is taken (admins
+    # are chosen by user_id, so a few addresses change domain)
+    _append(paths)
+    users = read_table(paths['users'])
+    second = users['email'].tail(NEW_USERS)
+
+    assert users['email'].is_unique
+    first_suffixes, second_suffixes = _email_suffixes(first), _email_suffixes(second)
+    taken = first_suffixes.keys() & second_suffixes.keys()
+    assert len(taken) > NEW_USERS * 0.9
+    assert all(second_suffixes[key] > first_suffixes[key] for key in taken)
+
+
+def test_refreshed_manifest_only_reruns_the_listed_stages(tmp_path, dataset, sharded_run):
+    paths = _write_dataset(tmp_path, dataset, sharded_run)
+    paths['user_count'] = os.path.join(str(tmp_path), 'user_count.csv')
+    paths['validation'] = os.path.join(str(tmp_path), 'validation.csv')
+    tables = {name: (path, read_table) for name, path in paths.items()}
+    manifest_path = os.path.join(str(tmp_path), MANIFEST_NAME)
+
+    def count_users(store):
+        store.put('user_count', pd.DataFrame({'users': [len(store.get('users'))]}))
+
+    def validate(store):
+        store.put('validation', pd.DataFrame({'users': [len(store.get('users'))]}))
+
+    stages = [
+        Stage('count_users', count_users, inputs=['users'], outputs=['user_count']),
+        Stage('validate', validate, inputs=['users', 'skill_users', 'course_users'], outputs=['validation']),
+    ]
+    assert run_pipeline(stages, TableStore(tables), manifest_path) == ['count_users', 'validate']
+
+    _append(paths)
+    refresh_manifest(manifest_path, [paths[name] for name in APPEND_TABLES], rerun=['validate'])
+
+    assert run_pipeline(stages, TableStore(tables), manifest_path) == ['validate']
+    assert read_table(paths['validation'])['users'].tolist() == [NO_OF_USERS + NEW_USERS]
+    # Appended without refreshing the manifest, the users are new to both stages
+    _append(paths, seed=8)
+    assert run_pipeline(stages, TableStore(tables), manifest_path) == ['count_users', 'validate']
+
+
+def test_appending_no_rows_keeps_the_last_row(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'table.parquet')
+    write_table(pd.DataFrame({'id': [1, 2]}), path)
+
+    append_table(pd.DataFrame({'id': pd.Series([], dtype='int64')}), path)
+    append_table(pd.DataFrame({'id': [3]}), path)
+    append_table(pd.DataFrame({'id': pd.Series([], dtype='int64')}), path)
+
+    assert read_table(path)['id'].tolist() == [1, 2, 3]
+    assert read_last_row(path)['id'].tolist() == [3]
+
+
+def test_last_row_skips_empty_row_groups(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    path = str(tmp_path / 'table.parquet')
+    schema = pa.schema([('id', pa.int64())])
+    with pq.ParquetWriter(path, schema) as writer:
+        writer.write_table(pa.table({'id': [1, 2]}, schema=schema))
+        writer.write_table(pa.table({'id': []}, schema=schema))
+
+    assert pq.ParquetFile(path).metadata.row_group(1).num_rows == 0
+    assert read_last_row(path)['id'].tolist() == [2]
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from assignment_engine import assign_items_parallel, build_dept_csr, iter_assignments, prepare_user_ages
+from courseUsers_data_generation import generate_course_users, iter_course_users
+from skillUsers_data_generation import COMPETENCY_RULES, SKILL_COUNT_RULES, generate_skillUsers, iter_skillUsers
+from table_io import ChunkedTableWriter, read_table, write_table
+from user_data_generate import build_users_batch
+
+BLOCK_USERS = 64
+
+
+@pytest.fixture(scope='module')
+def users():
+    return build_users_batch(500, rng=np.random.default_rng(3))
+
+
+@pytest.fixture(scope='module')
+def user_ages(users):
+    return prepare_user_ages(users)
+
+
+def _assign(user_ages, skill_departments, **kwargs):
+    return assign_items_parallel(user_ages, build_dept_csr(skill_departments, 'skill_id'), 'skill_id',
+                                 SKILL_COUNT_RULES, 'competency', COMPETENCY_RULES, rng=np.random.default_rng(5),
+                                 block_users=BLOCK_USERS, **kwargs)
+
+
+def test_parallel_assignment_matches_serial(user_ages, skill_departments):
+    serial = _assign(user_ages, skill_departments, workers=1)
+    parallel = _assign(user_ages, skill_departments, workers=2)
+
+    assert len(serial) > len(user_ages)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_streamed_blocks_match_the_whole_table(user_ages, skill_departments):
+    blocks = list(iter_assignments(user_ages, build_dept_csr(skill_departments, 'skill_id'), 'skill_id',
+                                   SKILL_COUNT_RULES, 'competency', COMPETENCY_RULES, rng=np.random.default_rng(5),
+                                   workers=2, block_users=BLOCK_USERS))
+
+    assert len(blocks) == -(-len(user_ages) // BLOCK_USERS)
+    pd.testing.assert_frame_equal(pd.concat(blocks, ignore_index=True),
+                                  _assign(user_ages, skill_departments, workers=1))
+
+
+@pytest.mark.parametrize('generate, stream, links', [
+    (generate_skillUsers, iter_skillUsers, 'skill_departments'),
+    (generate_course_users, iter_course_users, 'course_departments'),
+])
+def test_streamed_table_matches_in_memory_table(tmp_path, request, users, generate, stream, links):
+    links = request.getfixturevalue(links)
+    in_memory, streamed = str(tmp_path / 'in_memory.csv.gz'), str(tmp_path / 'streamed.csv.gz')
+
+    write_table(generate(users, links, rng=np.random.default_rng(5), workers=2), in_memory)
+    # As main.py streams them with --stream-assignments
+    with ChunkedTableWriter(streamed, background=True) as writer:
+        for batch in stream(users, links, rng=np.random.default_rng(5), workers=2):
+            writer.write(batch)
+
+    pd.testing.assert_frame_equal(read_table(streamed), read_table(in_memory))
@@ -0,0 +1,60 @@
+import sqlite3
+
+from classification_cache import ClassificationCache
+from course_data_preparation import course_preperation
+
+from conftest import extracted_catalog
+
+
+def _assignments(keys):
+    return {key: [int(key[1:]) % 14 + 2] for key in keys}
+
+
+def test_lookup_counts_hits_and_misses(tmp_path):
+    cache = ClassificationCache(str(tmp_path / 'cache.sqlite'))
+    cache.store(_assignments(['k1', 'k2']))
+
+    assert cache.lookup(['k1', 'k2', 'k3', 'k1']) == _assignments(['k1', 'k2'])
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ClassificationCache(path, max_entries=3)
+    cache.store(_assignments(['k1', 'k2', 'k3']))
+    cache.lookup(['k1'])
+    cache.store(_assignments(['k4', 'k5']))
+
+    assert cache.evictions == 2
+    assert set(cache.lookup(['k1', 'k2', 'k3', 'k4', 'k5'])) == {'k1', 'k4', 'k5'}
+    # Storing keys that are cached already adds no rows
+    cache.store(_assignments(['k4', 'k5']))
+    assert cache.evictions == 2
+    cache.close()
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT COUNT(*) FROM classification').fetchone()[0] == 3
+    reopened = ClassificationCache(path, max_entries=3)
+    assert reopened.rows == 3
+    reopened.store(_assignments(['k6']))
+    assert reopened.evictions == 1
+
+
+def _classify(cache=None):
+    df = extracted_catalog(120, seed=2)
+    course_preperation(df, cache=cache)
+    return df['assigned_departments'].tolist()
+
+
+def test_cached_classification_is_reused_across_runs(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    uncached = _classify()
+
+    first = ClassificationCache(path)
+    assert _classify(first) == uncached
+    assert first.hits == 0
+    first.close()
+
+    second = ClassificationCache(path)
+    assert _classify(second) == uncached
+    assert (second.hits, second.misses) == (120, 0)
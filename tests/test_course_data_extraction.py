@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from course_data_extraction import course_extraction, iter_course_chunks, stream_course_extraction
+from table_io import ChunkedTableWriter, read_table, read_table_chunks
+
+from conftest import extracted_catalog
+
+
+@pytest.fixture(scope='module')
+def coursera_csv(tmp_path_factory):
+    from fake_coursera import make_fake_coursera
+
+    path = str(tmp_path_factory.mktemp('coursera') / 'Coursera.csv')
+    make_fake_coursera(95, seed=2).to_csv(path, index=False)
+    return path
+
+
+def test_chunks_equal_the_whole_extraction(coursera_csv):
+    whole = course_extraction(coursera_csv)
+    chunks = list(iter_course_chunks(coursera_csv, chunksize=10))
+
+    assert len(chunks) == 10
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole, check_dtype=False)
+
+
+@pytest.mark.parametrize('file_name', ['extracted_courses.csv', 'extracted_courses.parquet'])
+def test_streamed_extraction_writes_what_it_yields(tmp_path, coursera_csv, file_name):
+    output_path = str(tmp_path / file_name)
+
+    yielded = pd.concat(stream_course_extraction(coursera_csv, output_path, chunksize=16), ignore_index=True)
+
+    pd.testing.assert_frame_equal(read_table(output_path), yielded, check_dtype=False)
+
+
+@pytest.mark.parametrize('file_name', ['courses.csv', 'courses.csv.gz', 'courses.csv.zst', 'courses.parquet'])
+def test_chunked_round_trip(tmp_path, file_name):
+    df = extracted_catalog(60, seed=3)
+    path = str(tmp_path / file_name)
+
+    with ChunkedTableWriter(path) as writer:
+        for start in range(0, len(df), 25):
+            writer.write(df.iloc[start:start + 25])
+
+    assert writer.rows == len(df)
+    pd.testing.assert_frame_equal(pd.concat(read_table_chunks(path, 13), ignore_index=True), df, check_dtype=False)
+    pd.testing.assert_frame_equal(read_table(path), df, check_dtype=False)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from course_data_generation import SYNTHETIC_NAME_SEPARATOR, course_generation
+
+ADMIN_IDS = [1, 2, 3]
+
+
+def _classified_courses():
+    """Four catalog courses, one without a name and one without a department."""
+    return pd.DataFrame({
+        'course_id': [1, 2, 3, 4],
+        'course_name': ['Statistics', None, 'Painting', 'Welding'],
+        'course_desc': ['About numbers', 'About nothing', 'About colours', 'About metal'],
+        'skills': ['', '', '', ''],
+        'assigned_departments': ['[2, 5]', '[3]', '[]', '[7]'],
+    })
+
+
+def _users():
+    return pd.DataFrame({'user_id': [1, 2, 3, 4, 5], 'account_type': ['admin'] * 3 + ['employee'] * 2})
+
+
+def _generate(synthetic_courses, first_course_id=1):
+    return course_generation(_classified_courses(), _users(), rng=np.random.default_rng(2),
+                             first_course_id=first_course_id, synthetic_courses=synthetic_courses)
+
+
+def test_synthetic_courses_follow_the_catalog():
+    catalog, catalog_depts = _generate(0, first_course_id=10)
+    courses, course_depts = _generate(200, first_course_id=10)
+
+    # Courses without a department are dropped; the catalog courses keep their order and departments
+    assert courses['course_id'].tolist() == list(range(10, 10 + 3 + 200))
+    pd.testing.assert_frame_equal(courses[['course_id', 'course_name', 'course_desc']].iloc[:3],
+                                  catalog[['course_id', 'course_name', 'course_desc']])
+    pd.testing.assert_frame_equal(course_depts.iloc[:len(catalog_depts)], catalog_depts)
+    assert set(courses['course_creator']) <= set(ADMIN_IDS)
+
+    synthetic = courses.iloc[3:]
+    depts = course_depts.groupby('course_id')['dept_id'].apply(tuple)
+    catalog_by_name = {'Statistics': (2, 5), '': (3,), 'Welding': (7,)}
+    first_names = synthetic['course_name'].str.split(SYNTHETIC_NAME_SEPARATOR, regex=False).str[0]
+    assert [depts[course] for course in synthetic['course_id']] == [catalog_by_name[name] for name in first_names]
+
+
+def test_synthetic_names_from_a_course_without_name():
+    courses, _ = _generate(200)
+    names = courses['course_name'].iloc[3:]
+
+    assert courses['course_name'].iloc[1] == ''
+    # A missing name becomes an empty half of the synthesized name instead of 'nan'
+    assert not names.str.contains('nan').any()
+    assert names.str.startswith(SYNTHETIC_NAME_SEPARATOR).any()
+    assert names.str.endswith(SYNTHETIC_NAME_SEPARATOR).any()
+    assert set(names.str.split(SYNTHETIC_NAME_SEPARATOR, regex=False).explode()) == {'Statistics', '', 'Welding'}
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from course_data_preparation import (_classify_hashing, classification_agreement, classification_diff,
+                                     classify_course_chunks, course_preperation, score_departments)
+
+from conftest import extracted_catalog
+
+
+def _catalog_with_edge_cases():
+    """A fake catalog plus courses without any token the vectorizers keep, or without skills."""
+    df = extracted_catalog(150, seed=4)
+    edge_cases = pd.DataFrame({
+        'course_id': [151, 152, 153],
+        'course_name': ['A', 'Data science', 'C'],
+        'course_url': ['', '', ''],
+        'course_desc': ['b', 'statistics and analytics', '?'],
+        'skills': ['x', np.nan, ''],
+    })
+    return pd.concat([df, edge_cases], ignore_index=True)
+
+
+def test_loop_and_matrix_classifiers_agree():
+    df = _catalog_with_edge_cases()
+
+    diff = classification_diff(df, methods=('loop', 'matrix'))
+
+    assert diff.empty
+
+
+def test_courses_without_tokens_get_no_department():
+    df = _catalog_with_edge_cases()
+
+    for method in ('loop', 'matrix', 'hashing'):
+        course_preperation(df, method=method)
+        assigned = df.set_index('course_id')['assigned_departments']
+        assert assigned[151] == [] and assigned[153] == []
+        assert 6 in assigned[152]
+
+
+def test_empty_frame_has_no_scores():
+    assert score_departments(pd.Series([], dtype=object)).shape == (0, 14)
+
+
+def test_hashing_classifier_agrees_with_matrix():
+    df = extracted_catalog(300, seed=5)
+
+    agreement = classification_agreement(df, method='hashing', reference='matrix')
+
+    assert agreement['agreement'] == 1.0
+    assert set(agreement['count_delta'].values()) == {0}
+
+
+def test_hashing_classifier_does_not_depend_on_chunks():
+    df = _catalog_with_edge_cases()
+    whole = df.copy()
+    course_preperation(whole, method='hashing')
+
+    chunks = [df.iloc[start:start + 40] for start in range(0, len(df), 40)]
+    chunked = pd.concat(classify_course_chunks(chunks, method='hashing'), ignore_index=True)
+
+    assert chunked['assigned_departments'].tolist() == whole['assigned_departments'].tolist()
+    assert _classify_hashing(df, 0.09, chunk_rows=7) == whole['assigned_departments'].tolist()
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+
+import pytest
+
+from db_loader import TABLE_DEFINITIONS, SQLiteAdapter, load_database, load_sqlite_database
+from table_io import write_table
+
+
+def _query(db_path, sql):
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+
+
+def test_loads_every_row_with_indexes(tmp_path, dataset):
+    db_path = str(tmp_path / 'webapp.db')
+
+    stats = load_sqlite_database(dataset, db_path)
+
+    assert {entry['name']: entry['rows'] for entry in stats} == {name: len(df) for name, df in dataset.items()}
+    for name, df in dataset.items():
+        assert _query(db_path, f'SELECT COUNT(*) FROM "{name}"') == [(len(df),)]
+    indexes = {name for (name,) in _query(db_path, "SELECT name FROM sqlite_master WHERE type = 'index'")
+               if name.startswith('idx_')}
+    assert len(indexes) == sum(len(definition['indexes']) for definition in TABLE_DEFINITIONS)
+
+
+def test_files_are_loaded_in_chunks_like_frames(tmp_path, dataset):
+    paths = {}
+    for name, df in dataset.items():
+        paths[name] = str(tmp_path / f'{name}.csv')
+        write_table(df, paths[name])
+
+    from_frames, from_files = str(tmp_path / 'frames.db'), str(tmp_path / 'files.db')
+    load_sqlite_database(dataset, from_frames)
+    adapter = SQLiteAdapter(from_files, batch_rows=7)
+    try:
+        load_database(paths, adapter, chunk_rows=100)
+    finally:
+        adapter.close()
+
+    for name in dataset:
+        query = f'SELECT * FROM "{name}" ORDER BY rowid'
+        assert _query(from_files, query) == _query(from_frames, query)
+
+
+def test_foreign_key_violations_fail_the_load(tmp_path, dataset):
+    dataset['SkillUsers'].loc[0, 'user_id'] = 10_000_000
+
+    with pytest.raises(ValueError, match='foreign key violations'):
+        load_sqlite_database(dataset, str(tmp_path / 'webapp.db'))
+    assert os.path.exists(tmp_path / 'webapp.db')
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from email_index import EmailIndex, email_keys
+
+
+def _users(names, admins=()):
+    first, last = zip(*names)
+    is_admin = np.isin(np.arange(len(names)), list(admins))
+    domain = np.where(is_admin, '$admin@jmangroup.com', '@jmangroup.com')
+    return pd.DataFrame({
+        'first_name': first,
+        'last_name': last,
+        'account_type': np.where(is_admin, 'admin', 'employee'),
+        'email': [f"{f.lower()}.{l.lower()}{d}" for f, l, d in zip(first, last, domain)],
+    })
+
+
+def test_duplicates_get_increasing_suffixes():
+    users = _users([('John', 'Smith'), ('Ann', 'Lee'), ('john', 'SMITH'), ('John', 'Smith')])
+
+    assert EmailIndex().add(users) == 2
+    assert users['email'].tolist() == ['john.smith@jmangroup.com', 'ann.lee@jmangroup.com',
+                                       'john.smith2@jmangroup.com', 'john.smith3@jmangroup.com']
+
+
+def test_admin_address_is_a_different_address():
+    users = _users([('John', 'Smith'), ('John', 'Smith')], admins=[1])
+
+    assert EmailIndex().add(users) == 0
+    assert users['email'].tolist() == ['john.smith@jmangroup.com', 'john.smith$admin@jmangroup.com']
+
+
+def test_suffixes_stay_unique_across_shards():
+    names = [('John', 'Smith'), ('Ann', 'Lee'), ('John', 'Smith'), ('Mary', 'Jones')]
+    shards = [_users(names), _users(names[1:] + names[:1]), _users(names[2:], admins=[1])]
+
+    # As sharded_generation does: suffixes within every shard, then the merge renumbers
+    # only the addresses an earlier shard already holds
+    merged = EmailIndex()
+    parts = []
+    for shard in shards:
+        keys = email_keys(shard)
+        EmailIndex().add(shard, keys)
+        merged.add(shard, keys, local_suffixes=True)
+        parts.append(shard)
+    emails = pd.concat(parts, ignore_index=True)['email']
+
+    expected = pd.concat([_users(names), _users(names[1:] + names[:1]), _users(names[2:], admins=[1])],
+                         ignore_index=True)
+    EmailIndex().add(expected)
+
+    assert emails.is_unique
+    assert emails.tolist() == expected['email'].tolist()
+    assert merged.collisions == 6
+
+
+def test_from_users_continues_the_numbering():
+    existing = _users([('John', 'Smith'), ('John', 'Smith')])
+    EmailIndex().add(existing)
+    added = _users([('John', 'Smith')])
+
+    assert EmailIndex.from_users(existing).add(added) == 1
+    assert added['email'].tolist() == ['john.smith3@jmangroup.com']
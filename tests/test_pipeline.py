@@ -0,0 +1,80 @@
+import os
+import shutil
+from functools import partial
+
+import pandas as pd
+
+from pipeline import MANIFEST_NAME, Stage, TableStore, run_pipeline
+from table_io import read_table, write_table
+
+
+def _tables(data_dir):
+    return {name: (os.path.join(data_dir, f'{name}.csv'), read_table) for name in ('numbers', 'scaled', 'total')}
+
+
+def _scale(tables, factor):
+    tables.put('scaled', pd.DataFrame({'value': tables.get('numbers')['value'] * factor}))
+
+
+def _sum(tables):
+    tables.put('total', pd.DataFrame({'value': [tables.get('scaled')['value'].sum()]}))
+
+
+def _stages(factor=2):
+    return [
+        Stage('scale', partial(_scale, factor=factor), inputs=['numbers'], outputs=['scaled'], params={'factor': factor}),
+        Stage('sum', _sum, inputs=['scaled'], outputs=['total']),
+    ]
+
+
+def _run(data_dir, stages=None, force=()):
+    return run_pipeline(stages or _stages(), TableStore(_tables(data_dir)), os.path.join(data_dir, MANIFEST_NAME),
+                        force=force)
+
+
+def _data_dir(tmp_path):
+    data_dir = str(tmp_path / 'data')
+    os.makedirs(data_dir)
+    write_table(pd.DataFrame({'value': [1, 2, 3]}), os.path.join(data_dir, 'numbers.csv'))
+    return data_dir
+
+
+def test_unchanged_stages_are_skipped(tmp_path):
+    data_dir = _data_dir(tmp_path)
+
+    assert _run(data_dir) == ['scale', 'sum']
+    assert _run(data_dir) == []
+    assert read_table(os.path.join(data_dir, 'total.csv'))['value'].tolist() == [12]
+
+
+def test_force_reruns_only_that_stage(tmp_path):
+    data_dir = _data_dir(tmp_path)
+    _run(data_dir)
+
+    # Same output, so the stage reading it stays up to date
+    assert _run(data_dir, force=['scale']) == ['scale']
+    assert _run(data_dir, force=['all']) == ['scale', 'sum']
+
+
+def test_changes_rerun_the_stage_and_what_reads_it(tmp_path):
+    data_dir = _data_dir(tmp_path)
+    _run(data_dir)
+
+    assert _run(data_dir, stages=_stages(factor=3)) == ['scale', 'sum']
+
+    write_table(pd.DataFrame({'value': [1, 2]}), os.path.join(data_dir, 'numbers.csv'))
+    assert _run(data_dir, stages=_stages(factor=3)) == ['scale', 'sum']
+
+    os.remove(os.path.join(data_dir, 'total.csv'))
+    assert _run(data_dir, stages=_stages(factor=3)) == ['sum']
+
+
+def test_moved_data_directory_stays_up_to_date(tmp_path):
+    data_dir = _data_dir(tmp_path)
+    _run(data_dir)
+
+    moved = str(tmp_path / 'elsewhere' / 'data')
+    shutil.copytree(data_dir, moved)
+    shutil.rmtree(data_dir)
+
+    assert _run(moved) == []
@@ -0,0 +1,61 @@
+import filecmp
+import os
+
+import pytest
+
+import sharded_generation
+from sharded_generation import SHARD_CONFIG
+from table_io import read_table
+
+from conftest import NO_OF_USERS, SHARD_SIZE, generate
+
+
+class Crash(Exception):
+    pass
+
+
+def _same_files(first, second):
+    return {name: filecmp.cmp(first[name], second[name], shallow=False) for name in first}
+
+
+def test_resumed_run_equals_uninterrupted_run(tmp_path, monkeypatch, sharded_run, skill_departments,
+                                              course_departments):
+    run_shard = sharded_generation._run_shard
+
+    def crash_on_last_shard(task, links=None):
+        if task['shard'] == NO_OF_USERS // SHARD_SIZE - 1:
+            raise Crash(task['shard'])
+        return run_shard(task, links)
+
+    monkeypatch.setattr(sharded_generation, '_run_shard', crash_on_last_shard)
+    with pytest.raises(Crash):
+        generate(tmp_path, skill_departments, course_departments)
+    assert sorted(os.listdir(tmp_path / 'shards')) == sorted([SHARD_CONFIG, 'shard-00000', 'shard-00001'])
+
+    # The rerun only generates the missing shard
+    done = []
+
+    def record_shard(task, links=None):
+        done.append(task['shard'])
+        return run_shard(task, links)
+
+    monkeypatch.setattr(sharded_generation, '_run_shard', record_shard)
+    resumed = generate(tmp_path, skill_departments, course_departments)
+
+    assert done == [NO_OF_USERS // SHARD_SIZE - 1]
+    assert not os.path.exists(tmp_path / 'shards')
+    assert _same_files(resumed, sharded_run) == dict.fromkeys(resumed, True)
+
+
+def test_output_does_not_depend_on_workers(tmp_path, sharded_run, skill_departments, course_departments):
+    parallel = generate(tmp_path, skill_departments, course_departments, workers=2)
+
+    assert _same_files(parallel, sharded_run) == dict.fromkeys(parallel, True)
+
+
+def test_emails_unique_across_shards(sharded_run):
+    users = read_table(sharded_run['users'])
+
+    assert len(users) == NO_OF_USERS
+    assert users['user_id'].tolist() == list(range(1, NO_OF_USERS + 1))
+    assert users['email'].is_unique
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from skill_data_generation import MAX_DEPT_ID, skill_tables_from_courses
+
+
+def _courses(assigned_departments):
+    return pd.DataFrame({
+        'skills': ['Python, SQL', 'python  Statistics', 'Welding', 'SQL'],
+        'assigned_departments': assigned_departments,
+    })
+
+
+def test_skills_belong_to_the_departments_of_their_courses():
+    skills, skill_depts = skill_tables_from_courses(_courses(['[2, 5]', '[3]', '[]', '[7]']))
+
+    assert skills['skill_name'].tolist() == ['Python', 'SQL', 'Statistics', 'Welding']
+    depts = skill_depts.groupby('skill_id')['dept_id'].apply(lambda ids: ids.dropna().tolist())
+    assert depts.tolist() == [[2, 3, 5], [2, 5, 7], [3], []]
+
+
+def test_highest_department_id_fits_the_masks():
+    _, skill_depts = skill_tables_from_courses(_courses(['[0]', '[]', '[]', f'[{MAX_DEPT_ID}]']))
+
+    assert skill_depts.dropna()['dept_id'].tolist() == [0, 0, MAX_DEPT_ID]
+
+
+def test_department_ids_beyond_the_masks_are_rejected():
+    with pytest.raises(ValueError, match='between 0 and 63'):
+        skill_tables_from_courses(_courses(['[2]', '[3]', '[]', '[64]']))
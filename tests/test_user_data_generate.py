@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from table_io import read_table
+from user_data_generate import END_DATE, build_users_batch
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_batch_users_are_created_by_end_date(seed):
+    created_at = build_users_batch(2_000, rng=np.random.default_rng(seed))['createdAt']
+
+    assert created_at.is_monotonic_increasing and created_at.is_unique
+    assert created_at.max() <= END_DATE
+
+
+def test_gaps_are_scaled_when_they_would_run_past_end_date():
+    created_after = pd.Timestamp(END_DATE) - pd.Timedelta(days=3)
+    created_at = build_users_batch(1_000, created_after=created_after, max_step=pd.Timedelta(days=2),
+                                   rng=np.random.default_rng(1))['createdAt']
+
+    assert created_at.min() > created_after
+    assert created_at.max() <= END_DATE
+    assert created_at.is_unique
+
+
+def test_sharded_users_are_created_by_end_date(sharded_run):
+    created_at = pd.to_datetime(read_table(sharded_run['users'])['createdAt'])
+
+    assert created_at.is_monotonic_increasing
+    assert created_at.max() <= END_DATE
@@ -0,0 +1,65 @@
+import pytest
+
+from validation import failed_checks, validate_dataset
+
+from conftest import NO_OF_USERS
+
+
+def test_generated_dataset_passes(dataset):
+    report = validate_dataset(dataset)
+
+    assert failed_checks(report) == []
+    assert report['passed']
+    assert report['rows']['User'] == NO_OF_USERS
+
+
+def _employee_rows(users, n):
+    return users.index[users['account_type'] != 'admin'][:n]
+
+
+def _inject_duplicate_email(tables):
+    users = tables['User']
+    users.loc[users.index[5], 'email'] = users.loc[users.index[4], 'email']
+
+
+def _inject_non_admin_creator(tables):
+    users = tables['User']
+    tables['Course'].loc[:2, 'course_creator'] = users.loc[_employee_rows(users, 3), 'user_id'].to_numpy()
+
+
+def _inject_unknown_skill(tables):
+    tables['SkillUsers'].loc[:3, 'skill_id'] = 10_000
+
+
+def _inject_foreign_department_course(tables):
+    course_users, users = tables['CourseUser'], tables['User']
+    dept_of_user = users.set_index('user_id')['dept_id']
+    course_depts = tables['CourseDepartment'].groupby('course_id')['dept_id'].apply(set)
+    row = course_users.index[0]
+    user_dept = dept_of_user[course_users.loc[row, 'user_id']]
+    course_users.loc[row, 'course_id'] = next(course for course, depts in course_depts.items() if user_dept not in depts)
+
+
+def _inject_undrawable_competency(tables):
+    tables['SkillUsers']['competency'] = tables['SkillUsers']['competency'].astype(object)
+    tables['SkillUsers'].loc[:1, 'competency'] = 'Grandmaster'
+
+
+def _inject_duplicate_link_id(tables):
+    tables['CourseUser'].loc[1, 'id'] = tables['CourseUser'].loc[0, 'id']
+
+
+@pytest.mark.parametrize('inject, check, rows', [
+    (_inject_duplicate_email, 'User.email duplicated', 1),
+    (_inject_non_admin_creator, 'Course.course_creator not an admin', 3),
+    (_inject_unknown_skill, 'SkillUsers.skill_id not in Skill', 4),
+    (_inject_foreign_department_course, "CourseUser.course_id not in the user's department", 1),
+    (_inject_undrawable_competency, 'SkillUsers.competency not drawable in its age bucket', 2),
+    (_inject_duplicate_link_id, 'CourseUser.id duplicated', 1),
+])
+def test_injected_violation_is_caught(dataset, inject, check, rows):
+    inject(dataset)
+    report = validate_dataset(dataset, chunk_rows=1_000)
+
+    assert not report['passed']
+    assert {name: count for name, count in report['violations'].items() if count} == {check: rows}